@@ -1,33 +1,23 @@
 import os
-import requests
 import json
+import hashlib
 from dotenv import load_dotenv, dotenv_values
-from crewai import Agent, Task, LLM
-from mistralai import Mistral
+from src import upstash_client
+from src.llm_gateway import get_gateway
 
 if "MISTRAL_API_KEY" not in os.environ:
     # For running locally or docker run without env vars set,
     from dotenv import load_dotenv
     load_dotenv()  # Loads variables from .env into os.environ
 
-UPSTASH_REDIS_REST_URL = os.getenv("UPSTASH_REDIS_REST_URL")
-UPSTASH_REDIS_REST_TOKEN = os.getenv("UPSTASH_REDIS_REST_TOKEN")
-
-
 def fetch_config_from_upstash(key: str) -> dict:
-    url = f"{UPSTASH_REDIS_REST_URL}/get/{key}"
-    headers = {"Authorization": f"Bearer {UPSTASH_REDIS_REST_TOKEN}"}
-    response = requests.get(url, headers=headers)
-
-    if response.status_code == 200:
-        # response.json()["result"] can be None or missing, so check:
-        result = response.json().get("result")
-        if result:
-            return json.loads(result)
-        else:
-            raise KeyError(f"No data found for key '{key}' in Upstash.")
+    result = upstash_client.get_client().get(key)
+
+    # result can be None if the key is missing, so check:
+    if result:
+        return json.loads(result)
     else:
-        raise Exception(f"Failed to fetch config from Upstash: {response.text}")
+        raise KeyError(f"No data found for key '{key}' in Upstash.")
 
 
 def load_default_config() -> dict:
@@ -39,50 +29,106 @@ def StandardLLMResponse(input):
     """ 
     Modify this as well with respect to your custom selected LLM. Make sure final response returns extracted answer from query.
     """
-    with Mistral(
-        api_key=os.environ["MISTRAL_API_KEY"],
-    ) as mistral:
-
-        response = mistral.chat.complete(model="mistral-small-latest", messages=[
-            {
-                "content": input,
-                "role": "user",
-            },
-        ])
-
-        final_response = response.choices[0].message.content
-
-    return final_response
-
-# Try fetching the config from Upstash, fallback to default if not found or error
-try:
-    config_data = fetch_config_from_upstash("agent_config")
-except (Exception, KeyError) as e:
-    print(f"Warning: Could not load agent_config from Upstash due to {e}, loading default config.")
-    config_data = load_default_config()
-
-# Make sure the keys exist in config_data, fallback to default keys if not
-agent_data = config_data.get("agent")
-task_data = config_data.get("task")
-
-if not agent_data or not task_data:
-    print("Warning: agent or task config missing, loading default config from file.")
-    config_data = load_default_config()
+    return get_gateway().complete(model="mistral-small-latest", messages=[
+        {
+            "content": input,
+            "role": "user",
+        },
+    ])
+
+async def StandardLLMResponseAsync(input):
+    """
+    Async variant of StandardLLMResponse, awaits the completion instead of blocking a worker thread.
+    """
+    return await get_gateway().complete_async(model="mistral-small-latest", messages=[
+        {
+            "content": input,
+            "role": "user",
+        },
+    ])
+
+async def StandardLLMStreamAsync(messages, model="mistral-small-latest", temperature=None):
+    """
+    Streams the completion of `messages` token by token (yields text deltas).
+    """
+    async for content in get_gateway().stream_async(messages, model=model, temperature=temperature):
+        yield content
+
+def DirectAgentResponse(inputs):
+    """
+    Answers with the agent's role, goal and backstory and the task rendered into one chat
+    completion, skipping the CrewAI orchestration (direct agent mode).
+    """
+    return get_gateway().complete(build_agent_messages(inputs), model=AGENT_MODEL, temperature=AGENT_TEMPERATURE)
+
+async def DirectAgentResponseAsync(inputs):
+    """
+    Async variant of DirectAgentResponse.
+    """
+    return await get_gateway().complete_async(build_agent_messages(inputs), model=AGENT_MODEL,
+                                              temperature=AGENT_TEMPERATURE)
+
+def interpolate(template, inputs):
+    """Fills {placeholders} like CrewAI does, leaving any other braces untouched."""
+    for key, value in inputs.items():
+        template = template.replace("{" + key + "}", str(value))
+    return template
+
+def build_agent_messages(inputs):
+    """
+    Renders the agent (role, goal, backstory) and its task into chat messages,
+    so the single agent/task flow can be sent as one chat completion.
+    """
+    system_prompt = (
+        f"You are {agent_data['role']}.\n{agent_data['backstory']}\n\n"
+        f"Your personal goal is: {agent_data['goal']}"
+    )
+    user_prompt = (
+        f"{interpolate(task_data['description'], inputs)}\n\n"
+        f"This is the expected criteria for your final answer: {interpolate(task_data['expected_output'], inputs)}"
+    )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+# Model behind the agent, shared by the CrewAI LLM and the direct / streaming paths
+AGENT_MODEL = "mistral-large-latest"
+AGENT_TEMPERATURE = 0.7
+
+# Agent execution modes: "crew" runs the CrewAI agent/task, "direct" sends them as one chat completion
+AGENT_MODES = ("crew", "direct")
+
+def load_agent_config(fetch=True, config_data=None):
+    """
+    Sets agent_data, task_data and AGENT_CONFIG_VERSION from `config_data` when given, else
+    from the agent_config stored in Upstash (skipped when `fetch` is False), falling back to
+    the default config.
+    """
+    global agent_data, task_data, AGENT_CONFIG_VERSION
+    config_data = config_data or {}
+    if fetch and not config_data:
+        # Try fetching the config from Upstash, fallback to default if not found or error
+        try:
+            config_data = fetch_config_from_upstash("agent_config")
+        except (Exception, KeyError) as e:
+            print(f"Warning: Could not load agent_config from Upstash due to {e}, loading default config.")
+
+    # Make sure the keys exist in config_data, fallback to default keys if not
+    if not config_data.get("agent") or not config_data.get("task"):
+        if fetch and config_data:
+            print("Warning: agent or task config missing, loading default config from file.")
+        config_data = load_default_config()
     agent_data = config_data["agent"]
     task_data = config_data["task"]
 
-# Initialize LLM 
-"""
-You can use any supported or your custom Large Language Model (LLM) with Crew AI.
+    # Version of the loaded agent/task config, cached answers are only reused within one version
+    AGENT_CONFIG_VERSION = hashlib.sha1(
+        json.dumps({"agent": agent_data, "task": task_data}, sort_keys=True).encode("utf-8")
+    ).hexdigest()
 
-For more details on model support, refer to Crew AI's documentation: https://docs.crewai.com/concepts/llms
-
-"""
-llm = LLM(
-    model="mistral/mistral-large-latest",
-    temperature=0.7,
-    api_key=os.environ["MISTRAL_API_KEY"],
-)
+# Bundled default until load_agent_config() runs, importing this module makes no network calls
+load_agent_config(fetch=False)
 
 class ConfigLoader:
     def __init__(self, env_path=".env"):
@@ -102,12 +148,20 @@ class ConfigLoader:
         # os.environ["GROQ_API_KEY"] = self.config.get("GROQ_API_KEY", "")
         # os.environ["GEMINI_API_KEY"] = self.config.get("GEMINI_API_KEY", "")
 
+# Initialize LLM 
+"""
+You can use any supported or your custom Large Language Model (LLM) with Crew AI.
+
+For more details on model support, refer to Crew AI's documentation: https://docs.crewai.com/concepts/llms
+
+The LLM is built per agent in LLMSetup, so crewai is only imported when an agent is created.
+"""
 class LLMSetup:
     def __init__(self):
-        self.llm = LLM(
-            model="mistral/mistral-large-latest",
-            temperature=0.7,
-            api_key=os.environ["MISTRAL_API_KEY"],
+        # Shares the process-wide gateway: pooled connections, retries and per-model limits
+        self.llm = get_gateway().crewai_llm(
+            model=AGENT_MODEL,
+            temperature=AGENT_TEMPERATURE,
         )
 
 class DataAnalysisAgentFactory:
@@ -115,6 +169,8 @@ class DataAnalysisAgentFactory:
         self.llm = llm
 
     def create_agent(self):
+        from crewai import Agent
+
         return Agent(
             name=agent_data["name"],
             role=agent_data["role"],
@@ -130,6 +186,8 @@ class DataAnalysisTaskFactory:
         self.agent = agent
 
     def create_task(self):
+        from crewai import Task
+
         return Task(
             description=task_data["description"],
             expected_output=task_data["expected_output"],
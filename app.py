@@ -1,16 +1,29 @@
 from util import suppress
 suppress.all()
 #suppress.langchain_warnings()
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from pydantic import BaseModel
-from crewai import Crew
 from agents import load_default_agent
 from src.banner import print_banner
 from datetime import datetime
 from src import vectorstore
+from src.answer_cache import AnswerCache
+from src.reindex import ReindexJobs
+from src.crew_pool import CrewPool, CREW_POOL_SIZE
+from src import context_builder
+from src import metrics
+from src import tracing
+from src import shared_index
+from src import upstash_client
 import os
 import json
+import asyncio
+import time
+import contextvars
+import threading
+import traceback
 
 os.makedirs("/tmp/agents", exist_ok=True)
 os.makedirs("/tmp/rag", exist_ok=True)
@@ -26,16 +39,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+http_request_seconds = metrics.registry.histogram(
+    "truenotion_http_request_seconds", "Latency of HTTP requests until the response is fully sent, by route.",
+    label_names=("route", "method"),
+)
+inflight_requests = 0
+
+class MeasureRequests:
+    """
+    Counts in-flight HTTP requests and observes their latency. Plain ASGI instead of an
+    @app.middleware("http") function, which only sees the response start: a streamed answer
+    (/chat/stream) stays in flight and is timed until its last event is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global inflight_requests
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        inflight_requests += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            inflight_requests -= 1
+            # Route template (e.g. /initialize/{job_id}) keeps the label set small
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_seconds.observe(time.perf_counter() - start, route=route, method=scope["method"])
+
+app.add_middleware(MeasureRequests)
+
 print("Initializing..")
 print_banner()
 
-# Global variables for conversation, retriever and crew instance
+# Global variables for conversation, retriever and crew pool
 chat_history = []  # Each element is a tuple (user query, AI answer)
-history_mode = True
-crew_instance = None
+crew_pool = None
+crew_pool_config_version = None  # agent config the pooled crews were built from
+agent_mode = "crew"  # "crew" or "direct", from the "agent" section of rag_config
 retriever = None
 loaded_files_reference = []
-disable_agent= False
 k = None
 chunk_size = None
 memory = None  # Number of historical conversation pairs to include
@@ -48,27 +93,55 @@ except (Exception, KeyError) as e:
     with open('rag/default_rag_config.json','r') as f:
         rag_parameters = json.load(f)
 
-file_path = os.path.join(os.getcwd(), "/tmp/rag/rag_config.json")
-with open(file_path, "w") as f:
-    json.dump(rag_parameters, f, indent=2)
+def write_rag_config(rag_parameters, path="/tmp/rag/rag_config.json"):
+    """Replaces the rag_config file atomically, workers starting together never read a partial file."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(rag_parameters, f, indent=2)
+    os.replace(tmp_path, path)
 
-vectorstore.upload_agent_config_to_upstash(filepath="/tmp/rag/rag_config.json", key="rag_config")
+write_rag_config(rag_parameters)
 
 k = rag_parameters.get("k")
 chunk_size = rag_parameters.get("chunk_size")
 memory = rag_parameters.get("memory")
-
-# logging on frontend
-retriever, loaded_files_reference = vectorstore.initialize_system(adjusted_k=k, adjusted_chunk_size=chunk_size)
-
-loaded_files_reference.extend([
-    "RAG Parameters: ",
-    f"Top-k value: {k}",
-    f"Chunk size: {chunk_size}",
-    f"Memory: {memory}"
-])
-
-crew_instance = None
+context_settings = context_builder.context_config(rag_parameters.get("context"))
+
+# The index is loaded after the server is up (see boot_backend), nothing above contacts Notion or Upstash
+
+# Re-fetch Notion data and refresh a saved index snapshot after boot ("false" serves the snapshot as-is)
+STARTUP_REFRESH = os.getenv("STARTUP_REFRESH", "true").lower() in ("1", "true", "yes")
+
+# Cold start progress, reported by /healthz and /readyz
+boot_state = {
+    "stage": "starting",
+    "started_at": time.time(),
+    "ready_at": None,
+    "snapshot": False,
+    "refresh_job_id": None,
+    "error": None,
+    "index_version": None,  # published version served, shared index mode only
+}
+
+def rag_reference(rag_parameters):
+    # logging on frontend
+    return [
+        "RAG Parameters: ",
+        f"Top-k value: {rag_parameters.get('k')}",
+        f"Chunk size: {rag_parameters.get('chunk_size')}",
+        f"Memory: {rag_parameters.get('memory')}"
+    ]
+
+def agent_settings(rag_parameters):
+    """(mode, pool size) from the "agent" section of rag_config."""
+    settings = rag_parameters.get("agent") or {}
+    mode = settings.get("mode", "crew")
+    if mode not in load_default_agent.AGENT_MODES:
+        print(f"Warning: Unknown agent mode '{mode}', using 'crew'.")
+        mode = "crew"
+    return mode, settings.get("pool_size") or CREW_POOL_SIZE
+
+agent_mode, crew_pool_size = agent_settings(rag_parameters)
 
 class Query(BaseModel):
     question: str
@@ -76,10 +149,139 @@ class Query(BaseModel):
 
 @app.on_event("startup")
 def startup_event():
-    global crew_instance
-    crew_instance = initialize_agent()
+    load_default_agent.ConfigLoader()
+    # The server accepts requests right away, /readyz reports when the index is being served
+    threading.Thread(target=boot_backend, name="boot", daemon=True).start()
+
+def boot_backend():
+    """
+    Cold start off the request path: serves the saved index snapshot (if any) first, then syncs
+    the configs with Upstash, builds the crew pool and refreshes the index from Notion.
+    """
+    try:
+        boot_state["stage"] = "loading_snapshot"
+        saved = load_snapshot()
+        if saved is not None:
+            # The crews are built below, once the agent config is loaded
+            swap_backend_state(saved, build_crews=False)
+            boot_state["snapshot"] = True
+            mark_ready()
+
+        boot_state["stage"] = "syncing_config"
+        try:
+            vectorstore.upload_agent_config_to_upstash(filepath="/tmp/rag/rag_config.json", key="rag_config")
+        except Exception as e:
+            print(f"Warning: Could not upload rag_config to Upstash due to {e}")
+        load_default_agent.load_agent_config()
+
+        if agent_mode == "crew":
+            boot_state["stage"] = "building_agents"
+            ensure_crew_pool(crew_pool_size)
+
+        if retriever is None or STARTUP_REFRESH:
+            boot_state["stage"] = "refreshing"
+            # With a shared index only one worker refreshes at boot, the others load what it publishes
+            job = reindex_jobs.submit(
+                lambda progress: build_backend_state(progress, boot_started=boot_state["started_at"]),
+                finish_boot_refresh,
+            )
+            boot_state["refresh_job_id"] = job["job_id"]
+        else:
+            boot_state["stage"] = "ready"
+        if shared_index.SHARED_INDEX:
+            shared_index.watch(load_published_version)
+    except Exception as e:
+        traceback.print_exc()
+        boot_state.update(stage="failed", error=str(e))
+
+def load_snapshot(version=None):
+    """
+    Saved index as a backend state (rag_parameters, retriever, files reference), None if there is
+    none. In shared mode the published version (memory-mapped) with the rag_config it was built
+    with, else the local snapshot with the current rag_config.
+    """
+    parameters = rag_parameters
+    if not shared_index.SHARED_INDEX:
+        saved = vectorstore.load_saved_system(
+            adjusted_k=k, adjusted_chunk_size=chunk_size, index_config=parameters.get("index"),
+            retrieval_config=parameters.get("retrieval"), chunking_config=parameters.get("chunking"),
+        )
+    else:
+        version = version or shared_index.current_version()
+        if version is None:
+            return None
+        # Every worker serves the version the builder published, with the settings it was built with
+        parameters = shared_index.version_rag_config(version) or rag_parameters
+        saved = vectorstore.load_saved_system(
+            adjusted_k=parameters.get("k"), adjusted_chunk_size=None, index_config=parameters.get("index"),
+            retrieval_config=parameters.get("retrieval"), chunking_config=parameters.get("chunking"),
+            path=shared_index.version_path(version), mmap=True,
+        )
+        if saved is not None:
+            boot_state["index_version"] = version
+    if saved is None:
+        return None
+    saved_retriever, files_reference = saved
+    return parameters, saved_retriever, files_reference + rag_reference(parameters)
+
+def load_published_version(version):
+    """Serves an index version published by the builder worker (shared index mode)."""
+    if version == boot_state["index_version"]:
+        return
+    saved = load_snapshot(version)
+    if saved is None:
+        raise RuntimeError("the published snapshot is unusable")
+    # Same settings as the builder: top-k, context budget, memory and agent mode
+    load_default_agent.load_agent_config()
+    swap_backend_state(saved)
+    mark_ready()
+
+def mark_ready():
+    if boot_state["ready_at"] is None:
+        boot_state["ready_at"] = time.time()
+    if boot_state["stage"] == "waiting_for_index":
+        boot_state["stage"] = "ready"
+
+def finish_boot_refresh(state):
+    swap_backend_state(state)
+    # The refresh is skipped while another worker builds the shared index
+    boot_state["stage"] = "ready" if retriever is not None else "waiting_for_index"
+    if retriever is not None:
+        mark_ready()
+
+def boot_status():
+    """Boot stage, whether a retriever is served and the state of the startup refresh."""
+    status = dict(boot_state)
+    job = reindex_jobs.get(status["refresh_job_id"]) if status["refresh_job_id"] else None
+    if job is not None:
+        status["refresh"] = {"status": job["status"], "stage": job["stage"], "error": job["error"]}
+        if job["status"] == "failed":
+            status["stage"] = "refresh_failed"
+    status["ready"] = retriever is not None
+    status["uptime_seconds"] = round(time.time() - status["started_at"], 3)
+    if status["ready_at"] is not None:
+        status["ready_seconds"] = round(status["ready_at"] - status["started_at"], 3)
+    return status
+
+def require_retriever():
+    """Agent answers need the index, until it is loaded they are refused with 503."""
+    if retriever is None:
+        raise HTTPException(status_code=503, detail="The index is still loading, please retry shortly.",
+                            headers={"Retry-After": "5"})
+
+def ensure_crew_pool(size):
+    """Builds the crew pool, or rebuilds it when the configured size or the agent config changed."""
+    global crew_pool, crew_pool_config_version
+    config_version = load_default_agent.AGENT_CONFIG_VERSION
+    if crew_pool is None or crew_pool.size != size or crew_pool_config_version != config_version:
+        crew_pool = CrewPool(initialize_agent, size)
+        crew_pool_config_version = config_version
+    return crew_pool
 
 def initialize_agent():
+    # crewai is only imported in crew mode, it takes seconds to import
+    from crewai import Crew
+
     load_default_agent.ConfigLoader()
     llm_setup = load_default_agent.LLMSetup()
     agent_factory = load_default_agent.DataAnalysisAgentFactory(llm_setup.llm)
@@ -96,88 +298,308 @@ class Query(BaseModel):
     question: str
     history: list  # Expects a list of tuples like [(question, answer), ...]
 
-@app.post("/chat")
-def chat_api(query: Query):
-    global disable_agent, history_mode, memory
-
-    user_input = query.question
-    conversation_history = query.history
-
-    # Set conversation modes based on input markers
-    if "/stdllm" in user_input:
-        disable_agent = True
-        history_mode = True
-    elif "/stdllm-nh" in user_input:
-        disable_agent = True
-        history_mode = False
-    elif "/truN" in user_input:
-        disable_agent = False
-        history_mode = True
-    elif "/truN-nh" in user_input:
-        disable_agent = False
-        history_mode = False
-
-    # Build conversation history string from the provided history (using last 'memory' turns)
-    history_str = "\n".join([f"You: {q}\nAI: {a}" for q, a in conversation_history[-memory:]])
-    now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-    # If the agent is enabled, use the crew_instance with context
-    if not disable_agent:
-        if "/truN" in user_input:
-            user_input = user_input.replace("/stdllm", "")
-        if "/truN-nh" in user_input:
-            user_input = user_input.replace("/stdllm-nh", "")
-        # Retrieve document context with error handling
-        try:
-            retrieved_docs = retriever.get_relevant_documents(user_input)
-            context = "\n\n".join([doc.page_content for doc in retrieved_docs])
-        except Exception as e:
-            print("Error retrieving document context:", e)
-            context = ""
+# Mode markers a message can carry -> (disable_agent, history_mode).
+# The "-nh" variants come first since "/stdllm" is also a prefix of "/stdllm-nh".
+MODE_MARKERS = {
+    "/stdllm-nh": (True, False),
+    "/stdllm": (True, True),
+    "/truN-nh": (False, False),
+    "/truN": (False, True),
+}
+
+def parse_mode(user_input):
+    """
+    Reads the conversation mode from the message itself, so concurrent users never share it.
+    Returns (disable_agent, history_mode, user_input without the marker). Defaults to agent with history.
+    """
+    for marker, (agent_disabled, with_history) in MODE_MARKERS.items():
+        if marker in user_input:
+            return agent_disabled, with_history, user_input.replace(marker, "").strip()
+    return False, True, user_input
+
+# Final answers for repeated questions over the same retrieved chunks
+answer_cache = AnswerCache()
+
+def cache_namespace(serving):
+    """
+    Versions of the index `serving` searched and of the agent config, a change in either
+    invalidates cached answers. Callers pass the retriever the chunks came from, a reindex
+    swapping the global one mid-request must not file the answer under the new index.
+    """
+    return (getattr(getattr(serving, "vectorstore", None), "version", None), load_default_agent.AGENT_CONFIG_VERSION)
+
+# Upper bound on LLM calls in flight across all requests of this process
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 16))
+llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+
+def build_history_str(conversation_history):
+    """Conversation history string from the provided history (last 'memory' turns, compressed to its budget)."""
+    return context_builder.compress_history(
+        conversation_history, memory,
+        max_tokens=context_settings["history_max_tokens"],
+        answer_chars=context_settings["history_answer_chars"],
+    )
 
-        # Build the full prompt based on whether history is enabled
-        if history_mode:
-            full_context = f"""Context:
+def get_documents_profiled(serving, user_input):
+    """Retrieval in the executor thread, where a sampled request's cProfile can see it."""
+    with tracing.maybe_profile("retrieve"):
+        return serving.get_relevant_documents(user_input)
+
+async def retrieve_documents(serving, user_input):
+    """Retrieves document chunks from `serving` off the event loop, returns an empty list on errors."""
+    try:
+        loop = asyncio.get_running_loop()
+        # The copied context carries the request trace (if any) into the executor thread
+        with metrics.timer("retrieve"):
+            return await loop.run_in_executor(None, contextvars.copy_context().run,
+                                              get_documents_profiled, serving, user_input)
+    except Exception as e:
+        print("Error retrieving document context:", e)
+        return []
+
+async def retrieve_documents_batch(serving, user_inputs):
+    """Chunks for many questions from one vectorized search off the event loop, raises on errors."""
+    loop = asyncio.get_running_loop()
+    with metrics.timer("retrieve", kind="batch"):
+        return await loop.run_in_executor(None, serving.get_relevant_documents_batch, user_inputs)
+
+def build_agent_inputs(user_input, retrieved_docs, history_str, history_mode):
+    """Inputs for the agent task, with the full prompt based on whether history is enabled."""
+    # Overlapping chunks of a row are merged, duplicates dropped and the total kept within budget
+    with metrics.timer("context_build"):
+        context = context_builder.build_context(retrieved_docs, context_settings["max_tokens"])
+    if history_mode:
+        full_context = f"""Context:
 {context}
 
 Conversation History:
 {history_str}"""
-        else:
-            full_context = f"Context: {context}"
+    else:
+        full_context = f"Context: {context}"
+
+    return {
+        "user_question": user_input,
+        "context": full_context,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+def build_standard_query(user_input, history_str, history_mode):
+    """Query for the standard LLM, including conversation history if needed."""
+    if history_mode:
+        return f"I'm User. My query is: {user_input}, My Conversation History is: {history_str}"
+    return user_input
+
+def annotate_prompt(prompt):
+    """Prompt size for the request trace, only computed when the request is traced."""
+    if tracing.current() is not None:
+        text = prompt() if callable(prompt) else prompt
+        tracing.annotate(prompt_chars=len(text), prompt_tokens=context_builder.estimate_tokens(text))
 
-        inputs = {
-            "user_question": user_input,
-            "context": full_context,
-            "timestamp": now_str,
-        }
+@app.post("/chat")
+async def chat_api(query: Query, request: Request, response: Response):
+    """
+    Answers a question. With the X-Debug-Trace header or ?debug=true the response carries a
+    Server-Timing header and a "trace" with per-span timings. PROFILE_SAMPLE_RATE profiles a share
+    of requests: retrieval under cProfile / tracemalloc in its executor thread, plus the
+    request's span timings (?debug=true&profile=true forces it).
+    """
+    if not tracing.is_debug_request(request):
+        with tracing.sample_profile("chat"):
+            return await answer_chat(query)
+
+    # ?profile=true profiles this request regardless of the sample rate
+    sample_rate = 1.0 if request.query_params.get("profile") in ("1", "true") else None
+    with tracing.start_trace("chat") as trace:
+        with tracing.sample_profile("chat", sample_rate):
+            result = await answer_chat(query)
+    response.headers["Server-Timing"] = trace.server_timing()
+    return {**result, "trace": trace.to_dict()}
+
+async def answer_chat(query):
+    disable_agent, history_mode, user_input = parse_mode(query.question)
+    if not disable_agent:
+        require_retriever()
+    # The retriever is read once, so the cache key names the index the chunks came from
+    serving = retriever
+    retrieved_docs = [] if disable_agent else await retrieve_documents(serving, user_input)
+    return await answer_with_documents(user_input, disable_agent, history_mode, query.history, retrieved_docs,
+                                       cache_namespace(serving))
+
+async def answer_with_documents(user_input, disable_agent, history_mode, history, retrieved_docs, namespace,
+                                raise_errors=False):
+    """
+    Answers from already retrieved chunks (cache, then agent or standard LLM). `namespace` is
+    the cache_namespace() of the retriever that found them. LLM failures are returned as the
+    answer text, or raised with `raise_errors`.
+    """
+    history_str = build_history_str(history)
+    cache_key = answer_cache.make_key(user_input, (disable_agent, history_mode), retrieved_docs,
+                                      namespace, history_str)
+    cached_reply = answer_cache.get(cache_key)
+    if cached_reply is not None:
+        tracing.annotate(cache_hit=True)
+        return {"answer": cached_reply}
+
+    # If the agent is enabled, answer with context, through a pooled crew or one direct completion
+    if not disable_agent:
+        inputs = build_agent_inputs(user_input, retrieved_docs, history_str, history_mode)
+        annotate_prompt(lambda: "\n".join(m["content"] for m in load_default_agent.build_agent_messages(inputs)))
 
         try:
-            result = crew_instance.kickoff(inputs=inputs)
-            reply = result.tasks_output[0]
-            safe_reply = str(reply) if reply is not None else "Sorry, something went wrong. Please try again."
+            # Until the crew pool is built at boot, agent requests are answered directly
+            if agent_mode == "direct" or crew_pool is None:
+                async with llm_semaphore:
+                    with metrics.timer("llm", kind="direct"):
+                        reply = await load_default_agent.DirectAgentResponseAsync(inputs)
+            else:
+                # Each run checks out its own Crew, a Crew is not safe to kick off concurrently
+                async with llm_semaphore, crew_pool.checkout_async() as crew:
+                    with metrics.timer("llm", kind="crew"):
+                        result = await crew.kickoff_async(inputs=inputs)
+                reply = result.tasks_output[0]
+            if reply is not None:
+                safe_reply = str(reply)
+                answer_cache.set(cache_key, safe_reply)
+            else:
+                safe_reply = "Sorry, something went wrong. Please try again."
         except Exception as e:
+            if raise_errors:
+                raise
             safe_reply = f"Encountered an error: {e}"
 
     # When disable_agent is True, use the default standard llm response method
     else:
-        # Remove the mode marker from the user input if present
-        if "/stdllm" in user_input:
-            user_input = user_input.replace("/stdllm", "")
-        if "/stdllm-nh" in user_input:
-            user_input = user_input.replace("/stdllm-nh", "")
-
-        # Construct the query to include conversation history if needed
-        new_query = f"I'm User. My query is: {user_input}, My Conversation History is: {history_str}"
+        standard_query = build_standard_query(user_input, history_str, history_mode)
+        annotate_prompt(standard_query)
         try:
-            if history_mode:
-                safe_reply = load_default_agent.StandardLLMResponse(new_query)
-            else:
-                safe_reply = load_default_agent.StandardLLMResponse(user_input)
+            async with llm_semaphore:
+                with metrics.timer("llm", kind="standard"):
+                    safe_reply = await load_default_agent.StandardLLMResponseAsync(standard_query)
+            answer_cache.set(cache_key, safe_reply)
         except Exception as e:
+            if raise_errors:
+                raise
             safe_reply = f"Sorry, something went wrong. Please try again. Error details: {e}"
 
     return {"answer": safe_reply}
 
+# Questions accepted per /chat/batch request, and how many of them are answered at a time
+# (on top of the process-wide LLM_CONCURRENCY limit)
+CHAT_BATCH_MAX = int(os.getenv("CHAT_BATCH_MAX", 100))
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", 8))
+
+class BatchQuery(BaseModel):
+    queries: list[Query]
+
+@app.post("/chat/batch")
+async def chat_batch_api(batch: BatchQuery):
+    """
+    Answers many questions in one request. The agent-mode questions are retrieved together
+    (one embedding matrix, one FAISS search), then up to CHAT_BATCH_CONCURRENCY answers are
+    generated at once. "results" keeps the request order, a failed question has an "error"
+    instead of an "answer". If retrieval fails, every agent-mode question fails with it
+    rather than being answered without context.
+    """
+    if len(batch.queries) > CHAT_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {CHAT_BATCH_MAX} questions per batch.")
+    parsed = [parse_mode(query.question) for query in batch.queries]
+    agent_items = [i for i, (disable_agent, _, _) in enumerate(parsed) if not disable_agent]
+
+    # The retriever is read once, a reindex swapping it mid-batch does not split the batch
+    serving = retriever
+    retrieved = {}
+    retrieval_error = None
+    if agent_items and serving is not None:
+        try:
+            docs = await retrieve_documents_batch(serving, [parsed[i][2] for i in agent_items])
+            retrieved = dict(zip(agent_items, docs))
+        except Exception as e:
+            print("Error retrieving document context:", e)
+            retrieval_error = f"Could not retrieve document context, please retry. Error details: {e}"
+
+    limit = asyncio.Semaphore(CHAT_BATCH_CONCURRENCY)
+    namespace = cache_namespace(serving)
+
+    async def answer(i):
+        disable_agent, history_mode, user_input = parsed[i]
+        if not disable_agent and serving is None:
+            return {"index": i, "error": "The index is still loading, please retry shortly."}
+        if not disable_agent and retrieval_error is not None:
+            return {"index": i, "error": retrieval_error}
+        try:
+            async with limit:
+                result = await answer_with_documents(user_input, disable_agent, history_mode,
+                                                     batch.queries[i].history, retrieved.get(i, []),
+                                                     namespace, raise_errors=True)
+        except Exception as e:
+            return {"index": i, "error": f"Sorry, something went wrong. Error details: {e}"}
+        return {"index": i, **result}
+
+    return {"results": await asyncio.gather(*(answer(i) for i in range(len(parsed))))}
+
+def sse_event(event, data):
+    """Formats one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_api(query: Query):
+    """
+    Streams the answer over Server-Sent Events:
+    "sources" (metadata of the retrieved rows, agent mode only), then "token" events as the model
+    produces text, then "done" with the full answer, or "error".
+    """
+    disable_agent, history_mode, user_input = parse_mode(query.question)
+    if not disable_agent:
+        require_retriever()
+    history_str = build_history_str(query.history)
+    serving = retriever
+
+    async def event_stream():
+        retrieved_docs = [] if disable_agent else await retrieve_documents(serving, user_input)
+        if not disable_agent:
+            # Several chunks of one row are listed as one source
+            yield sse_event("sources", context_builder.row_sources(retrieved_docs))
+
+        cache_key = answer_cache.make_key(user_input, (disable_agent, history_mode), retrieved_docs,
+                                          cache_namespace(serving), history_str)
+        cached_reply = answer_cache.get(cache_key)
+        if cached_reply is not None:
+            yield sse_event("token", {"text": cached_reply})
+            yield sse_event("done", {"answer": cached_reply})
+            return
+
+        if not disable_agent:
+            inputs = build_agent_inputs(user_input, retrieved_docs, history_str, history_mode)
+            # The single agent task rendered as one streamed chat completion
+            messages = load_default_agent.build_agent_messages(inputs)
+            model, temperature = load_default_agent.AGENT_MODEL, load_default_agent.AGENT_TEMPERATURE
+        else:
+            messages = [{"role": "user", "content": build_standard_query(user_input, history_str, history_mode)}]
+            model, temperature = "mistral-small-latest", None
+
+        answer = []
+        try:
+            async with llm_semaphore:
+                with metrics.timer("llm", kind="stream"):
+                    async for token in load_default_agent.StandardLLMStreamAsync(messages, model=model,
+                                                                                 temperature=temperature):
+                        answer.append(token)
+                        yield sse_event("token", {"text": token})
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Sorry, something went wrong. Please try again. Error details: {e}"})
+            return
+        reply = "".join(answer)
+        # An empty stream is a failed answer, it must not be served from the cache
+        if reply:
+            answer_cache.set(cache_key, reply)
+        yield sse_event("done", {"answer": reply})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # -----------------------------
 # NEW ENDPOINT: Save Agent Configuration
 # -----------------------------
@@ -192,11 +614,67 @@ def save_agent_config(config: AgentConfig):
         file_path = os.path.join(os.getcwd(), "/tmp/agents/agent_config.json")
         with open(file_path, "w") as f:
             json.dump(config.dict(), f, indent=2)
+        # Serves the saved config right away, its new version moves cached answers to a new namespace
+        load_default_agent.load_agent_config(config_data=config.dict())
+        if agent_mode == "crew" and crew_pool is not None:
+            ensure_crew_pool(crew_pool_size)
         return {"message": "Agent configuration saved successfully.", "file_path": file_path}
     except Exception as e:
         load_default_agent.load_default_config()
         raise HTTPException(status_code=500, detail=str(e))
 
+def current_vectorstore():
+    return retriever.vectorstore
+
+metrics.registry.gauge("truenotion_index_chunks", "Chunks in the served index.",
+                       lambda: len(current_vectorstore().documents))
+metrics.registry.gauge("truenotion_index_bytes",
+                       "Memory of the served FAISS index in this process (heap only when memory-mapped).",
+                       lambda: current_vectorstore().index_bytes)
+metrics.registry.gauge("truenotion_index_mapped_bytes",
+                       "Resident page-cache bytes of the memory-mapped FAISS index, shared between workers.",
+                       lambda: current_vectorstore().index_mapped_bytes())
+metrics.registry.gauge("truenotion_chunk_store_bytes", "Chunk texts, spans and embeddings held in the heap.",
+                       lambda: current_vectorstore().chunk_store_bytes)
+metrics.registry.gauge("truenotion_chunk_store_mapped_bytes",
+                       "Memory-mapped chunk texts, spans and embeddings, shared through the page cache.",
+                       lambda: current_vectorstore().chunk_store_mapped_bytes)
+metrics.registry.gauge("truenotion_answer_cache_hit_rate", "Share of answer cache lookups that hit.",
+                       answer_cache.hit_rate)
+metrics.registry.gauge("truenotion_answer_cache_entries", "Answers held in the in-memory cache tier.",
+                       lambda: answer_cache.snapshot()["entries"])
+metrics.registry.gauge("truenotion_inflight_requests", "HTTP requests currently being handled.",
+                       lambda: inflight_requests)
+metrics.registry.gauge("truenotion_crew_pool_available", "Idle Crew instances in the pool.",
+                       lambda: crew_pool.available() if crew_pool is not None else None)
+for name, help_text in (("round_trips", "HTTP round trips to Upstash since start."),
+                        ("commands", "Redis commands sent to Upstash, several per pipelined round trip."),
+                        ("errors", "Failed Upstash round trips since start."),
+                        ("seconds", "Time spent in Upstash round trips since start.")):
+    metrics.registry.gauge(f"truenotion_upstash_{name}", help_text,
+                           lambda name=name: upstash_client.get_client().metrics[name])
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text-format metrics: stage and request latency histograms plus gauges."""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process serves requests. Reports the boot stage."""
+    status = boot_status()
+    return {"status": "ok", "stage": status["stage"], "uptime_seconds": status["uptime_seconds"]}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 200 once an index is served (a snapshot or a fresh build), 503 before."""
+    status = boot_status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/cache-stats")
+def get_cache_stats():
+    return {"answer_cache": answer_cache.snapshot()}
+
 @app.get("/loaded-files-reference")
 def get_loaded_files_reference():
     try:
@@ -204,46 +682,104 @@ def get_loaded_files_reference():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
-@app.post("/initialize")
-def reset_backend_state():
-    global loaded_files_reference
+def load_rag_parameters_from_upstash():
+    """Fetches rag_config from Upstash, falling back to the default config."""
     try:
         rag_parameters = load_default_agent.fetch_config_from_upstash("rag_config")
-        file_path = os.path.join(os.getcwd(), "/tmp/rag/rag_config.json")
-        with open(file_path, "w") as f:
-            json.dump(rag_parameters, f, indent=2)
-
-        k = rag_parameters.get("k")
-        chunk_size = rag_parameters.get("chunk_size")
-        memory = rag_parameters.get("memory")
-
-        # logging on frontend
-        retriever, loaded_files_reference = vectorstore.initialize_system(adjusted_k=k, adjusted_chunk_size=chunk_size)
-
-        loaded_files_reference.extend([
-            "RAG Parameters: ",
-            f"Top-k value: {k}",
-            f"Chunk size: {chunk_size}",
-            f"Memory: {memory}"
-        ])
-    
+        write_rag_config(rag_parameters)
     except (Exception, KeyError) as e:
         print(f"Info: Could not load rag_config, using default config.")
-        with open('/tmp/rag/default_rag_config.json','r') as f:
+        with open('rag/default_rag_config.json','r') as f:
             rag_parameters = json.load(f)
+    return rag_parameters
+
+def build_backend_state(progress, boot_started=None):
+    """
+    Builds a new retriever off the request path (runs in the reindex job thread). With a shared
+    index the build runs under the host-wide builder lock and is published for all workers.
+    The boot refresh passes the time the worker started booting (`boot_started`) and returns
+    None if another worker is building or finished a refresh since, so workers booting
+    together refresh the data once.
+    """
+    if not shared_index.SHARED_INDEX:
+        return build_local_state(progress)
+
+    booting = boot_started is not None
+    with shared_index.builder_lock(blocking=not booting) as building:
+        if booting and (not building or shared_index.last_refresh() >= boot_started):
+            progress("skipped", reason="another worker builds the shared index")
+            return None
+        rag_parameters, built_retriever, files_reference = build_local_state(progress)
+        version = shared_index.publish(rag_config=rag_parameters)
+
+    # The in-memory build is dropped, this worker serves the published files like the others
+    saved = vectorstore.load_saved_system(
+        adjusted_k=rag_parameters.get("k"), adjusted_chunk_size=None,
+        index_config=rag_parameters.get("index"), retrieval_config=rag_parameters.get("retrieval"),
+        path=shared_index.version_path(version), mmap=True,
+    )
+    if saved is None:
+        # Pruned or damaged meanwhile, the job fails and the current retriever stays in place
+        raise RuntimeError(f"published index {version} could not be loaded")
+    new_retriever, _ = saved
+    boot_state["index_version"] = version
+    return rag_parameters, new_retriever, files_reference
+
+def build_local_state(progress):
+    """Fetches the data and syncs the local index (the whole build when the index is not shared)."""
+    rag_parameters = load_rag_parameters_from_upstash()
+    # A reindex also picks up an agent config saved since boot (swap_backend_state rebuilds the crews)
+    load_default_agent.load_agent_config()
+    new_k = rag_parameters.get("k")
+    new_chunk_size = rag_parameters.get("chunk_size")
+
+    new_retriever, files_reference = vectorstore.initialize_system(
+        adjusted_k=new_k, adjusted_chunk_size=new_chunk_size, progress=progress,
+        index_config=rag_parameters.get("index"),
+        retrieval_config=rag_parameters.get("retrieval"),
+        chunking_config=rag_parameters.get("chunking"),
+    )
 
-        k = rag_parameters.get("k")
-        chunk_size = rag_parameters.get("chunk_size")
-        memory = rag_parameters.get("memory")
-
-        # logging on frontend
-        retriever, loaded_files_reference = vectorstore.initialize_system(adjusted_k=k, adjusted_chunk_size=chunk_size)
-
-        loaded_files_reference.extend([
-            "",
-            f"Top-k value: {k}",
-            f"Chunk size: {chunk_size}",
-            f"Memory: {memory}"
-        ])
+    files_reference.extend(rag_reference(rag_parameters))
+    return rag_parameters, new_retriever, files_reference
+
+def swap_backend_state(state, build_crews=True):
+    """
+    Publishes a freshly built retriever and the rag_config it was built with. In-flight chats
+    finish on the one they already hold. `build_crews` off leaves building the crew pool to the caller.
+    """
+    global retriever, loaded_files_reference, rag_parameters, k, chunk_size, memory, agent_mode, crew_pool_size, \
+        context_settings
+    if state is None:
+        # Another worker built the shared index, the version watcher loads it
+        return
+    new_parameters, new_retriever, files_reference = state
+    new_agent_mode, new_pool_size = agent_settings(new_parameters)
+    if new_agent_mode == "crew" and build_crews:
+        # Pool is ready before requests can see the crew mode
+        ensure_crew_pool(new_pool_size)
+    agent_mode, crew_pool_size = new_agent_mode, new_pool_size
+    rag_parameters = new_parameters
+    k = new_parameters.get("k")
+    chunk_size = new_parameters.get("chunk_size")
+    memory = new_parameters.get("memory")
+    context_settings = context_builder.context_config(new_parameters.get("context"))
+    retriever = new_retriever
+    loaded_files_reference = files_reference
+
+# Job status is kept next to the index, GET /initialize/{job_id} answers on every worker
+reindex_jobs = ReindexJobs(jobs_dir=os.path.join(shared_index.INDEX_DIR, shared_index.JOBS_DIR))
 
-    return {"status": "backend state reset"}
+@app.post("/initialize")
+def reset_backend_state():
+    """Starts a background reindex and returns its job id right away."""
+    job = reindex_jobs.submit(build_backend_state, swap_backend_state)
+    return {"status": "reindex started", "job_id": job["job_id"]}
+
+@app.get("/initialize/{job_id}")
+def get_reindex_status(job_id: str):
+    """Status of a reindex job, with the stage it is in (fetch, chunk, embed, index, done)."""
+    job = reindex_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown reindex job '{job_id}'")
+    return job
@@ -0,0 +1,231 @@
+"""
+Local stand-ins for the Upstash REST API, the Notion database query API and the Mistral
+chat-completions API, with configurable response latency. Used by the load test.
+"""
+import json
+import time
+import random
+import fnmatch
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # the default of 5 drops connections under load
+
+
+class FakeServer:
+    """Threaded HTTP server answering every POST with `handle`, after the configured latency."""
+
+    def __init__(self, latency=0.0, jitter=0.0):
+        self.latency = latency   # seconds added to every response
+        self.jitter = jitter     # +- share of the latency, e.g. 0.2
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self, port=0):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"null")
+                with fake._lock:
+                    fake.requests += 1
+                fake.delay()
+                fake.handle(self, self.path, body)
+
+        self._server = _Server(("127.0.0.1", port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def delay(self):
+        if self.latency:
+            time.sleep(max(0.0, self.latency * (1 + random.uniform(-self.jitter, self.jitter))))
+
+    def handle(self, handler, path, body):
+        raise NotImplementedError
+
+    @staticmethod
+    def send_json(handler, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+
+class FakeUpstash(FakeServer):
+    """In-memory Redis behind the Upstash REST protocol (single commands and /pipeline)."""
+
+    def __init__(self, latency=0.0, jitter=0.0):
+        super().__init__(latency, jitter)
+        self.data = {}
+
+    def run(self, command):
+        name, args = str(command[0]).upper(), command[1:]
+        with self._lock:
+            if name == "GET":
+                return self.data.get(args[0])
+            if name == "SET":
+                self.data[args[0]] = args[1]
+                return "OK"
+            if name == "MGET":
+                # Like Redis, keys holding a hash read as nil
+                return [value if isinstance(value, str) else None for value in map(self.data.get, args)]
+            if name == "DEL":
+                return sum(self.data.pop(key, None) is not None for key in args)
+            if name == "EXISTS":
+                return sum(key in self.data for key in args)
+            if name == "HSET":
+                fields = self.data.setdefault(args[0], {})
+                added = sum(field not in fields for field in args[1::2])
+                fields.update(zip(args[1::2], args[2::2]))
+                return added
+            if name == "HDEL":
+                fields = self.data.get(args[0], {})
+                removed = sum(fields.pop(field, None) is not None for field in args[1:])
+                if not fields:
+                    self.data.pop(args[0], None)
+                return removed
+            if name == "HKEYS":
+                return list(self.data.get(args[0], {}))
+            if name == "HSCAN":
+                fields = sorted(self.data.get(args[0], {}).items())
+                cursor, batch = self._scan_page(fields, args[1], args[2:])
+                return [cursor, [item for pair in batch for item in pair]]
+            if name == "SCAN":
+                options = {str(k).upper(): v for k, v in zip(args[1::2], args[2::2])}
+                pattern = options.get("MATCH", "*")
+                return self._scan_page(sorted(key for key in self.data if fnmatch.fnmatchcase(key, pattern)),
+                                       args[0], args[1:])
+        raise ValueError(f"ERR unknown command '{name}'")
+
+    @staticmethod
+    def _scan_page(items, cursor, options):
+        """COUNT items from offset `cursor`, and the next cursor ("0" once the scan is done)."""
+        options = {str(k).upper(): v for k, v in zip(options[0::2], options[1::2])}
+        start, count = int(cursor), int(options.get("COUNT", 10))
+        end = start + count
+        return [str(end) if end < len(items) else "0", items[start:end]]
+
+    def handle(self, handler, path, body):
+        if path.rstrip("/") == "/pipeline":
+            results = []
+            for command in body:
+                try:
+                    results.append({"result": self.run(command)})
+                except ValueError as e:
+                    results.append({"error": str(e)})
+            return self.send_json(handler, 200, results)
+        try:
+            return self.send_json(handler, 200, {"result": self.run(body)})
+        except ValueError as e:
+            return self.send_json(handler, 400, {"error": str(e)})
+
+
+class FakeNotion(FakeServer):
+    """
+    POST /databases/<id>/query over a fixed list of pages, with start_cursor pagination.
+    The next `throttle` queries are answered 429 with a `retry_after` Retry-After header.
+    """
+
+    def __init__(self, pages, latency=0.0, jitter=0.0, throttle=0, retry_after="0.1"):
+        super().__init__(latency, jitter)
+        self.pages = pages
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.queries = []  # request bodies of the answered queries
+
+    def handle(self, handler, path, body):
+        if not path.endswith("/query"):
+            return self.send_json(handler, 404, {"object": "error", "message": f"Unknown path {path}"})
+        with self._lock:
+            throttled = self.throttle > 0
+            self.throttle -= throttled
+            if not throttled:
+                self.queries.append(body)
+        if throttled:
+            data = json.dumps({"object": "error", "code": "rate_limited"}).encode("utf-8")
+            handler.send_response(429)
+            handler.send_header("Retry-After", self.retry_after)
+            handler.send_header("Content-Type", "application/json")
+            handler.send_header("Content-Length", str(len(data)))
+            handler.end_headers()
+            handler.wfile.write(data)
+            return
+        pages = self.pages
+        since = ((body.get("filter") or {}).get("last_edited_time") or {}).get("on_or_after")
+        if since:
+            pages = [page for page in pages if page["last_edited_time"] >= since]
+        start = int(body.get("start_cursor") or 0)
+        end = start + min(int(body.get("page_size", 100)), 100)
+        has_more = end < len(pages)
+        self.send_json(handler, 200, {"object": "list", "results": pages[start:end],
+                                      "has_more": has_more, "next_cursor": str(end) if has_more else None})
+
+
+class FakeMistral(FakeServer):
+    """
+    POST /v1/chat/completions, streamed or not. Prompts carrying CrewAI's format
+    instructions get a "Final Answer:" reply so an agent run finishes in one call.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, answer_words=60):
+        super().__init__(latency, jitter)
+        self.answer_words = answer_words
+
+    def answer(self, messages):
+        question = str(messages[-1].get("content", ""))[:80] if messages else ""
+        text = " ".join(["Synthetic answer to:", question] + ["lorem"] * self.answer_words)
+        if any("Final Answer:" in str(message.get("content", "")) for message in messages):
+            return f"Thought: I now know the final answer\nFinal Answer: {text}"
+        return text
+
+    def handle(self, handler, path, body):
+        if not path.rstrip("/").endswith("/chat/completions"):
+            return self.send_json(handler, 404, {"message": f"Unknown path {path}"})
+        text = self.answer(body.get("messages") or [])
+        model = body.get("model", "mistral-small-latest")
+        usage = {"prompt_tokens": 1, "completion_tokens": len(text.split()), "total_tokens": 1 + len(text.split())}
+        if not body.get("stream"):
+            return self.send_json(handler, 200, {
+                "id": "fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            chunk = {"id": "fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                     "choices": [{"index": 0, "delta": {"role": "assistant", "content": word + " " * (i < len(words) - 1)},
+                                  "finish_reason": "stop" if i == len(words) - 1 else None}]}
+            self._write_chunk(handler, f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self._write_chunk(handler, b"data: [DONE]\n\n")
+        handler.wfile.write(b"0\r\n\r\n")
+
+    @staticmethod
+    def _write_chunk(handler, data):
+        handler.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
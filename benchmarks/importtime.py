@@ -0,0 +1,130 @@
+"""
+Import-time report of the app entry points, from `python -X importtime`.
+
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --modules app src.vectorstore --compare benchmarks/results/<earlier run>.json
+
+For each module the import is run in a fresh interpreter (best of --repeat runs) and the
+result lists the total, the slowest direct imports and the packages that cost the most.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+from benchmarks import report
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Importing the entry points must not reach any external service
+IMPORT_ENV = {
+    "NOTION_TOKEN": "importtime",
+    "DATABASE_ID": "importtime",
+    "UPSTASH_REDIS_REST_URL": "http://127.0.0.1:9",
+    "UPSTASH_REDIS_REST_TOKEN": "importtime",
+    "MISTRAL_API_KEY": "importtime",
+    "OTEL_SDK_DISABLED": "true",
+    "CREWAI_DISABLE_TELEMETRY": "true",
+    "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+}
+
+
+def parse_importtime(stderr):
+    """[(module, depth, self us, cumulative us)] from the -X importtime output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        entries.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return entries
+
+
+def measure(module):
+    env = {**os.environ, **IMPORT_ENV}
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=REPO_DIR,
+                             env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{process.stderr[-2000:]}")
+    return wall, parse_importtime(process.stderr)
+
+
+def summarize(module, repeat, top):
+    runs = [measure(module) for _ in range(repeat)]
+    wall, entries = min(runs, key=lambda run: sum(entry[2] for entry in run[1]))
+
+    packages = {}
+    for name, _, self_us, _ in entries:
+        package = name.split(".", 1)[0]
+        packages[package] = packages.get(package, 0) + self_us
+    target = [i for i, entry in enumerate(entries) if entry[0] == module and entry[1] == 0]
+    # Children are printed before their parent: the target's direct imports are the depth-1
+    # entries since the previous top-level import
+    direct = []
+    if target:
+        for entry in reversed(entries[:target[-1]]):
+            if entry[1] == 0:
+                break
+            if entry[1] == 1:
+                direct.append(entry)
+
+    return {
+        "import_ms": round((entries[target[-1]][3] if target else sum(entry[2] for entry in entries)) / 1000, 1),
+        "all_imports_ms": round(sum(entry[2] for entry in entries) / 1000, 1),
+        "interpreter_wall_ms": round(wall * 1000, 1),
+        "modules": len(entries),
+        "slowest_direct_imports_ms": {name: round(cumulative / 1000, 1) for name, _, _, cumulative in
+                                      sorted(direct, key=lambda entry: -entry[3])[:top]},
+        "heaviest_packages_ms": {name: round(self_us / 1000, 1) for name, self_us in
+                                 sorted(packages.items(), key=lambda item: -item[1])[:top]},
+        "loaded": sorted(packages),
+    }
+
+
+def compare(result, baseline):
+    print(f"\n=== Compared to {baseline.get('commit')} ({baseline.get('timestamp')}) ===")
+    for module, summary in result["modules"].items():
+        before = baseline.get("modules", {}).get(module)
+        if before:
+            print(f"{module:<24} {before['import_ms']:9.1f} ms -> {summary['import_ms']:9.1f} ms")
+            added = sorted(set(summary["loaded"]) - set(before["loaded"]))
+            if added:
+                print(f"{'':<24} newly imported: {', '.join(added)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=["app", "main"])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per module, the fastest is kept")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--out", help="result file (default benchmarks/results/importtime-<commit>-<time>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    result = {
+        "commit": report.git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "params": vars(args),
+        "modules": {},
+    }
+    for module in args.modules:
+        summary = result["modules"][module] = summarize(module, args.repeat, args.top)
+        print(f"{module:<24} {summary['import_ms']:9.1f} ms  ({summary['modules']} modules, "
+              f"interpreter {summary['interpreter_wall_ms']:.0f} ms)")
+        for name, ms in summary["slowest_direct_imports_ms"].items():
+            print(f"    {name:<36} {ms:9.1f} ms")
+
+    report.write_result(result, args.out, prefix="importtime")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+End-to-end load test of app.py against local Upstash, Notion and Mistral stand-ins.
+
+    python -m benchmarks.loadtest --rows 1000 --rate 20 --duration 30 --llm-latency 0.8
+    python -m benchmarks.loadtest --modes stdllm --rate 50 --distinct 20   # mostly answer-cache hits
+    python -m benchmarks.loadtest --modes agent --rate 2 --batch-size 25    # /chat/batch
+
+Boots the app with uvicorn against the fakes (synthetic rows and a random embedding matrix),
+drives /chat in agent and /stdllm modes at a fixed request rate (open loop: requests are sent
+on schedule whether or not earlier ones finished) and reports throughput, errors and latency.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+
+# connect_notion checks for credentials at import time, the load test only uses its row parser
+for _name in ("NOTION_TOKEN", "DATABASE_ID", "UPSTASH_REDIS_REST_URL", "UPSTASH_REDIS_REST_TOKEN"):
+    os.environ.setdefault(_name, "load-test")
+
+from src.connect_notion import extract_notion_rows  # noqa: E402
+from benchmarks import synthetic, report  # noqa: E402
+from benchmarks.fakes import FakeUpstash, FakeNotion, FakeMistral  # noqa: E402
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The app hard-codes its rag_config path, the load test swaps it in and restores it afterwards
+RAG_CONFIG_PATH = "/tmp/rag/rag_config.json"
+DEFAULT_RAG_CONFIG_PATH = os.path.join(REPO_DIR, "rag", "default_rag_config.json")
+
+# Mode markers the app reads from the question (see MODE_MARKERS in app.py)
+MODE_PREFIXES = {"agent": "/truN-nh", "stdllm": "/stdllm-nh"}
+
+# /chat answers failures with status 200 and one of these messages
+ERROR_ANSWERS = ("Encountered an error", "Sorry, something went wrong")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_fakes(args, pages):
+    upstash = FakeUpstash(args.upstash_latency, args.jitter).start()
+    notion = FakeNotion(pages, args.notion_latency, args.jitter).start()
+    mistral = FakeMistral(args.llm_latency, args.jitter).start()
+    return {"upstash": upstash, "notion": notion, "mistral": mistral}
+
+
+def app_environment(fakes, work_dir):
+    env = dict(os.environ)
+    env.update({
+        "NOTION_TOKEN": "load-test",
+        "DATABASE_ID": "load-test",
+        "NOTION_API_URL": fakes["notion"].url,
+        "UPSTASH_REDIS_REST_URL": fakes["upstash"].url,
+        "UPSTASH_REDIS_REST_TOKEN": "load-test",
+        "MISTRAL_API_KEY": "load-test",
+        "MISTRAL_SERVER_URL": fakes["mistral"].url,
+        "INDEX_DIR": os.path.join(work_dir, "index"),
+        "GLOVE_CACHE_DIR": os.path.join(work_dir, "glove"),
+        "GLOVE_MODEL_PATH": os.path.join(work_dir, "glove", "missing.txt"),
+        # Nothing may leave the machine
+        "OTEL_SDK_DISABLED": "true",
+        "CREWAI_DISABLE_TELEMETRY": "true",
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+        "PYTHONUNBUFFERED": "1",
+    })
+    return env
+
+
+def boot_app(args, env, log_file):
+    port = args.port or free_port()
+    command = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(args.workers), "--log-level", "warning"]
+    process = subprocess.Popen(command, cwd=REPO_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+
+    # Waits for the boot to finish (index served, crew pool built, startup refresh done)
+    start = time.perf_counter()
+    listening = None
+    while time.perf_counter() - start < args.startup_timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited during startup with code {process.returncode}, see {log_file.name}")
+        try:
+            status = httpx.get(f"{base_url}/readyz", timeout=2).json()
+            if listening is None:
+                listening = time.perf_counter() - start
+            if status["stage"] in ("ready", "refresh_failed", "failed"):
+                if not status["ready"]:
+                    raise RuntimeError(f"App failed to boot ({status.get('error')}), see {log_file.name}")
+                return process, base_url, {"listening_seconds": round(listening, 2),
+                                           "boot_seconds": round(time.perf_counter() - start, 2),
+                                           "boot_stage": status["stage"]}
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"App did not become ready within {args.startup_timeout}s, see {log_file.name}")
+
+
+async def send_chat(client, base_url, questions):
+    """One /chat request, or one /chat/batch request for several questions (failed if any item failed)."""
+    start = time.perf_counter()
+    try:
+        if len(questions) == 1:
+            response = await client.post(f"{base_url}/chat", json={"question": questions[0], "history": []})
+        else:
+            response = await client.post(f"{base_url}/chat/batch", json={
+                "queries": [{"question": question, "history": []} for question in questions]})
+        latency = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            return latency, f"http_{response.status_code}"
+        body = response.json()
+        items = body["results"] if len(questions) > 1 else [body]
+        if any("error" in item for item in items):
+            return latency, "item_error"
+        failed = any(str(item.get("answer", "")).startswith(ERROR_ANSWERS) for item in items)
+        return latency, "error_answer" if failed else None
+    except httpx.TimeoutException:
+        return (time.perf_counter() - start) * 1000, "timeout"
+    except httpx.HTTPError as e:
+        return (time.perf_counter() - start) * 1000, type(e).__name__
+
+
+async def drive(base_url, questions, rate, duration, timeout, max_connections, batch_size=1):
+    """
+    Sends one request of `batch_size` questions every 1/rate seconds for `duration` seconds
+    and waits for all of them.
+    """
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        tasks = []
+        lag = 0.0
+        for i in range(int(rate * duration)):
+            scheduled = start + i / rate
+            await asyncio.sleep(max(0.0, scheduled - loop.time()))
+            lag = max(lag, loop.time() - scheduled)
+            batch = [questions[(i * batch_size + j) % len(questions)] for j in range(batch_size)]
+            tasks.append(asyncio.create_task(send_chat(client, base_url, batch)))
+        results = await asyncio.gather(*tasks)
+        elapsed = loop.time() - start
+    return results, elapsed, lag
+
+
+def run_phase(mode, args, base_url, queries, fakes):
+    prefix = MODE_PREFIXES[mode]
+    questions = [f"{prefix} {query}" for query in queries]
+    llm_calls = fakes["mistral"].requests
+
+    results, elapsed, lag = asyncio.run(
+        drive(base_url, questions, args.rate, args.duration, args.timeout, args.max_connections, args.batch_size)
+    )
+
+    errors = {}
+    for _, error in results:
+        if error:
+            errors[error] = errors.get(error, 0) + 1
+    ok = [latency for latency, error in results if not error]
+    phase = {
+        "mode": mode,
+        "target_rps": args.rate,
+        "sent": len(results),
+        "succeeded": len(ok),
+        "achieved_rps": round(len(ok) / elapsed, 2) if elapsed else None,
+        "batch_size": args.batch_size,
+        "questions_per_second": round(len(ok) * args.batch_size / elapsed, 2) if elapsed else None,
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else None,
+        "errors": errors,
+        "latency": report.latency_summary(ok),
+        "llm_requests": fakes["mistral"].requests - llm_calls,
+        "max_send_lag_ms": round(lag * 1000, 2),
+        "elapsed_seconds": round(elapsed, 2),
+    }
+    latency = phase["latency"]
+    print(f"{mode:<7} sent {phase['sent']:>6}  ok {phase['succeeded']:>6}  {phase['achieved_rps']:>8} req/s  "
+          f"errors {phase['error_rate']:.2%}  p50 {latency.get('p50_ms', 0):.1f} ms  "
+          f"p99 {latency.get('p99_ms', 0):.1f} ms  LLM calls {phase['llm_requests']}")
+    if args.batch_size > 1:
+        print(f"        {phase['questions_per_second']} questions/s in batches of {args.batch_size}")
+    if errors:
+        print(f"        {errors}")
+    return phase
+
+
+def swap_rag_config(args):
+    """Writes the rag_config the app boots with, returns it and the previous file content (or None)."""
+    previous = None
+    if os.path.exists(RAG_CONFIG_PATH):
+        with open(RAG_CONFIG_PATH, "r") as f:
+            previous = f.read()
+    with open(DEFAULT_RAG_CONFIG_PATH, "r") as f:
+        config = json.load(f)
+    config["agent"] = {**config.get("agent", {}), "mode": args.agent_mode}
+    if args.pool_size:
+        config["agent"]["pool_size"] = args.pool_size
+    os.makedirs(os.path.dirname(RAG_CONFIG_PATH), exist_ok=True)
+    with open(RAG_CONFIG_PATH, "w") as f:
+        json.dump(config, f, indent=2)
+    return config, previous
+
+
+def restore_rag_config(previous):
+    if previous is None:
+        os.remove(RAG_CONFIG_PATH)
+    else:
+        with open(RAG_CONFIG_PATH, "w") as f:
+            f.write(previous)
+
+
+def run(args):
+    random.seed(args.seed)
+    vocabulary = synthetic.make_vocabulary(seed=args.seed)
+    generator = synthetic.NotionGenerator(vocabulary, synthetic.parse_property_mix(args.mix) or None,
+                                          seed=args.seed)
+    pages = [page for response in generator.responses(args.rows) for page in response["results"]]
+
+    # Questions are built from parsed rows, like a user asking about their own data
+    rows = extract_notion_rows({"results": random.sample(pages, min(args.distinct, len(pages)))})
+    queries = [generator.query(row) for row in rows]
+
+    work_dir = tempfile.mkdtemp(prefix="truenotion-load-")
+    synthetic.write_glove_cache(synthetic.make_embedder(vocabulary, seed=args.seed), os.path.join(work_dir, "glove"))
+    fakes = start_fakes(args, pages)
+    config, previous_config = swap_rag_config(args)
+    log_path = args.app_log or os.path.join(work_dir, "app.log")
+    process = None
+    try:
+        with open(log_path, "w") as log_file:
+            print(f"Booting app against local fakes (log: {log_path})..")
+            process, base_url, startup = boot_app(args, app_environment(fakes, work_dir), log_file)
+            print(f"App listening after {startup['listening_seconds']:.1f}s, ready after "
+                  f"{startup['boot_seconds']:.1f}s, {fakes['notion'].requests} Notion and "
+                  f"{fakes['upstash'].requests} Upstash requests.\n")
+
+            phases = [run_phase(mode, args, base_url, queries, fakes) for mode in args.modes]
+            cache_stats = httpx.get(f"{base_url}/cache-stats", timeout=10).json()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        for fake in fakes.values():
+            fake.stop()
+        restore_rag_config(previous_config)
+        if not args.app_log and not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "commit": report.git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": vars(args),
+        "agent": config["agent"],
+        "startup": startup,
+        "phases": phases,
+        "cache_stats": cache_stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="synthetic Notion rows served to the app")
+    parser.add_argument("--mix", default="", help='property mix, e.g. "rich_text=3,select=2,title=1"')
+    parser.add_argument("--modes", nargs="+", choices=tuple(MODE_PREFIXES), default=list(MODE_PREFIXES))
+    parser.add_argument("--rate", type=float, default=10.0, help="requests per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per mode")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="questions per request, above 1 they are sent to /chat/batch")
+    parser.add_argument("--distinct", type=int, default=200,
+                        help="distinct questions, fewer than rate * duration makes repeats (answer-cache hits)")
+    parser.add_argument("--agent-mode", choices=("crew", "direct"), default="crew")
+    parser.add_argument("--pool-size", type=int, help="crew pool size (default from rag_config)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake Mistral response")
+    parser.add_argument("--upstash-latency", type=float, default=0.005)
+    parser.add_argument("--notion-latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.2, help="+- share of each latency")
+    parser.add_argument("--timeout", type=float, default=60.0, help="client timeout per request")
+    parser.add_argument("--max-connections", type=int, default=256)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--app-log", help="write the app output here (kept after the run)")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary index and embedding files")
+    parser.add_argument("--out", help="result file (default benchmarks/results/load-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    report.write_result(run(args), args.out, prefix="load")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Helpers shared by the benchmark scripts: result files and latency summaries.
+"""
+import os
+import json
+import time
+import subprocess
+
+import numpy as np
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def latency_summary(timings_ms):
+    """Percentiles of a list of latencies in milliseconds."""
+    if not len(timings_ms):
+        return {"count": 0}
+    timings = np.asarray(timings_ms)
+    return {
+        "count": len(timings),
+        "p50_ms": round(float(np.percentile(timings, 50)), 4),
+        "p90_ms": round(float(np.percentile(timings, 90)), 4),
+        "p99_ms": round(float(np.percentile(timings, 99)), 4),
+        "max_ms": round(float(timings.max()), 4),
+        "mean_ms": round(float(timings.mean()), 4),
+    }
+
+
+def write_result(result, out=None, prefix="bench"):
+    """Writes `result` as JSON to `out` (default benchmarks/results/<prefix>-<commit>-<time>.json)."""
+    if not out:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"{prefix}-{result.get('commit') or 'local'}-{int(time.time())}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults written to {out}")
+    return out
@@ -0,0 +1,173 @@
+"""
+Offline ingestion and retrieval benchmarks over synthetic Notion data.
+
+    python -m benchmarks.run --rows 5000 --queries 500
+    python -m benchmarks.run --rows 5000 --compare benchmarks/results/<earlier run>.json
+
+Writes a JSON result (throughput, peak RSS, query latency percentiles) to benchmarks/results/.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import tempfile
+
+# The pipeline modules check for credentials at import time, the benchmark never contacts these services
+for _name in ("NOTION_TOKEN", "DATABASE_ID", "UPSTASH_REDIS_REST_URL", "UPSTASH_REDIS_REST_TOKEN"):
+    os.environ.setdefault(_name, "offline-benchmark")
+
+from src import connect_notion, vectorstore, chunker  # noqa: E402
+from src.index_store import IndexStore  # noqa: E402
+from benchmarks import synthetic, report  # noqa: E402
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Stages:
+    """Times benchmark stages and records throughput and the peak RSS after each."""
+
+    def __init__(self):
+        self.results = {}
+
+    def run(self, name, fn, items=None, *args):
+        start = time.perf_counter()
+        value = fn(*args)
+        seconds = time.perf_counter() - start
+        count = items(value) if callable(items) else items
+        self.results[name] = {
+            "seconds": round(seconds, 4),
+            "items": count,
+            "items_per_second": round(count / seconds, 1) if count and seconds else None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        print(f"{name:<24} {seconds:9.3f}s  {count if count is not None else '':>9}  "
+              f"{self.results[name]['items_per_second'] or '':>12}/s  peak RSS {self.results[name]['peak_rss_mb']} MB")
+        return value
+
+
+def query_latency(retriever, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        retriever.get_relevant_documents(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    summary = report.latency_summary(timings)
+    summary["qps"] = round(len(timings) / (sum(timings) / 1000), 1)
+    return summary
+
+
+def run(args):
+    random.seed(args.seed)
+    vocabulary = synthetic.make_vocabulary(seed=args.seed)
+    embedder = synthetic.make_embedder(vocabulary, dim=args.dim, seed=args.seed)
+    # create_vectorstore and initialize_system pick up this embedder instead of loading GloVe
+    vectorstore._embedder = embedder
+    generator = synthetic.NotionGenerator(vocabulary, synthetic.parse_property_mix(args.mix) or None,
+                                          seed=args.seed)
+    stages = Stages()
+
+    responses = stages.run("generate", lambda: list(generator.responses(args.rows)), args.rows)
+    rows = stages.run("extract_notion_rows",
+                      lambda pages: [row for page in pages for row in connect_notion.extract_notion_rows(page)],
+                      len, responses)
+    del responses
+
+    # Character chunking of the indented JSON rows, the original pipeline
+    json_docs = [vectorstore.row_document(row, connect_notion.NOTION_ROWS_KEY, mode="characters") for row in rows]
+    chunks = stages.run("chunk_documents", vectorstore.chunk_documents, len, json_docs, args.chunk_size)
+    store = stages.run("create_vectorstore", lambda: vectorstore.create_vectorstore(chunks), len(chunks))
+    del json_docs
+
+    # Incremental IndexStore path used by initialize_system, with structure-aware chunking
+    config = chunker.chunking_config({"mode": args.chunking})
+    chunk_size = chunker.chunk_budget(config, args.chunk_size)
+    index_config = {"type": args.index_type, "quantizer": args.quantizer, "recall_check": args.recall_check}
+    with tempfile.TemporaryDirectory() as index_dir:
+        index_store = IndexStore(index_dir)
+        docs = lambda: (vectorstore.row_document(row, connect_notion.NOTION_ROWS_KEY, mode=args.chunking) for row in rows)
+        sync = lambda: index_store.sync(docs(), chunk_size, embedder.dim, vectorstore.row_chunk_fn(config),
+                                        embedder.embed_documents, index_config=index_config)
+        stages.run("index_store_sync", sync, args.rows)
+        stages.run("index_store_resync", sync, args.rows)
+        stages.run("index_store_save", index_store.save, len(index_store.chunks))
+        indexed = vectorstore.vectorstore_from_store(index_store, embedder)
+
+        queries = [generator.query(row) for row in random.choices(rows, k=args.queries)]
+        latency = {
+            "create_vectorstore": query_latency(store.as_retriever({"k": args.k}), queries),
+            "index_store": query_latency(indexed.as_retriever({"k": args.k}), queries),
+        }
+
+    for name, result in latency.items():
+        print(f"query {name:<18} p50 {result['p50_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms  {result['qps']} q/s")
+
+    return {
+        "commit": report.git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "params": vars(args),
+        "corpus": {
+            "rows": len(rows),
+            "character_chunks": len(chunks),
+            "index_store_chunks": len(index_store.chunks),
+            "index_bytes": indexed.index_bytes,
+            "chunk_store_bytes": indexed.chunk_store_bytes,
+            "chunk_store_mapped_bytes": indexed.chunk_store_mapped_bytes,
+        },
+        "index_build": index_store.build_report,
+        "stages": stages.results,
+        "query_latency": latency,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(result, baseline):
+    """Prints how each stage and latency figure moved against an earlier result."""
+    print(f"\n=== Compared to {baseline.get('commit')} ({baseline.get('timestamp')}) ===")
+    for name, stage in result["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if before and before["seconds"]:
+            print(f"{name:<24} {stage['seconds'] / before['seconds']:6.2f}x time")
+    for name, latency in result["query_latency"].items():
+        before = baseline.get("query_latency", {}).get(name)
+        if before:
+            print(f"query {name:<18} p50 {latency['p50_ms'] / before['p50_ms']:6.2f}x  "
+                  f"p99 {latency['p99_ms'] / before['p99_ms']:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000, help="synthetic Notion rows")
+    parser.add_argument("--mix", default="", help='property mix, e.g. "rich_text=3,select=2,title=1"')
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunking", choices=("properties", "characters"), default="properties")
+    parser.add_argument("--index-type", default="auto", help="flat, ivf_flat, hnsw, ivf_pq or auto")
+    parser.add_argument("--quantizer", default="none", help="none, sq_fp16, sq8 or pq")
+    parser.add_argument("--recall-check", action="store_true", help="measure the index recall@10 at build time")
+    parser.add_argument("--dim", type=int, default=synthetic.EMBEDDING_DIM)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="result file (default benchmarks/results/bench-<commit>-<time>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    result = run(args)
+
+    report.write_result(result, args.out)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
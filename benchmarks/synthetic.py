@@ -0,0 +1,145 @@
+"""
+Synthetic Notion data and a small random embedding matrix, so benchmarks run offline.
+"""
+import os
+import json
+import uuid
+import random
+
+import numpy as np
+
+from src.embedder import Embedder
+
+# Default number of properties of each Notion type per row
+DEFAULT_PROPERTY_MIX = {
+    "title": 1,
+    "rich_text": 3,
+    "select": 2,
+    "multi_select": 1,
+    "number": 1,
+    "date": 1,
+    "checkbox": 1,
+    "email": 1,
+    "url": 1,
+    "people": 1,
+}
+
+VOCAB_SIZE = 20000
+EMBEDDING_DIM = 50
+# Share of the synthetic vocabulary the embedding matrix knows, the rest are misses like rare names
+EMBEDDING_COVERAGE = 0.8
+
+
+def parse_property_mix(value):
+    """"rich_text=3,select=2" -> {"rich_text": 3, "select": 2}."""
+    mix = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, count = item.split("=", 1)
+            mix[name.strip()] = int(count)
+    return mix
+
+
+def make_vocabulary(size=VOCAB_SIZE, seed=0):
+    rng = random.Random(seed)
+    syllables = ["ka", "lo", "mi", "ra", "te", "su", "no", "vi", "pa", "de", "ri", "zo", "an", "el", "or", "us"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_embedder(vocabulary, dim=EMBEDDING_DIM, coverage=EMBEDDING_COVERAGE, seed=0):
+    """Embedder over a random float32 matrix standing in for the GloVe vectors."""
+    rng = np.random.default_rng(seed)
+    known = vocabulary[:int(len(vocabulary) * coverage)]
+    vectors = rng.standard_normal((len(known), dim)).astype("float32")
+    return Embedder({word: i for i, word in enumerate(known)}, vectors)
+
+
+class NotionGenerator:
+    """Builds Notion database query responses (the raw API shape extract_notion_rows parses)."""
+
+    def __init__(self, vocabulary, property_mix=None, text_words=(5, 80), seed=0):
+        self.vocabulary = vocabulary
+        self.property_mix = property_mix or DEFAULT_PROPERTY_MIX
+        self.text_words = text_words
+        self.rng = random.Random(seed)
+        self.options = [self.rng.choice(vocabulary).title() for _ in range(30)]
+        self.people = [f"{self.rng.choice(vocabulary).title()} {self.rng.choice(vocabulary).title()}"
+                       for _ in range(50)]
+
+    def words(self, low, high):
+        return " ".join(self.rng.choices(self.vocabulary, k=self.rng.randint(low, high)))
+
+    def _rich_text(self, text):
+        return [{"type": "text", "plain_text": text, "text": {"content": text}}]
+
+    def property_value(self, prop_type):
+        rng = self.rng
+        if prop_type == "title":
+            return {"type": "title", "title": self._rich_text(self.words(2, 5).title())}
+        if prop_type == "rich_text":
+            return {"type": "rich_text", "rich_text": self._rich_text(self.words(*self.text_words))}
+        if prop_type == "select":
+            return {"type": "select", "select": {"name": rng.choice(self.options)}}
+        if prop_type == "multi_select":
+            return {"type": "multi_select",
+                    "multi_select": [{"name": name} for name in rng.sample(self.options, rng.randint(0, 4))]}
+        if prop_type == "number":
+            return {"type": "number", "number": round(rng.uniform(0, 10000), 2)}
+        if prop_type == "date":
+            return {"type": "date", "date": {"start": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                                             "end": None, "time_zone": None}}
+        if prop_type == "checkbox":
+            return {"type": "checkbox", "checkbox": rng.random() < 0.5}
+        if prop_type == "email":
+            return {"type": "email", "email": f"{rng.choice(self.vocabulary)}@example.com"}
+        if prop_type == "url":
+            return {"type": "url", "url": f"https://example.com/{rng.choice(self.vocabulary)}"}
+        if prop_type == "phone_number":
+            return {"type": "phone_number", "phone_number": f"+49 {rng.randint(100000000, 999999999)}"}
+        if prop_type == "people":
+            return {"type": "people", "people": [{"name": name} for name in rng.sample(self.people, rng.randint(1, 3))]}
+        raise ValueError(f"Unsupported synthetic property type '{prop_type}'")
+
+    def page(self):
+        properties = {}
+        for prop_type, count in self.property_mix.items():
+            for i in range(count):
+                name = "Name" if prop_type == "title" else f"{prop_type.replace('_', ' ').title()} {i + 1}"
+                properties[name] = self.property_value(prop_type)
+        return {
+            "object": "page",
+            "id": str(uuid.UUID(int=self.rng.getrandbits(128))),
+            "last_edited_time": "2025-01-01T00:00:00.000Z",
+            "properties": properties,
+        }
+
+    def responses(self, rows, page_size=100):
+        """Yields query responses of up to `page_size` pages, like the paginated Notion API."""
+        for start in range(0, rows, page_size):
+            count = min(page_size, rows - start)
+            yield {"object": "list", "results": [self.page() for _ in range(count)],
+                   "has_more": start + count < rows, "next_cursor": None}
+
+    def query(self, row):
+        """A question about a row: its title plus a few of its words."""
+        title = row["properties"].get("Name", "")
+        texts = [value for value in row["properties"].values() if isinstance(value, str) and value != title]
+        words = self.rng.choice(texts).split() if texts else []
+        return " ".join([title] + self.rng.sample(words, min(3, len(words))))
+
+
+def write_glove_cache(embedder, cache_dir):
+    """Writes `embedder` in the binary GloVe cache layout, so the app loads it instead of the real vectors."""
+    from src import glove_cache
+
+    os.makedirs(cache_dir, exist_ok=True)
+    dtype = str(embedder.vectors.dtype)
+    paths = glove_cache.cache_paths(cache_dir, dtype)
+    np.save(paths["vectors"], embedder.vectors)
+    with open(paths["vocab"], "w", encoding="utf-8") as f:
+        json.dump(sorted(embedder.vocab, key=embedder.vocab.get), f)
+    with open(paths["meta"], "w") as f:
+        json.dump({"dtype": dtype, "dim": embedder.dim, "signature": None}, f)
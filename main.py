@@ -5,10 +5,10 @@ suppress.all()
 import os
 import json
 from datetime import datetime
-from crewai import Crew
 from agents import load_default_agent
 from src import vectorstore, vectorstore #process
 from src.banner import print_banner
+from src import context_builder
 
 os.makedirs("/tmp/agents", exist_ok=True)
 os.makedirs("/tmp/rag", exist_ok=True)
@@ -23,9 +23,11 @@ crew_instance = None
 retriever = None
 loaded_files_reference = []
 disable_agent= False
+agent_mode = "crew"  # "crew" or "direct", from the "agent" section of rag_config
 k = None
 chunk_size = None
 memory = None  # Number of historical conversation pairs to include
+context_settings = context_builder.context_config()
 
 def load_rag_config():
     """Load the RAG configuration from file. Fallback to default if any error occurs."""
@@ -47,6 +49,9 @@ def load_rag_config():
 
 def initialize_agent():
     """Initializes and returns a Crew instance with the default data analysis agent."""
+    # crewai is only imported in crew mode, it takes seconds to import
+    from crewai import Crew
+
     load_default_agent.ConfigLoader()  # Loads any necessary config
     llm_setup = load_default_agent.LLMSetup()
     agent_factory = load_default_agent.DataAnalysisAgentFactory(llm_setup.llm)
@@ -61,12 +66,17 @@ def initialize_agent():
 
 def initialize_system(rag_parameters):
     """Initialize the retriever and log some configuration details."""
-    global retriever, loaded_files_reference, k, chunk_size, memory
+    global retriever, loaded_files_reference, k, chunk_size, memory, context_settings
     k = rag_parameters.get("k")
     chunk_size = rag_parameters.get("chunk_size")
     memory = rag_parameters.get("memory")
+    context_settings = context_builder.context_config(rag_parameters.get("context"))
     # This call is assumed to initialize and return the document retriever used to fetch context.
-    retriever, loaded_files_reference = vectorstore.initialize_system(adjusted_k=k, adjusted_chunk_size=chunk_size)
+    retriever, loaded_files_reference = vectorstore.initialize_system(
+        adjusted_k=k, adjusted_chunk_size=chunk_size, index_config=rag_parameters.get("index"),
+        retrieval_config=rag_parameters.get("retrieval"),
+        chunking_config=rag_parameters.get("chunking"),
+    )
     # Extend the log for reference (printed here for debugging purposes)
     loaded_files_reference.extend([
         "RAG Parameters:",
@@ -83,8 +93,10 @@ def chat_loop():
 
     while True:
         # Use only the most recent conversation turns as history (based on 'memory')
-        history_str = "\n".join(
-            [f"User: {q}\nTrueNotion AI: {a}" for q, a in chat_history[-memory:]]
+        history_str = context_builder.compress_history(
+            chat_history, memory,
+            max_tokens=context_settings["history_max_tokens"],
+            answer_chars=context_settings["history_answer_chars"], labels=("User", "TrueNotion AI"),
         )
 
         user_input = input("User: ").strip()
@@ -110,7 +122,7 @@ def chat_loop():
             # Get the relevant documents (context) for the query
             try:
                 retrieved_docs = retriever.get_relevant_documents(user_input)
-                context = "\n\n".join([doc.page_content for doc in retrieved_docs])
+                context = context_builder.build_context(retrieved_docs, context_settings["max_tokens"])
             except Exception as e:
                 print("Error retrieving document context:", e)
                 context = ""
@@ -137,8 +149,11 @@ def chat_loop():
             
             # Kick off the agent to get an answer
             try:
-                result = crew_instance.kickoff(inputs=inputs)
-                reply = result.tasks_output[0]
+                if agent_mode == "direct":
+                    reply = load_default_agent.DirectAgentResponse(inputs)
+                else:
+                    result = crew_instance.kickoff(inputs=inputs)
+                    reply = result.tasks_output[0]
                 safe_reply = str(reply) if reply is not None else "Sorry, something went wrong. Please try again."
             except Exception as e:
                 safe_reply = f"Encountered an error: {e}"
@@ -162,13 +177,19 @@ def chat_loop():
 def main():
     # Load the configuration parameters
     rag_parameters = load_rag_config()
+    # Agent and task definitions stored in Upstash (the bundled default until then)
+    load_default_agent.load_agent_config()
     
     # Initialize the retriever and log file reference using configuration parameters
     initialize_system(rag_parameters)
     
-    # Initialize the Crew instance (the agent)
-    global crew_instance
-    crew_instance = initialize_agent()
+    # Initialize the Crew instance (the agent), direct mode sends the agent task as one completion
+    global crew_instance, agent_mode
+    agent_mode = (rag_parameters.get("agent") or {}).get("mode", "crew")
+    if agent_mode == "direct":
+        load_default_agent.ConfigLoader()
+    else:
+        crew_instance = initialize_agent()
     
     # Start the interactive chat loop
     chat_loop()
@@ -0,0 +1,273 @@
+import math
+import time
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+# How flat, ivf_flat and hnsw indexes store the vectors: float32, float16 or int8 per
+# dimension (scalar quantizers) or pq_m codes of pq_nbits (product quantization).
+# ivf_pq always stores PQ codes.
+QUANTIZERS = ("none", "sq_fp16", "sq8", "pq")
+SCALAR_QUANTIZER_TYPES = {
+    "sq_fp16": faiss.ScalarQuantizer.QT_fp16,
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+# Defaults for the "index" section of rag_config.json. None means "pick from corpus size".
+DEFAULT_INDEX_CONFIG = {
+    "type": "auto",
+    "nlist": None,
+    "nprobe": 16,
+    "M": 32,
+    "efConstruction": 80,
+    "efSearch": 64,
+    "pq_m": None,
+    "pq_nbits": 8,
+    "quantizer": "none",
+    "rerank": None,
+    "train_sample": 100000,
+    "recall_check": True,
+}
+
+# Corpus sizes (chunks) at which "auto" moves to the next index type
+AUTO_IVF_FLAT_MIN = 50000
+AUTO_IVF_PQ_MIN = 2000000
+
+# FAISS wants roughly this many training points per IVF list
+TRAIN_POINTS_PER_LIST = 39
+
+# PQ-coded indexes fetch rerank * k candidates and re-rank them by exact distance to the
+# stored float32 embeddings (the "rerank" default, 0 turns it off)
+PQ_RERANK_FACTOR = 4
+
+# An automatically sized IVF index is retrained once the corpus grew or shrank this much
+RETRAIN_FACTOR = 4
+
+RECALL_K = 10
+RECALL_QUERIES = 200
+
+
+def index_config(config=None):
+    """Merges the "index" section of rag_config with the defaults."""
+    merged = dict(DEFAULT_INDEX_CONFIG)
+    merged.update({key: value for key, value in (config or {}).items() if value is not None})
+    return merged
+
+
+def resolve_spec(config, n, dim):
+    """
+    Concrete index type and build parameters for a corpus of `n` vectors.
+    Explicit IVF types fall back to flat, and PQ codes to sq8, while the corpus is too
+    small to train them.
+    """
+    config = index_config(config)
+    index_type = config["type"]
+    if index_type == "auto":
+        if n < AUTO_IVF_FLAT_MIN:
+            index_type = "flat"
+        elif n < AUTO_IVF_PQ_MIN:
+            index_type = "ivf_flat"
+        else:
+            index_type = "ivf_pq"
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES} or 'auto'")
+    quantizer = "pq" if index_type == "ivf_pq" else config["quantizer"]
+    if quantizer not in QUANTIZERS:
+        raise ValueError(f"Unknown quantizer '{quantizer}', expected one of {QUANTIZERS}")
+
+    spec = {"type": index_type, "auto_nlist": config["nlist"] is None}
+    if index_type in ("ivf_flat", "ivf_pq"):
+        nlist = config["nlist"] or int(4 * math.sqrt(max(n, 1)))
+        nlist = max(1, min(nlist, n // TRAIN_POINTS_PER_LIST))
+        if nlist < 2:
+            print(f"Info: {n} vectors are too few to train {index_type}, using a flat index.")
+            spec = {"type": "flat", "auto_nlist": True}
+        else:
+            spec.update(nlist=nlist, nprobe=config["nprobe"])
+    if quantizer == "pq":
+        spec.update(pq_m=config["pq_m"] or _default_pq_m(dim), pq_nbits=config["pq_nbits"])
+        if dim % spec["pq_m"]:
+            raise ValueError(f"pq_m={spec['pq_m']} must divide the embedding dimension {dim}")
+        if n < 2 ** spec["pq_nbits"]:
+            # The PQ codebooks need at least one training point per centroid
+            print(f"Info: {n} vectors are too few to train PQ codes, using sq8.")
+            quantizer = "sq8"
+            del spec["pq_m"], spec["pq_nbits"]
+    if spec["type"] == "ivf_pq" and quantizer != "pq":
+        spec["type"] = "ivf_flat"
+    if spec["type"] == "hnsw":
+        spec.update(M=config["M"], efConstruction=config["efConstruction"], efSearch=config["efSearch"])
+    if spec["type"] != "flat" or quantizer != "none":
+        spec["train_sample"] = config["train_sample"]
+
+    spec["quantizer"] = quantizer
+    rerank = config["rerank"]
+    if rerank is None:
+        rerank = PQ_RERANK_FACTOR if quantizer == "pq" else 0
+    spec["rerank"] = int(rerank) if quantizer != "none" else 0
+    return spec
+
+
+def _default_pq_m(dim):
+    """Largest divisor of dim giving sub-vectors of at least 2 dimensions."""
+    for m in range(dim // 2, 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def same_build(current, new):
+    """True if two specs describe the same index structure (search-time params may differ)."""
+    if current is None or current["type"] != new["type"]:
+        return False
+    if current.get("quantizer", "none") != new.get("quantizer", "none"):
+        return False
+    keys = ("M", "efConstruction", "pq_m", "pq_nbits")
+    if not new.get("auto_nlist"):
+        keys += ("nlist",)
+    return all(current.get(key) == new.get(key) for key in keys)
+
+
+def needs_retrain(spec, trained_size, n):
+    """Automatically sized IVF lists drift out of shape as the corpus changes size."""
+    if spec["type"] not in ("ivf_flat", "ivf_pq") or not spec.get("auto_nlist"):
+        return False
+    return n > trained_size * RETRAIN_FACTOR or n * RETRAIN_FACTOR < trained_size
+
+
+def supports_remove(index):
+    """Flat (IDMap) and IVF indexes can drop vectors in place, HNSW has to be rebuilt."""
+    return not isinstance(_inner(index), faiss.IndexHNSW)
+
+
+def _inner(index):
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def build_index(spec, embeddings, ids):
+    """Builds and fills an index for `spec`, training IVF lists and vector codes on a random sample."""
+    dim = embeddings.shape[1]
+    index_type = spec["type"]
+    codes = spec.get("quantizer", "none")
+
+    if index_type == "flat":
+        if codes == "none":
+            inner = faiss.IndexFlatL2(dim)
+        elif codes == "pq":
+            inner = faiss.IndexPQ(dim, spec["pq_m"], spec["pq_nbits"])
+        else:
+            inner = faiss.IndexScalarQuantizer(dim, SCALAR_QUANTIZER_TYPES[codes])
+        # A plain IDMap: IDMap2's id -> row hash map (reconstruct by id) is never used and
+        # would be rebuilt in the heap of every process loading the index
+        index = faiss.IndexIDMap(inner)
+    elif index_type == "hnsw":
+        if codes == "none":
+            hnsw = faiss.IndexHNSWFlat(dim, spec["M"])
+        elif codes == "pq":
+            hnsw = faiss.IndexHNSWPQ(dim, spec["pq_m"], spec["M"], spec["pq_nbits"])
+        else:
+            hnsw = faiss.IndexHNSWSQ(dim, SCALAR_QUANTIZER_TYPES[codes], spec["M"])
+        hnsw.hnsw.efConstruction = spec["efConstruction"]
+        index = faiss.IndexIDMap(hnsw)
+    else:
+        quantizer = faiss.IndexFlatL2(dim)
+        if codes == "pq":
+            index = faiss.IndexIVFPQ(quantizer, dim, spec["nlist"], spec["pq_m"], spec["pq_nbits"])
+        elif codes == "none":
+            index = faiss.IndexIVFFlat(quantizer, dim, spec["nlist"])
+        else:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, spec["nlist"], SCALAR_QUANTIZER_TYPES[codes])
+    if not index.is_trained:
+        # IVF coarse quantizers, PQ codebooks and scalar quantizer ranges
+        index.train(_training_sample(embeddings, spec["train_sample"]))
+
+    apply_search_params(index, spec)
+    if len(ids):
+        index.add_with_ids(embeddings, ids)
+    return index
+
+
+def _training_sample(embeddings, size):
+    if len(embeddings) <= size:
+        return embeddings
+    rows = np.random.default_rng(0).choice(len(embeddings), size=size, replace=False)
+    return embeddings[np.sort(rows)]
+
+
+def apply_search_params(index, spec):
+    """Sets nprobe / efSearch, these can change without rebuilding the index."""
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = min(spec.get("nprobe", 1), inner.nlist)
+    elif isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = spec.get("efSearch", 16)
+
+
+def read_index(path, spec=None, mmap=False):
+    """
+    Reads a saved index. With `mmap` the vectors stay in the file, shared read-only through
+    the page cache: IVF inverted lists are mapped with IO_FLAG_MMAP, the code storage of flat,
+    scalar quantizer, PQ and HNSW indexes with IO_FLAG_MMAP_IFC (IO_FLAG_MMAP alone reads
+    those into memory, and IVF indexes do not load with both flags). IVF-PQ skips its
+    precomputed distance table, nlist * pq_m * 2^pq_nbits floats in every process's heap.
+    """
+    if not mmap:
+        return faiss.read_index(path)
+    ivf = (spec or {}).get("type") in ("ivf_flat", "ivf_pq")
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_SKIP_PRECOMPUTE_TABLE if ivf else faiss.IO_FLAG_MMAP_IFC
+    return faiss.read_index(path, flags | faiss.IO_FLAG_READ_ONLY)
+
+
+def search(index, query_embeddings, k, rerank=0, ids=None, embeddings=None):
+    """
+    Searches `index`, returns the (n, k) ids (-1 padded). With `rerank` the index is asked
+    for rerank * k candidates, which are re-ranked by their exact L2 distance to the
+    float32 `embeddings` (rows aligned with the ascending `ids`).
+    """
+    if not rerank or embeddings is None or not len(ids):
+        return index.search(query_embeddings, k)[1]
+    _, candidates = index.search(query_embeddings, k * rerank)
+    valid = candidates >= 0
+    # Only the candidate rows are read, from memory or the memory-mapped embeddings file
+    rows = np.searchsorted(ids, np.where(valid, candidates, ids[0]))
+    vectors = np.asarray(embeddings[rows.ravel()]).reshape(*rows.shape, -1)
+    distances = ((vectors - query_embeddings[:, None, :]) ** 2).sum(axis=2)
+    distances[~valid] = np.inf
+    order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+    found = np.take_along_axis(candidates, order, axis=1)
+    found[np.take_along_axis(~valid, order, axis=1)] = -1
+    return found
+
+
+def measure_recall(index, embeddings, ids, k=RECALL_K, queries=RECALL_QUERIES, rerank=0):
+    """
+    recall@k of `index` (with its re-ranking) against an exact flat search, using stored
+    vectors as queries. Returns (recall, mean search milliseconds per query).
+    """
+    n = len(ids)
+    if n == 0:
+        return 1.0, 0.0
+    k = min(k, n)
+    rows = np.random.default_rng(1).choice(n, size=min(queries, n), replace=False)
+    sample = embeddings[rows]
+
+    exact = faiss.IndexFlatL2(embeddings.shape[1])
+    exact.add(embeddings)
+    _, exact_rows = exact.search(sample, k)
+    expected = ids[exact_rows]
+
+    start = time.perf_counter()
+    found = search(index, sample, k, rerank, ids, embeddings)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+    hits = sum(len(set(e.tolist()) & set(f.tolist())) for e, f in zip(expected, found))
+    return hits / (len(sample) * k), elapsed_ms
+
+
+def index_bytes(index):
+    """Serialized size of the index, a close estimate of its resident memory."""
+    return int(faiss.serialize_index(index).nbytes)
@@ -0,0 +1,155 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# In-memory LRU size (entries) and time to live (seconds)
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 1024))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 3600))
+
+# Optional on-disk tier, disabled unless a directory is configured
+ANSWER_CACHE_DIR = os.getenv("ANSWER_CACHE_DIR")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question):
+    """Lowercases, collapses whitespace and drops trailing punctuation."""
+    return _WHITESPACE.sub(" ", question).strip().lower().rstrip("?!. ")
+
+
+def chunk_fingerprint(doc):
+    """Stable id of a retrieved chunk, derived from its row id and text."""
+    payload = f"{doc.metadata.get('source_key', '')}\0{doc.metadata.get('id', '')}\0{doc.page_content}"
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _hash(value):
+    return hashlib.sha256(json.dumps(value, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    LRU cache with TTL for final LLM answers, with an optional on-disk tier.
+
+    Keys combine the normalized question, the mode, the retrieved chunk set and a
+    namespace made of the index and agent-config versions. When a lookup arrives with
+    a new namespace the memory tier is cleared, so a reindex or config change
+    invalidates old answers automatically.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, disk_dir=ANSWER_CACHE_DIR):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.namespace = None
+        self._entries = OrderedDict()  # key -> (expires_at, answer)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def make_key(self, question, mode, retrieved_docs, namespace, history_str=""):
+        """
+        Args:
+            question: user question without the mode marker.
+            mode: tuple (disable_agent, history_mode).
+            retrieved_docs: chunks sent to the LLM (order independent).
+            namespace: tuple (index version, agent-config version).
+            history_str: conversation history, only part of the key in history mode.
+        """
+        self._check_namespace(namespace)
+        disable_agent, history_mode = mode
+        return _hash([
+            normalize_question(question),
+            [bool(disable_agent), bool(history_mode)],
+            sorted(chunk_fingerprint(doc) for doc in retrieved_docs),
+            list(namespace),
+            _hash(history_str) if history_mode and history_str else "",
+        ])
+
+    def _check_namespace(self, namespace):
+        namespace = list(namespace)
+        with self._lock:
+            if self.namespace is not None and self.namespace != namespace:
+                self._entries.clear()
+                self.stats["invalidations"] += 1
+            self.namespace = namespace
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, answer = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self.stats["memory_hits"] += 1
+                    return answer
+                del self._entries[key]
+
+        answer = self._disk_get(key, now)
+        with self._lock:
+            if answer is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self.stats["disk_hits"] += 1
+            self._store(key, answer, now)
+        return answer
+
+    def set(self, key, answer):
+        now = time.time()
+        with self._lock:
+            self._store(key, answer, now)
+        self._disk_set(key, answer, now)
+
+    def _store(self, key, answer, now):
+        self._entries[key] = (now + self.ttl, answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_get(self, key, now):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expires_at", 0) <= now:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+            return None
+        return entry.get("answer")
+
+    def _disk_set(self, key, answer, now):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": now + self.ttl, "answer": answer}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Could not write answer cache entry due to {e}")
+
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "hit_rate": self.hit_rate()}
@@ -0,0 +1,30 @@
+import os
+
+import numpy as np
+
+
+def tmp_path(path):
+    """Per-process temporary name for `path`, so workers writing the same file never share one."""
+    return f"{path}.{os.getpid()}.tmp"
+
+
+def array_path(path, prefix, name):
+    return os.path.join(path, f"{prefix}.{name}.npy")
+
+
+def save_arrays(path, prefix, **arrays):
+    """
+    Writes each array to its own <prefix>.<name>.npy (replaced atomically). Unlike one
+    .npz archive, plain .npy files can be memory-mapped when loaded.
+    """
+    for name, array in arrays.items():
+        target = array_path(path, prefix, name)
+        tmp_target = tmp_path(target)
+        with open(tmp_target, "wb") as f:
+            np.save(f, np.ascontiguousarray(array))
+        os.replace(tmp_target, target)
+
+
+def load_arrays(path, prefix, names, mmap=False):
+    """{name: array} saved by save_arrays, read-only memory maps when `mmap` is set."""
+    return {name: np.load(array_path(path, prefix, name), mmap_mode="r" if mmap else None) for name in names}
@@ -0,0 +1,252 @@
+import os
+import json
+
+import numpy as np
+
+from src.array_files import save_arrays, load_arrays, tmp_path
+
+PARENTS_FILE = "parents.json"
+PARENT_TEXTS_FILE = "parent_texts.bin"
+CHUNK_ARRAYS_PREFIX = "chunks"
+CHUNK_ARRAYS = ("ids", "parents", "starts", "ends", "text_offsets")
+
+
+class ChunkView:
+    """
+    Lightweight chunk handed out by ChunkStore, created only when a chunk is returned.
+    Exposes the same page_content / metadata interface as Document.
+    """
+    __slots__ = ("chunk_id", "parent_id", "start", "end", "_store")
+
+    def __init__(self, store, chunk_id, parent_id, start, end):
+        self._store = store
+        self.chunk_id = chunk_id
+        self.parent_id = parent_id
+        self.start = start
+        self.end = end
+
+    @property
+    def page_content(self):
+        return self._store.chunk_text(self.parent_id, self.start, self.end)
+
+    @property
+    def metadata(self):
+        return self._store.parent_metadata(self.parent_id)
+
+    def __repr__(self):
+        return f"ChunkView(metadata={self.metadata}, span=({self.start}, {self.end}))"
+
+
+class PackedTexts:
+    """
+    Read-only sequence of parent texts over one UTF-8 buffer, `offsets[i]:offsets[i + 1]`
+    delimiting text i. Loaded memory-mapped, so worker processes share the pages.
+    """
+
+    def __init__(self, data, offsets, removed=()):
+        self.data = data
+        self.offsets = offsets
+        self.removed = set(removed)  # parent ids of removed rows, read as None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, parent_id):
+        if parent_id in self.removed:
+            return None
+        return bytes(self.data[self.offsets[parent_id]:self.offsets[parent_id + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        return (self[parent_id] for parent_id in range(len(self)))
+
+    @property
+    def nbytes(self):
+        return int(self.offsets[-1]) if len(self.offsets) else 0
+
+
+class ChunkStore:
+    """
+    Chunk texts stored as offsets into their parent row text.
+
+    Each parent text is kept once. Chunks live in NumPy arrays of (chunk id, parent id,
+    start, end) sorted by chunk id. Parent metadata (Notion id, source key) is kept in
+    columns, with source keys interned in a small table.
+    """
+
+    def __init__(self):
+        self.parent_texts = []     # parent id -> text (None once the row is removed)
+        self.parent_titles = []    # parent id -> title repeated at the top of later chunks, or ""
+        self.parent_ids = []       # parent id -> Notion row id
+        self.parent_sources = []   # parent id -> index into self.sources
+        self.sources = []          # interned source keys
+        self._source_index = {}
+        self.ids = np.zeros(0, dtype="int64")
+        self.parents = np.zeros(0, dtype="int32")
+        self.starts = np.zeros(0, dtype="int32")
+        self.ends = np.zeros(0, dtype="int32")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, chunk_id):
+        return self._position(chunk_id) is not None
+
+    def __getitem__(self, chunk_id):
+        position = self._position(chunk_id)
+        if position is None:
+            raise KeyError(chunk_id)
+        return self._view(position)
+
+    def get(self, chunk_id, default=None):
+        position = self._position(chunk_id)
+        return default if position is None else self._view(position)
+
+    def values(self):
+        return (self._view(position) for position in range(len(self.ids)))
+
+    def _position(self, chunk_id):
+        position = int(np.searchsorted(self.ids, chunk_id))
+        if position < len(self.ids) and self.ids[position] == chunk_id:
+            return position
+        return None
+
+    def _view(self, position):
+        return ChunkView(self, int(self.ids[position]), int(self.parents[position]),
+                         int(self.starts[position]), int(self.ends[position]))
+
+    def chunk_text(self, parent_id, start, end):
+        text = self.parent_texts[parent_id][start:end]
+        title = self.parent_titles[parent_id]
+        # Chunks after the first repeat the row title so they stay self-describing
+        if title and start > 0:
+            return f"{title}\n{text}"
+        return text
+
+    def parent_metadata(self, parent_id):
+        return {
+            "id": self.parent_ids[parent_id],
+            "source_key": self.sources[self.parent_sources[parent_id]],
+        }
+
+    def add_parent(self, text, metadata, title=""):
+        """Stores a parent row text once, returns its parent id."""
+        source_key = metadata.get("source_key", "")
+        source = self._source_index.get(source_key)
+        if source is None:
+            source = self._source_index[source_key] = len(self.sources)
+            self.sources.append(source_key)
+        self.parent_texts.append(text)
+        self.parent_titles.append(title)
+        self.parent_ids.append(metadata.get("id", ""))
+        self.parent_sources.append(source)
+        return len(self.parent_texts) - 1
+
+    def add_chunks(self, chunk_ids, parents, starts, ends):
+        """Appends chunk spans. Chunk ids must be larger than every stored id."""
+        self.ids = np.concatenate([self.ids, np.asarray(chunk_ids, dtype="int64")])
+        self.parents = np.concatenate([self.parents, np.asarray(parents, dtype="int32")])
+        self.starts = np.concatenate([self.starts, np.asarray(starts, dtype="int32")])
+        self.ends = np.concatenate([self.ends, np.asarray(ends, dtype="int32")])
+
+    def views(self, chunk_ids):
+        return [self[chunk_id] for chunk_id in chunk_ids]
+
+    def remove_parents(self, parent_ids):
+        """Drops the given parents and all their chunks, returns the removed chunk ids."""
+        parent_ids = np.asarray(parent_ids, dtype="int32")
+        stale = np.isin(self.parents, parent_ids)
+        removed = self.ids[stale]
+        keep = ~stale
+        self.ids, self.parents = self.ids[keep], self.parents[keep]
+        self.starts, self.ends = self.starts[keep], self.ends[keep]
+        for parent_id in parent_ids.tolist():
+            self.parent_texts[parent_id] = None
+            self.parent_titles[parent_id] = ""
+        return removed
+
+    def compact(self):
+        """
+        Drops the slots of removed parents. Returns {old parent id: new parent id} for live parents.
+        """
+        live = [i for i, text in enumerate(self.parent_texts) if text is not None]
+        if len(live) == len(self.parent_texts):
+            return {i: i for i in live}
+        remap = {old: new for new, old in enumerate(live)}
+        lookup = np.full(len(self.parent_texts), -1, dtype="int32")
+        lookup[live] = np.arange(len(live), dtype="int32")
+        self.parent_texts = [self.parent_texts[i] for i in live]
+        self.parent_titles = [self.parent_titles[i] for i in live]
+        self.parent_ids = [self.parent_ids[i] for i in live]
+        self.parent_sources = [self.parent_sources[i] for i in live]
+        self.parents = lookup[self.parents]
+        return remap
+
+    def nbytes(self, mapped=False):
+        """
+        Approximate memory of texts and arrays (excluding Python object overhead) held in
+        the heap, or with `mapped` the size of the memory-mapped ones.
+        """
+        if isinstance(self.parent_texts, PackedTexts):
+            texts = [(self.parent_texts.nbytes, isinstance(self.parent_texts.data, np.memmap))]
+        else:
+            texts = [(sum(len(text) for text in self.parent_texts if text), False)]
+        arrays = [(array.nbytes, isinstance(array, np.memmap))
+                  for array in (self.ids, self.parents, self.starts, self.ends)]
+        return sum(size for size, is_mapped in texts + arrays if is_mapped == mapped)
+
+    def save(self, path):
+        # Texts go into one UTF-8 buffer with byte offsets, which readers can memory-map
+        encoded = [(text or "").encode("utf-8") for text in self.parent_texts]
+        text_offsets = np.zeros(len(encoded) + 1, dtype="int64")
+        np.cumsum([len(text) for text in encoded], out=text_offsets[1:])
+        tmp_texts = tmp_path(os.path.join(path, PARENT_TEXTS_FILE))
+        with open(tmp_texts, "wb") as f:
+            for text in encoded:
+                f.write(text)
+        os.replace(tmp_texts, os.path.join(path, PARENT_TEXTS_FILE))
+
+        tmp_parents = tmp_path(os.path.join(path, PARENTS_FILE))
+        with open(tmp_parents, "w", encoding="utf-8") as f:
+            json.dump({
+                "titles": self.parent_titles,
+                "ids": self.parent_ids,
+                "sources": self.parent_sources,
+                "source_keys": self.sources,
+                "removed": [i for i, text in enumerate(self.parent_texts) if text is None],
+            }, f, ensure_ascii=False)
+        os.replace(tmp_parents, os.path.join(path, PARENTS_FILE))
+
+        save_arrays(path, CHUNK_ARRAYS_PREFIX, ids=self.ids, parents=self.parents, starts=self.starts,
+                    ends=self.ends, text_offsets=text_offsets)
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        """
+        Loads a saved store. With `mmap` the texts and chunk arrays stay memory-mapped and
+        read-only (for serving), otherwise they are read into memory and can be updated.
+        """
+        store = cls()
+        with open(os.path.join(path, PARENTS_FILE), "r", encoding="utf-8") as f:
+            parents = json.load(f)
+        store.parent_titles = parents["titles"]
+        store.parent_ids = parents["ids"]
+        store.parent_sources = parents["sources"]
+        store.sources = parents["source_keys"]
+        store._source_index = {key: i for i, key in enumerate(store.sources)}
+
+        arrays = load_arrays(path, CHUNK_ARRAYS_PREFIX, CHUNK_ARRAYS, mmap=mmap)
+        store.ids = arrays["ids"]
+        store.parents = arrays["parents"]
+        store.starts = arrays["starts"]
+        store.ends = arrays["ends"]
+
+        texts_path = os.path.join(path, PARENT_TEXTS_FILE)
+        if mmap:
+            # np.memmap cannot map an empty file
+            data = np.memmap(texts_path, dtype="uint8", mode="r") if os.path.getsize(texts_path) else b""
+            store.parent_texts = PackedTexts(data, arrays["text_offsets"], parents["removed"])
+        else:
+            with open(texts_path, "rb") as f:
+                data = f.read()
+            store.parent_texts = list(PackedTexts(data, arrays["text_offsets"], parents["removed"]))
+        return store
@@ -0,0 +1,129 @@
+import json
+
+# Rough characters per LLM token for English text, used to turn token budgets into characters
+CHARS_PER_TOKEN = 4
+
+# Defaults for the "chunking" section of rag_config.json
+DEFAULT_CHUNKING_CONFIG = {
+    "mode": "properties",   # "properties": compact key: value lines, "characters": indented JSON cut at offsets
+    "max_tokens": None,     # chunk budget in tokens, None uses chunk_size (characters) as is
+    "overlap_percent": 20,  # overlap used when a single property has to be split
+}
+
+# Property names treated as the row title when the row does not say which one it is
+TITLE_NAMES = ("name", "title")
+
+
+def chunking_config(config=None):
+    """Merges the "chunking" section of rag_config with the defaults."""
+    merged = dict(DEFAULT_CHUNKING_CONFIG)
+    merged.update({key: value for key, value in (config or {}).items() if value is not None})
+    if merged["mode"] not in ("properties", "characters"):
+        raise ValueError(f"Unknown chunking mode '{merged['mode']}', expected 'properties' or 'characters'")
+    return merged
+
+
+def chunk_budget(config, chunk_size):
+    """Chunk size in characters for the given config."""
+    if config["mode"] == "properties" and config["max_tokens"]:
+        return int(config["max_tokens"] * CHARS_PER_TOKEN)
+    return chunk_size
+
+
+def format_value(value):
+    """Renders a Notion property value on a single line, None for empty values."""
+    if value is None or value == "" or value == []:
+        return None
+    if isinstance(value, list):
+        return ", ".join(str(item) for item in value if item not in (None, ""))
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    if isinstance(value, dict):
+        # Notion dates are {"start", "end", "time_zone"}
+        if "start" in value:
+            return f"{value['start']} to {value['end']}" if value.get("end") else value["start"]
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return " ".join(str(value).split())
+
+
+def find_title_key(entry):
+    """Name of the title property of a row: the one Notion marked, else a Name/Title column."""
+    properties = entry.get("properties", {})
+    title_key = entry.get("title_property")
+    if title_key in properties:
+        return title_key
+    for key in properties:
+        if key.strip().lower() in TITLE_NAMES:
+            return key
+    return None
+
+
+def format_row(entry):
+    """
+    Compact text of a row: one "key: value" line per non-empty property, title first.
+    Returns (text, title line). The title line is "" when the row has no title.
+    """
+    properties = entry.get("properties", {})
+    title_key = find_title_key(entry)
+    title = ""
+    lines = []
+    for key, value in properties.items():
+        value = format_value(value)
+        if value is None:
+            continue
+        line = f"{key}: {value}"
+        if key == title_key:
+            title = line
+            lines.insert(0, line)
+        else:
+            lines.append(line)
+    return "\n".join(lines), title
+
+
+def property_spans(text, chunk_size, title="", overlap_percent=20):
+    """
+    Packs whole lines of `text` into chunks of at most `chunk_size` characters.
+    Chunks after the first get the title line prepended when read, so it counts
+    against their budget. A line longer than the budget is split with overlap, when it
+    is the first property its first piece shares the chunk with the title line.
+    Returns (starts, ends) character offsets into `text`.
+    """
+    starts, ends = [], []
+    budget = chunk_size
+    later_budget = max(chunk_size - len(title) - 1, 1) if title else chunk_size
+    start = end = 0
+    position = 0
+    for line in text.split("\n"):
+        line_start, line_end = position, position + len(line)
+        position = line_end + 1
+
+        if line_end - start <= budget:
+            end = line_end
+            continue
+        # A pending chunk holding only the title line has no content of its own,
+        # an oversized first property starts in it instead of after it
+        oversized = line_end - line_start > later_budget
+        keep_title = oversized and bool(title) and not starts and start == 0 and end == len(title)
+        if end > start and not keep_title:
+            starts.append(start)
+            ends.append(end)
+            budget = later_budget
+        if not oversized:
+            start, end = line_start, line_end
+            continue
+
+        # Oversized property: cut it at character offsets like the characters mode,
+        # the last piece stays open so the following properties can join it
+        if not keep_title:
+            start = line_start
+        while line_end - start > budget:
+            starts.append(start)
+            ends.append(start + budget)
+            step = max(budget - int(budget * overlap_percent / 100), 1)
+            start = max(start + step, line_start)
+            budget = later_budget
+        end = line_end
+    if end > start:
+        starts.append(start)
+        ends.append(end)
+    return starts, ends
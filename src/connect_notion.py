@@ -1,7 +1,10 @@
 import os
-import requests
+import time
 import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+from src import http_client, upstash_client
 
 if "MISTRAL_API_KEY" not in os.environ:
     # For running locally or docker run,
@@ -23,18 +26,41 @@ if not DATABASE_ID:
 if not UPSTASH_REDIS_REST_URL or not UPSTASH_REDIS_REST_TOKEN:
     raise ValueError("Upstash Redis credentials not found in .env file")
 
+# Overridable so the sync can run against a local stand-in Notion server
+NOTION_API_URL = os.getenv("NOTION_API_URL", "https://api.notion.com/v1")
+
+# Notion caps page_size at 100 and paginates with next_cursor
+NOTION_PAGE_SIZE = 100
+
+# Upstash key holding the last_edited_time high-water mark of the previous sync
+SYNC_STATE_KEY = "notion_sync_state"
+
+# Upstash hash holding the parsed rows, one field per Notion page id
+NOTION_ROWS_KEY = "notion_rows"
+# All rows as one JSON list, the layout before rows were stored per page (removed by a full sync)
+LEGACY_ROWS_KEY = "notion_database"
+# Rows written per HSET / removed per HDEL
+ROW_BATCH_SIZE = 100
+
+# Deleted or archived pages are only noticed by a full sync, run one at least this often (seconds)
+FULL_SYNC_INTERVAL = int(os.getenv("NOTION_FULL_SYNC_INTERVAL", 24 * 60 * 60))
+
 headers = {
     "Authorization": f"Bearer {NOTION_TOKEN}",
     "Content-Type": "application/json",
     "Notion-Version": "2022-06-28",
 }
 
+# Pooled keep-alive session shared by every Notion request of the sync
+session = http_client.create_session(pool_size=4)
+
 def extract_notion_rows(notion_response):
     results = []
 
     for page in notion_response.get("results", []):
         page_data = {
             "id": page.get("id"),
+            "last_edited_time": page.get("last_edited_time"),
             "properties": {}
         }
         properties = page.get("properties", {})
@@ -50,6 +76,7 @@ def extract_notion_rows(notion_response):
                     value = "".join([rt.get("plain_text", "") for rt in prop_value.get("rich_text", [])])
                 elif prop_type == "title":
                     value = "".join([t.get("plain_text", "") for t in prop_value.get("title", [])])
+                    page_data["title_property"] = prop_name
                 elif prop_type == "number":
                     value = prop_value.get("number")
                 elif prop_type == "url":
@@ -82,30 +109,125 @@ def extract_notion_rows(notion_response):
     return results
 
 def save_to_upstash_redis(key, data):
-    url = f"{UPSTASH_REDIS_REST_URL}/set/{key}"
-    headers = {
-        "Authorization": f"Bearer {UPSTASH_REDIS_REST_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    response = requests.post(url, headers=headers, json={"0": json.dumps(data)})
-    if response.status_code != 200:
-        raise Exception(f"Failed to store data in Upstash: {response.text}")
+    upstash_client.get_client().set_json(key, {"0": json.dumps(data)})
     print(f"Data successfully saved to Upstash under key: {key}")
 
-def extract_pages(num_pages=None):
-    url = f"https://api.notion.com/v1/databases/{DATABASE_ID}/query"
-    page_size = 1000 if num_pages is None else num_pages
-    payload = {"page_size": page_size}
-    response = requests.post(url, json=payload, headers=headers)
-
-    notion_data = response.json()
-    parsed_data = extract_notion_rows(notion_data)
-
-    # Save notion data on upstash
-    save_to_upstash_redis("notion_database", parsed_data)
+def load_from_upstash_redis(key, default=None):
+    """Reads a value written by save_to_upstash_redis, returns `default` if the key is missing."""
+    stored = upstash_client.get_client().get_json(key)
+    if not stored:
+        return default
+    return json.loads(stored["0"])
+
+def query_database(start_cursor=None, since=None, page_size=NOTION_PAGE_SIZE):
+    """Fetches one page of the database query, optionally only pages edited on or after `since`."""
+    url = f"{NOTION_API_URL}/databases/{DATABASE_ID}/query"
+    payload = {
+        "page_size": page_size,
+        "sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}],
+    }
+    if start_cursor:
+        payload["start_cursor"] = start_cursor
+    if since:
+        # Notion rounds last_edited_time to the minute, so on_or_after may return
+        # a few pages again. Rows are merged by id, re-fetching them is harmless.
+        payload["filter"] = {
+            "timestamp": "last_edited_time",
+            "last_edited_time": {"on_or_after": since},
+        }
 
-    # Upload local data on upstash (upload from up)
+    # Retries 429 (honouring Retry-After) and 5xx responses with backoff
+    response = http_client.request_with_backoff(session, "POST", url, json=payload, headers=headers)
+    if response.status_code != 200:
+        raise Exception(f"Failed to query Notion database: {response.text}")
+    return response.json()
+
+def iter_notion_rows(since=None, limit=None):
+    """
+    Yields parsed rows page by page, following start_cursor pagination.
+    The next page is requested in the background while the current one is parsed.
+    """
+    yielded = 0
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(query_database, None, since)
+        while future is not None:
+            notion_data = future.result()
+            next_cursor = notion_data.get("next_cursor") if notion_data.get("has_more") else None
+            future = executor.submit(query_database, next_cursor, since) if next_cursor else None
+
+            for row in extract_notion_rows(notion_data):
+                if limit is not None and yielded >= limit:
+                    if future is not None:
+                        future.cancel()
+                    return
+                yielded += 1
+                yield row
+
+def extract_pages(num_pages=None, full_sync=False):
+    """
+    Syncs the Notion database into Upstash.
+
+    Rows are stored per page in the NOTION_ROWS_KEY hash and written in batches while the
+    pages stream in. Only pages edited since the stored high-water mark are fetched, so an
+    incremental sync writes just the changed rows. A full sync (first run, `full_sync=True`,
+    once per FULL_SYNC_INTERVAL, or when the saved rows are missing) lists every page and
+    also removes the rows of deleted or archived pages.
+
+    Args:
+        num_pages: optional maximum number of rows to fetch. A full sync cut short by it
+            keeps the rows it did not reach and is not recorded as a full sync.
+        full_sync: bool, ignore the high-water mark.
+    """
+    client = upstash_client.get_client()
+    state = load_from_upstash_redis(SYNC_STATE_KEY, default={})
+    now = time.time()
+    if now - state.get("last_full_sync", 0) >= FULL_SYNC_INTERVAL:
+        full_sync = True
+
+    since = None if full_sync else state.get("high_water_mark")
+    if since and not client.command("EXISTS", NOTION_ROWS_KEY):
+        # Merging the changed rows into nothing would drop every other row
+        print("Warning: Saved Notion rows are missing, running a full sync.")
+        since = None
+
+    high_water_mark = since
+    fetched = 0
+    seen_ids = set()
+    batch = []
+    for row in iter_notion_rows(since=since, limit=num_pages):
+        batch.extend((row["id"], json.dumps(row, ensure_ascii=False)))
+        if since is None:
+            seen_ids.add(row["id"])
+        if len(batch) >= 2 * ROW_BATCH_SIZE:
+            client.command("HSET", NOTION_ROWS_KEY, *batch)
+            batch = []
+        fetched += 1
+        edited = row.get("last_edited_time")
+        if edited and (high_water_mark is None or edited > high_water_mark):
+            high_water_mark = edited
+    if batch:
+        client.command("HSET", NOTION_ROWS_KEY, *batch)
+
+    print(f"Fetched {fetched} {'' if since is None else 'changed '}rows from Notion.")
+
+    complete = num_pages is None or fetched < num_pages
+    if since is None and complete:
+        # Pages missing from a complete listing were deleted or archived
+        stale_ids = [row_id for row_id in client.command("HKEYS", NOTION_ROWS_KEY) or [] if row_id not in seen_ids]
+        for start in range(0, len(stale_ids), ROW_BATCH_SIZE):
+            client.command("HDEL", NOTION_ROWS_KEY, *stale_ids[start:start + ROW_BATCH_SIZE])
+        if stale_ids:
+            print(f"Removed {len(stale_ids)} deleted rows.")
+        client.command("DEL", LEGACY_ROWS_KEY)
+        state["last_full_sync"] = now
+
+    state["high_water_mark"] = high_water_mark
+    state["last_sync"] = datetime.now(timezone.utc).isoformat()
+    save_to_upstash_redis(SYNC_STATE_KEY, state)
+
+    # Upload local data on upstash (upload from up), all files in one pipelined round trip
     data_dir= 'data'
+    commands = []
     for filename in os.listdir(data_dir):
         if filename.endswith('.json'):
             filepath = os.path.join(data_dir, filename)
@@ -113,7 +235,10 @@ def extract_pages(num_pages=None):
                 data = json.load(file)
             
             key = os.path.splitext(filename)[0]
-            save_to_upstash_redis(key, data)
+            commands.append(("SET", key, json.dumps({"0": json.dumps(data)})))
+    if commands:
+        upstash_client.get_client().pipeline(commands)
+        print(f"Uploaded {len(commands)} local data files to Upstash.")
 
     # Clean up env vars
     os.environ.pop("NOTION_TOKEN", None)
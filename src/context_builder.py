@@ -0,0 +1,123 @@
+from src.chunker import CHARS_PER_TOKEN
+
+# Defaults for the "context" section of rag_config.json
+DEFAULT_CONTEXT_CONFIG = {
+    "max_tokens": 3000,            # budget of the retrieved context in the prompt
+    "history_max_tokens": 600,     # budget of the conversation history
+    "history_answer_chars": 400,   # earlier answers are cut to this many characters
+}
+
+TRUNCATION_MARK = " [...]"
+
+
+def context_config(config=None):
+    """Merges the "context" section of rag_config with the defaults."""
+    merged = dict(DEFAULT_CONTEXT_CONFIG)
+    merged.update({key: value for key, value in (config or {}).items() if value is not None})
+    return merged
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _merge_spans(spans):
+    """Unions overlapping or touching (start, end) spans."""
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def merge_chunks(docs):
+    """
+    Turns retrieved chunks (best first) into context sections, best first.
+
+    Chunks of the same row that overlap or touch are merged into one section, so the
+    overlap between neighbouring chunks is sent once. Chunks served from an IndexStore
+    carry their character span in the row; other chunks are only de-duplicated by text.
+    """
+    groups = {}  # group key -> [best rank, first chunk, spans (None for text-only chunks)]
+    for rank, doc in enumerate(docs):
+        if hasattr(doc, "parent_id"):
+            key = ("span", id(doc._store), doc.parent_id)
+            group = groups.setdefault(key, [rank, doc, []])
+            group[2].append((doc.start, doc.end))
+        else:
+            key = ("text", doc.metadata.get("source_key", ""), doc.metadata.get("id", ""), doc.page_content)
+            groups.setdefault(key, [rank, doc, None])
+
+    sections = []
+    for key, (rank, doc, spans) in sorted(groups.items(), key=lambda item: item[1][0]):
+        if spans is None:
+            sections.append(doc.page_content)
+            continue
+        # Spans of one row are read in document order
+        for start, end in _merge_spans(spans):
+            sections.append(doc._store.chunk_text(doc.parent_id, start, end))
+    return sections
+
+
+def row_sources(docs):
+    """
+    Metadata of the rows behind retrieved chunks (best first), once per row in rank order.
+    Chunks without a row id are kept as they are.
+    """
+    seen = set()
+    sources = []
+    for doc in docs:
+        row_id = doc.metadata.get("id")
+        if row_id is not None:
+            key = (doc.metadata.get("source_key", ""), row_id)
+            if key in seen:
+                continue
+            seen.add(key)
+        sources.append(doc.metadata)
+    return sources
+
+
+def fit_to_budget(sections, max_tokens):
+    """Keeps sections in order until the token budget is used, cutting the last one at a line."""
+    kept = []
+    remaining = max_tokens * CHARS_PER_TOKEN
+    for section in sections:
+        if len(section) <= remaining:
+            kept.append(section)
+            remaining -= len(section) + 2  # blank line between sections
+            continue
+        cut = section[:max(remaining - len(TRUNCATION_MARK), 0)]
+        cut = cut[:cut.rfind("\n")] if "\n" in cut else cut
+        # A sliver of a section is not worth its tokens
+        if len(cut) >= 200:
+            kept.append(cut + TRUNCATION_MARK)
+        break
+    return kept
+
+
+def build_context(docs, max_tokens=DEFAULT_CONTEXT_CONFIG["max_tokens"]):
+    """Context string for the prompt: merged, de-duplicated chunks within `max_tokens`."""
+    return "\n\n".join(fit_to_budget(merge_chunks(docs), max_tokens))
+
+
+def compress_history(history, memory, max_tokens=DEFAULT_CONTEXT_CONFIG["history_max_tokens"],
+                     answer_chars=DEFAULT_CONTEXT_CONFIG["history_answer_chars"], labels=("You", "AI")):
+    """
+    Conversation history string from the last `memory` (question, answer) pairs.
+    Whitespace is collapsed, answers are cut to `answer_chars` and the oldest turns
+    are dropped until the history fits `max_tokens`.
+    """
+    turns = []
+    for question, answer in (history[-memory:] if memory else history):
+        question = " ".join(str(question).split())
+        answer = " ".join(str(answer).split())
+        if len(answer) > answer_chars:
+            answer = answer[:answer_chars].rsplit(" ", 1)[0] + TRUNCATION_MARK
+        turns.append(f"{labels[0]}: {question}\n{labels[1]}: {answer}")
+
+    # Newest turns are the most relevant, drop from the front
+    while turns and estimate_tokens("\n".join(turns)) > max_tokens:
+        turns.pop(0)
+    return "\n".join(turns)
@@ -0,0 +1,50 @@
+import os
+import queue
+import asyncio
+from contextlib import contextmanager, asynccontextmanager
+
+# Pre-built Crew instances per process, bounds the number of concurrent agent runs
+CREW_POOL_SIZE = int(os.getenv("CREW_POOL_SIZE", "4"))
+
+
+class CrewPool:
+    """
+    Fixed set of pre-built Crew instances checked out one request at a time.
+
+    A Crew interpolates the request inputs into its tasks and keeps the outputs of the
+    last run, so one instance must never run two kickoffs at once. Instances are built
+    up front by `factory()` and returned to the pool after every run.
+
+    Use it either from threads (checkout) or from a single event loop (checkout_async).
+    """
+
+    def __init__(self, factory, size=CREW_POOL_SIZE):
+        self.size = max(1, int(size))
+        self._instances = queue.Queue()
+        for _ in range(self.size):
+            self._instances.put(factory())
+        self._slots = None  # asyncio.Semaphore, created on the event loop that uses it
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """Blocks until an instance is free. Raises queue.Empty after `timeout` seconds."""
+        crew = self._instances.get(timeout=timeout)
+        try:
+            yield crew
+        finally:
+            self._instances.put(crew)
+
+    @asynccontextmanager
+    async def checkout_async(self):
+        """Waits for a free instance without blocking the event loop."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        async with self._slots:
+            crew = self._instances.get_nowait()
+            try:
+                yield crew
+            finally:
+                self._instances.put(crew)
+
+    def available(self):
+        return self._instances.qsize()
@@ -0,0 +1,80 @@
+import re
+from itertools import repeat
+
+import numpy as np
+
+# Words and numbers, keeping inner hyphens/apostrophes/dots ("co-op", "3.5").
+# JSON punctuation such as quotes, colons, commas and braces never ends up in a token,
+# so '"name":' is looked up as 'name'.
+TOKEN_PATTERN = re.compile(r"[^\W_]+(?:[-'.][^\W_]+)*")
+
+DEFAULT_BATCH_SIZE = 4096
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class Embedder:
+    """
+    Averaged word-vector embeddings computed in batches with NumPy.
+
+    Tokens are mapped to integer vocabulary ids, then every text in a batch is built
+    with a single gather over the embedding matrix and a segmented mean (np.add.reduceat).
+    """
+
+    def __init__(self, vocab, vectors):
+        self.vocab = vocab          # token -> row in vectors
+        self.vectors = vectors      # (vocab_size, dim) matrix
+        self.dim = vectors.shape[1]
+
+    @classmethod
+    def from_keyed_vectors(cls, model):
+        """Builds an embedder from a gensim KeyedVectors model."""
+        return cls(model.key_to_index, model.vectors)
+
+    def token_ids(self, text):
+        """Vocabulary ids of the tokens in `text` that are known to the model."""
+        lookup = self.vocab.get
+        ids = [lookup(token) for token in tokenize(text)]
+        return [i for i in ids if i is not None]
+
+    def embed_texts(self, texts, batch_size=DEFAULT_BATCH_SIZE):
+        """Returns a float32 array (len(texts), dim). Texts without known tokens map to zeros."""
+        embeddings = np.zeros((len(texts), self.dim), dtype="float32")
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            self._embed_batch(batch, embeddings[start:start + len(batch)])
+        return embeddings
+
+    def _embed_batch(self, texts, out):
+        findall = TOKEN_PATTERN.findall
+        tokens = []
+        counts = []
+        for text in texts:
+            found = findall(text.lower())
+            counts.append(len(found))
+            tokens.extend(found)
+
+        ids = np.fromiter(map(self.vocab.get, tokens, repeat(-1)), dtype="int64", count=len(tokens))
+        known = ids >= 0
+        rows = np.repeat(np.arange(len(texts)), counts)
+        known_counts = np.bincount(rows[known], minlength=len(texts))
+        ids = ids[known]
+        if not ids.size:
+            return
+
+        non_empty = known_counts > 0
+        # Segment starts of the non-empty texts inside the flat array of known ids
+        offsets = np.concatenate(([0], np.cumsum(known_counts)[:-1]))[non_empty]
+        # Gather as (dim, n_tokens) so the segmented sum runs along contiguous memory
+        gathered = np.take(self.vectors.T, ids, axis=1)
+        sums = np.add.reduceat(gathered, offsets, axis=1, dtype="float32")
+        out[non_empty] = (sums / known_counts[non_empty]).T
+
+    def embed_documents(self, documents, batch_size=DEFAULT_BATCH_SIZE):
+        return self.embed_texts([doc.page_content for doc in documents], batch_size=batch_size)
+
+    def embed_query(self, text):
+        """Embeds a single query string as a (1, dim) float32 array."""
+        return self.embed_texts([text])
@@ -0,0 +1,108 @@
+import os
+import json
+import fcntl
+
+import numpy as np
+
+from src.embedder import Embedder
+from src.array_files import tmp_path
+
+# Text GloVe model in word2vec format (see tools/convert_to_word2vec.ipynb)
+GLOVE_MODEL_PATH = os.getenv("GLOVE_MODEL_PATH", "models/glove-wiki-gigaword-50/glove.6B.50d.word2vec.txt")
+
+# Binary cache: one .npy matrix opened with mmap_mode='r' plus the vocabulary in row order.
+# Every worker maps the same file, so the matrix pages are shared by the OS page cache.
+GLOVE_CACHE_DIR = os.getenv("GLOVE_CACHE_DIR", "models/glove-wiki-gigaword-50/cache")
+
+# float32 (default) or float16, which halves the memory of the matrix
+GLOVE_DTYPE = os.getenv("GLOVE_DTYPE", "float32")
+
+SUPPORTED_DTYPES = ("float32", "float16")
+
+
+def cache_paths(cache_dir=GLOVE_CACHE_DIR, dtype=GLOVE_DTYPE):
+    return {
+        "vectors": os.path.join(cache_dir, f"vectors.{dtype}.npy"),
+        "vocab": os.path.join(cache_dir, "vocab.json"),
+        "meta": os.path.join(cache_dir, f"meta.{dtype}.json"),
+    }
+
+
+def _source_signature(source_path):
+    stat = os.stat(source_path)
+    return {"source": os.path.abspath(source_path), "size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+
+def is_cache_fresh(source_path=GLOVE_MODEL_PATH, cache_dir=GLOVE_CACHE_DIR, dtype=GLOVE_DTYPE):
+    """True if a binary cache exists and, when the text model is present, was built from it."""
+    paths = cache_paths(cache_dir, dtype)
+    if not all(os.path.exists(path) for path in paths.values()):
+        return False
+    if not os.path.exists(source_path):
+        # Only the binary cache was shipped, trust it
+        return True
+    with open(paths["meta"], "r") as f:
+        meta = json.load(f)
+    return meta.get("signature") == _source_signature(source_path)
+
+
+def convert_to_cache(source_path=GLOVE_MODEL_PATH, cache_dir=GLOVE_CACHE_DIR, dtype=GLOVE_DTYPE):
+    """
+    One-time conversion of the text word2vec model into the binary cache.
+    """
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported GloVe dtype '{dtype}', expected one of {SUPPORTED_DTYPES}")
+
+    from gensim.models import KeyedVectors
+
+    print(f"Converting {source_path} to binary {dtype} cache in {cache_dir}..")
+    model = KeyedVectors.load_word2vec_format(source_path, binary=False)
+    os.makedirs(cache_dir, exist_ok=True)
+    paths = cache_paths(cache_dir, dtype)
+
+    # Each file is written under a per-process temporary name and renamed into place, so a
+    # reader never maps a partial file and two converting workers never share a temporary file
+    tmp_vectors = tmp_path(paths["vectors"])
+    with open(tmp_vectors, "wb") as f:
+        np.save(f, np.ascontiguousarray(model.vectors, dtype=dtype))
+    os.replace(tmp_vectors, paths["vectors"])
+
+    tmp_vocab = tmp_path(paths["vocab"])
+    with open(tmp_vocab, "w", encoding="utf-8") as f:
+        json.dump(list(model.index_to_key), f, ensure_ascii=False)
+    os.replace(tmp_vocab, paths["vocab"])
+
+    # Meta goes last, it marks the cache as complete
+    tmp_meta = tmp_path(paths["meta"])
+    with open(tmp_meta, "w") as f:
+        json.dump({"dtype": dtype, "dim": model.vector_size, "signature": _source_signature(source_path)}, f)
+    os.replace(tmp_meta, paths["meta"])
+
+
+def load_glove(source_path=GLOVE_MODEL_PATH, cache_dir=GLOVE_CACHE_DIR, dtype=GLOVE_DTYPE):
+    """
+    Returns an Embedder over the memory-mapped GloVe matrix, converting the text model on first use.
+    """
+    if not is_cache_fresh(source_path, cache_dir, dtype):
+        # Workers starting on a cold cache wait for the first one to convert instead of
+        # each parsing the text model again
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(os.path.join(cache_dir, "convert.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if not is_cache_fresh(source_path, cache_dir, dtype):
+                    convert_to_cache(source_path, cache_dir, dtype)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    paths = cache_paths(cache_dir, dtype)
+    vectors = np.load(paths["vectors"], mmap_mode="r")
+    with open(paths["vocab"], "r", encoding="utf-8") as f:
+        words = json.load(f)
+    vocab = {word: i for i, word in enumerate(words)}
+    return Embedder(vocab, vectors)
+
+
+# Run once to build the cache ahead of deployment
+if __name__ == "__main__":
+    convert_to_cache()
@@ -0,0 +1,47 @@
+import time
+import random
+import requests
+from requests.adapters import HTTPAdapter
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def create_session(pool_size=10):
+    """Keep-alive session with a connection pool shared by every request made through it."""
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def retry_delay(response, attempt, backoff=0.5, max_delay=30.0):
+    """Seconds to wait before the next attempt, honouring a Retry-After header if present."""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), max_delay)
+        except ValueError:
+            pass
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(backoff * (2 ** attempt), max_delay))
+
+
+def request_with_backoff(session, method, url, max_retries=5, backoff=0.5, **kwargs):
+    """
+    Sends a request, retrying 429/5xx responses and connection errors.
+    Returns the last response; raises the last connection error if every attempt failed.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == max_retries:
+                raise
+            time.sleep(retry_delay(None, attempt, backoff))
+            continue
+
+        if response.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+            return response
+        time.sleep(retry_delay(response, attempt, backoff))
@@ -0,0 +1,420 @@
+import os
+import re
+import time
+import json
+import fcntl
+import hashlib
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+
+from src import ann_index, metrics
+from src.array_files import tmp_path
+from src.lexical_index import BM25Index
+from src.chunk_store import ChunkStore
+
+# Local directory holding the persisted index, chunk store and embeddings
+INDEX_DIR = os.getenv("INDEX_DIR", "/tmp/rag/index")
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+IDS_FILE = "ids.npy"
+FAISS_FILE = "index.faiss"
+# flock held while a snapshot is written (exclusive) or read (shared)
+SNAPSHOT_LOCK_FILE = "snapshot.lock"
+
+# Bump when the on-disk layout changes, older snapshots are rebuilt from scratch
+MANIFEST_VERSION = 4
+
+# Mapping header lines of /proc/<pid>/smaps ("start-end perms offset dev inode path")
+SMAPS_HEADER = re.compile(r"^[0-9a-f]+-[0-9a-f]+ ")
+
+# Parent slots of removed rows are compacted away on save once they reach this share
+COMPACT_RATIO = 0.25
+
+
+def row_hash(doc):
+    """Content hash of a single Notion row / Upstash entry."""
+    payload = json.dumps(
+        {
+            "source_key": doc.metadata.get("source_key", ""),
+            "id": doc.metadata.get("id", ""),
+            "text": doc.page_content,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def iter_row_keys(documents):
+    """
+    Yields (key, document) pairs, the key being a stable id derived from the content hash.
+    Identical rows get an occurrence suffix so duplicates are kept, as before.
+    """
+    seen = {}
+    for doc in documents:
+        digest = row_hash(doc)
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        yield f"{digest}#{occurrence}", doc
+
+
+def _anon_rss():
+    """Anonymous (heap) resident bytes of this process, None where /proc is unavailable."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _quantized(index_spec):
+    return bool(index_spec) and index_spec.get("quantizer", "none") != "none"
+
+
+def _atomic_write(path, write_fn, mode="w"):
+    tmp_file = tmp_path(path)
+    with open(tmp_file, mode) as f:
+        write_fn(f)
+    os.replace(tmp_file, path)
+
+
+@contextmanager
+def snapshot_lock(path, shared=False):
+    """
+    Holds the snapshot's flock, so workers saving the same INDEX_DIR take turns and a
+    worker loading it never reads files from two different saves.
+    """
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, SNAPSHOT_LOCK_FILE), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class IndexStore:
+    """
+    FAISS index, chunk store and per-chunk embeddings persisted on local disk.
+
+    Rows are keyed by content hash, so a refresh only chunks and embeds rows that
+    were added or changed and removes the chunks of rows that disappeared.
+    """
+
+    def __init__(self, path=INDEX_DIR):
+        self.path = path
+        self.index = None
+        self.dim = None
+        self.chunk_size = None
+        self.next_id = 0
+        self.rows = {}        # row key -> parent id in the chunk store
+        self.chunks = ChunkStore()
+        self.sources = []     # Upstash keys the rows were loaded from
+        self.ids = np.zeros(0, dtype="int64")
+        self.embeddings = None
+        self.index_spec = None  # resolved ann_index spec the index was built with
+        self.trained_size = 0   # corpus size at the last (re)build
+        self.build_report = {}
+        self.lexical = BM25Index()
+        self.read_only = False  # loaded memory-mapped, can be served but not synced or saved
+
+    def reset(self, dim, chunk_size):
+        self.index = None
+        self.lexical = BM25Index()
+        self.index_spec = None
+        self.trained_size = 0
+        self.dim = dim
+        self.chunk_size = chunk_size
+        self.next_id = 0
+        self.rows = {}
+        self.chunks = ChunkStore()
+        self.ids = np.zeros(0, dtype="int64")
+        self.embeddings = np.zeros((0, dim), dtype="float32")
+
+    def version(self):
+        """Fingerprint of the indexed rows, changes whenever a row is added, changed or removed."""
+        digest = hashlib.sha1(f"{self.chunk_size}:{self.dim}".encode("utf-8"))
+        for key in sorted(self.rows):
+            digest.update(key.encode("utf-8"))
+        return digest.hexdigest()
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, MANIFEST_FILE))
+
+    def load(self, mmap=False):
+        """
+        Loads a saved snapshot. Returns False if there is none or it is unusable.
+
+        With `mmap` the FAISS index, embeddings, chunk texts and BM25 arrays are memory-mapped
+        read-only instead of read into memory, so processes serving the same snapshot files
+        share one copy through the page cache.
+        """
+        if not self.exists():
+            return False
+        with snapshot_lock(self.path, shared=True):
+            return self._load(mmap)
+
+    def _load(self, mmap):
+        try:
+            with open(os.path.join(self.path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") != MANIFEST_VERSION:
+                print("Info: Saved index has an old layout, rebuilding.")
+                return False
+
+            chunks = ChunkStore.load(self.path, mmap=mmap)
+            heap_before = _anon_rss()
+            self.index = ann_index.read_index(os.path.join(self.path, FAISS_FILE), manifest.get("index_spec"), mmap)
+            heap_after = _anon_rss()
+            mmap_mode = "r" if mmap else None
+            self.ids = np.load(os.path.join(self.path, IDS_FILE), mmap_mode=mmap_mode)
+            self.embeddings = np.load(os.path.join(self.path, EMBEDDINGS_FILE),
+                                      mmap_mode="r" if mmap or _quantized(manifest.get("index_spec")) else None)
+        except Exception as e:
+            print(f"Warning: Could not load saved index due to {e}, rebuilding.")
+            return False
+
+        self.dim = manifest["dim"]
+        self.chunk_size = manifest["chunk_size"]
+        self.next_id = manifest["next_id"]
+        self.rows = manifest["rows"]
+        self.sources = manifest.get("sources", [])
+        self.index_spec = manifest.get("index_spec")
+        self.trained_size = manifest.get("trained_size", len(self.ids))
+        self.build_report = manifest.get("build_report", {})
+        self.chunks = chunks
+        self.read_only = mmap
+        # What a memory-mapped index still reads into the heap (ids, IVF centroids, codebooks),
+        # measured as this process's anonymous RSS growth while loading it
+        self.index_heap_bytes = max(0, heap_after - heap_before) if mmap and heap_before is not None else None
+        try:
+            self.lexical = BM25Index.load(self.path, mmap=mmap)
+        except (OSError, KeyError, ValueError):
+            # Snapshot predates the lexical index, build it from the stored chunks
+            self.lexical = BM25Index.build(self.chunks.ids.tolist(),
+                                           [chunk.page_content for chunk in self.chunks.values()])
+        return True
+
+    def save(self):
+        if self.read_only:
+            raise RuntimeError("A memory-mapped snapshot is read-only")
+        with snapshot_lock(self.path):
+            self._save()
+
+    def _save(self):
+        self.compact()
+        self.chunks.save(self.path)
+        _atomic_write(os.path.join(self.path, IDS_FILE),
+                      lambda f: np.save(f, self.ids), mode="wb")
+        _atomic_write(os.path.join(self.path, EMBEDDINGS_FILE),
+                      lambda f: np.save(f, self.embeddings), mode="wb")
+        if _quantized(self.index_spec):
+            # The index holds compressed codes, the float32 vectors are only read for re-ranking
+            # and rebuilds, so they are served from the page cache instead of the heap
+            self.embeddings = np.load(os.path.join(self.path, EMBEDDINGS_FILE), mmap_mode="r")
+
+        self.lexical.save(self.path)
+
+        tmp_index = tmp_path(os.path.join(self.path, FAISS_FILE))
+        faiss.write_index(self.index, tmp_index)
+        os.replace(tmp_index, os.path.join(self.path, FAISS_FILE))
+
+        # Manifest goes last, it marks the snapshot as complete
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "dim": self.dim,
+            "chunk_size": self.chunk_size,
+            "next_id": self.next_id,
+            "rows": self.rows,
+            "sources": self.sources,
+            "index_spec": self.index_spec,
+            "trained_size": self.trained_size,
+            "build_report": self.build_report,
+        }
+        _atomic_write(os.path.join(self.path, MANIFEST_FILE),
+                      lambda f: json.dump(manifest, f))
+
+    def index_nbytes(self):
+        """
+        Memory the FAISS index takes in this process. For a memory-mapped index only the part
+        read into the heap, its vectors are in the shared page cache (see index_mapped_bytes).
+        """
+        if self.read_only:
+            return self.index_heap_bytes
+        return ann_index.index_bytes(self.index)
+
+    def chunk_store_nbytes(self, mapped=False):
+        """
+        Memory of the chunk store and stored embeddings held in the heap, or with `mapped`
+        the size of the memory-mapped parts (quantized indexes and shared snapshots).
+        """
+        embedding_bytes = self.embeddings.nbytes if isinstance(self.embeddings, np.memmap) == mapped else 0
+        return self.chunks.nbytes(mapped=mapped) + embedding_bytes
+
+    def index_mapped_bytes(self):
+        """Resident pages of the memory-mapped FAISS file in this process (Linux), else None."""
+        if not self.read_only:
+            return None
+        path = os.path.realpath(os.path.join(self.path, FAISS_FILE))
+        total, mapped = 0, False
+        try:
+            with open("/proc/self/smaps", "r") as f:
+                for line in f:
+                    if SMAPS_HEADER.match(line):
+                        mapped = line.rstrip("\n").split(None, 5)[-1].startswith(path)
+                    elif mapped and line.startswith("Rss:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            return None
+        return total
+
+    def compact(self):
+        """Drops parent slots left behind by removed rows once there are enough of them."""
+        holes = len(self.chunks.parent_texts) - len(self.rows)
+        if holes and holes >= COMPACT_RATIO * len(self.chunks.parent_texts):
+            remap = self.chunks.compact()
+            self.rows = {key: remap[parent_id] for key, parent_id in self.rows.items()}
+
+    def apply_search_params(self, index_config=None):
+        """Applies nprobe / efSearch / rerank from the current config to a loaded index."""
+        if self.index is not None and self.index_spec is not None:
+            spec = ann_index.resolve_spec(index_config, len(self.ids), self.dim)
+            if ann_index.same_build(self.index_spec, spec):
+                ann_index.apply_search_params(self.index, spec)
+                self.index_spec = {**self.index_spec, "rerank": spec["rerank"]}
+
+    def sync(self, documents, chunk_size, dim, chunk_fn, embed_fn, progress=None, index_config=None):
+        """
+        Brings the index in line with `documents`.
+
+        Args:
+            documents: iterable of row-level Document objects, consumed once.
+            chunk_size: chunk size in characters, a change forces a full rebuild.
+            dim: embedding dimension, a change forces a full rebuild.
+            chunk_fn: callable(Document, chunk_size) -> (starts, ends, title): character spans
+                of the chunks and a title line repeated at the top of every chunk but the first.
+            embed_fn: callable(list of chunks with page_content) -> float32 array (n, dim).
+            progress: optional callable(stage, **detail) told when chunk/embed/index start.
+            index_config: "index" section of rag_config (type, nlist, nprobe, M, efSearch, ...).
+
+        Returns:
+            dict with the number of added, removed and unchanged rows.
+        """
+        if self.read_only:
+            raise RuntimeError("A memory-mapped snapshot is read-only")
+        progress = progress or (lambda stage, **detail: None)
+        if self.dim is None or self.chunk_size != chunk_size or self.dim != dim:
+            self.reset(dim, chunk_size)
+
+        # Chunk only new or changed rows, documents are not kept once their text is stored
+        progress("chunk")
+        current = set()
+        added = []
+        parents, starts, ends = [], [], []
+        chunk_seconds = 0.0
+        for key, doc in iter_row_keys(documents):
+            current.add(key)
+            if key in self.rows:
+                continue
+            chunk_start = time.perf_counter()
+            row_starts, row_ends, title = chunk_fn(doc, chunk_size)
+            chunk_seconds += time.perf_counter() - chunk_start
+            parent_id = self.chunks.add_parent(doc.page_content, doc.metadata, title=title)
+            added.append((key, parent_id))
+            parents.extend([parent_id] * len(row_starts))
+            starts.extend(row_starts)
+            ends.extend(row_ends)
+
+        # Drop chunks of deleted or changed rows
+        removed = [key for key in self.rows if key not in current]
+        stale_ids = self.chunks.remove_parents([self.rows.pop(key) for key in removed])
+        if stale_ids.size:
+            keep = ~np.isin(self.ids, stale_ids)
+            self.ids = self.ids[keep]
+            self.embeddings = self.embeddings[keep]
+            self.lexical.remove(stale_ids)
+        self.rows.update(added)
+
+        new_ids = np.arange(self.next_id, self.next_id + len(starts), dtype="int64")
+        self.next_id += len(starts)
+        self.chunks.add_chunks(new_ids, parents, starts, ends)
+        # Views only reference the parent text, chunk strings are sliced when read
+        new_chunks = self.chunks.views(new_ids.tolist())
+
+        metrics.observe("chunk", chunk_seconds)
+
+        progress("embed", rows=len(added), chunks=len(new_chunks))
+        new_embeddings = np.zeros((0, dim), dtype="float32")
+        if new_chunks:
+            with metrics.timer("embed"):
+                new_embeddings = np.ascontiguousarray(embed_fn(new_chunks), dtype="float32")
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.embeddings = np.concatenate([self.embeddings, new_embeddings])
+            self.lexical.add(new_ids.tolist(), [doc.page_content for doc in new_chunks])
+        if stale_ids.size or new_chunks:
+            self.lexical.finalize()
+
+        progress("index", chunks=len(new_chunks))
+        index_start = time.perf_counter()
+        spec = ann_index.resolve_spec(index_config, len(self.ids), dim)
+        rebuild = (
+            self.index is None
+            or not ann_index.same_build(self.index_spec, spec)
+            or ann_index.needs_retrain(self.index_spec, self.trained_size, len(self.ids))
+            or (stale_ids.size and not ann_index.supports_remove(self.index))
+        )
+        if rebuild:
+            # Rebuilt from the stored embeddings, nothing is re-embedded
+            self.build(spec, check_recall=ann_index.index_config(index_config)["recall_check"])
+        else:
+            if stale_ids.size:
+                self.index.remove_ids(stale_ids)
+            if new_ids.size:
+                self.index.add_with_ids(new_embeddings, new_ids)
+            ann_index.apply_search_params(self.index, spec)
+            self.index_spec = {**self.index_spec, "rerank": spec["rerank"]}
+        metrics.observe("index", time.perf_counter() - index_start)
+
+        return {
+            "added": len(added),
+            "removed": len(removed),
+            "unchanged": len(current) - len(added),
+            "rebuilt": bool(rebuild),
+        }
+
+    def build(self, spec, check_recall=True):
+        """(Re)builds the FAISS index from the stored embeddings and records a build report."""
+        start = time.perf_counter()
+        self.index = ann_index.build_index(spec, self.embeddings, self.ids)
+        self.index_spec = spec
+        self.trained_size = len(self.ids)
+        index_bytes = ann_index.index_bytes(self.index)
+        float32_bytes = self.embeddings.nbytes
+        self.build_report = {
+            "index_type": spec["type"],
+            "quantizer": spec.get("quantizer", "none"),
+            "vectors": len(self.ids),
+            "build_seconds": round(time.perf_counter() - start, 3),
+            "index_bytes": index_bytes,
+            "float32_bytes": float32_bytes,
+            "bytes_per_vector": round(index_bytes / len(self.ids), 1) if len(self.ids) else None,
+            "compression": round(float32_bytes / index_bytes, 2) if index_bytes else None,
+        }
+        if check_recall and (spec["type"] != "flat" or spec.get("quantizer", "none") != "none"):
+            rerank = spec.get("rerank", 0)
+            recall, search_ms = ann_index.measure_recall(self.index, self.embeddings, self.ids)
+            self.build_report.update(recall_at_k=round(recall, 4), recall_k=ann_index.RECALL_K,
+                                     search_ms=round(search_ms, 4))
+            if rerank:
+                recall, search_ms = ann_index.measure_recall(self.index, self.embeddings, self.ids, rerank=rerank)
+                self.build_report.update(reranked_recall_at_k=round(recall, 4), reranked_search_ms=round(search_ms, 4))
+            if recall < 0.9:
+                print(f"Warning: {spec['type']} ({spec.get('quantizer', 'none')}) recall@{ann_index.RECALL_K} "
+                      f"is {recall:.2f}, consider raising nprobe / efSearch / rerank in rag_config.")
+        print(f"Built {spec['type']} index: {self.build_report}")
@@ -0,0 +1,153 @@
+import os
+import json
+import math
+
+import numpy as np
+
+from src.embedder import tokenize
+from src.array_files import save_arrays, load_arrays, tmp_path
+
+LEXICAL_ARRAYS_PREFIX = "lexical"
+LEXICAL_ARRAYS = ("terms", "chunk_ids", "tfs", "doc_ids", "doc_lengths", "offsets", "posting_lengths")
+LEXICAL_VOCAB_FILE = "lexical_vocab.json"
+
+# Standard BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Reciprocal-rank fusion constant, dampens the weight of top ranks
+RRF_K = 60
+
+
+class BM25Index:
+    """
+    BM25 inverted index kept in compact NumPy arrays.
+
+    Postings are (term id, chunk id, term frequency) triples sorted by term, with
+    `offsets[t]:offsets[t + 1]` delimiting the postings of term t. Chunks can be
+    added and removed, the arrays are re-sorted once per batch of changes.
+    """
+
+    def __init__(self, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}  # term -> term id
+        self.terms = np.zeros(0, dtype="int32")
+        self.chunk_ids = np.zeros(0, dtype="int64")
+        self.tfs = np.zeros(0, dtype="float32")
+        self.doc_ids = np.zeros(0, dtype="int64")      # sorted chunk ids
+        self.doc_lengths = np.zeros(0, dtype="float32")
+        self.offsets = np.zeros(1, dtype="int64")
+        self.posting_lengths = np.zeros(0, dtype="float32")
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def add(self, chunk_ids, texts):
+        """Indexes the given chunks. Call finalize() once all changes are applied."""
+        terms, postings, tfs, lengths = [], [], [], []
+        vocab = self.vocab
+        for chunk_id, text in zip(chunk_ids, texts):
+            counts = {}
+            for token in tokenize(text):
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                term_id = vocab.get(token)
+                if term_id is None:
+                    term_id = vocab[token] = len(vocab)
+                terms.append(term_id)
+                tfs.append(tf)
+            postings.extend([chunk_id] * len(counts))
+            lengths.append(sum(counts.values()))
+
+        self.terms = np.concatenate([self.terms, np.asarray(terms, dtype="int32")])
+        self.chunk_ids = np.concatenate([self.chunk_ids, np.asarray(postings, dtype="int64")])
+        self.tfs = np.concatenate([self.tfs, np.asarray(tfs, dtype="float32")])
+        self.doc_ids = np.concatenate([self.doc_ids, np.asarray(chunk_ids, dtype="int64")])
+        self.doc_lengths = np.concatenate([self.doc_lengths, np.asarray(lengths, dtype="float32")])
+
+    def remove(self, chunk_ids):
+        chunk_ids = np.asarray(chunk_ids, dtype="int64")
+        keep = ~np.isin(self.chunk_ids, chunk_ids)
+        self.terms, self.chunk_ids, self.tfs = self.terms[keep], self.chunk_ids[keep], self.tfs[keep]
+        keep_docs = ~np.isin(self.doc_ids, chunk_ids)
+        self.doc_ids, self.doc_lengths = self.doc_ids[keep_docs], self.doc_lengths[keep_docs]
+
+    def finalize(self):
+        """Sorts postings by term and precomputes per-posting document lengths."""
+        order = np.lexsort((self.chunk_ids, self.terms))
+        self.terms, self.chunk_ids, self.tfs = self.terms[order], self.chunk_ids[order], self.tfs[order]
+
+        doc_order = np.argsort(self.doc_ids, kind="stable")
+        self.doc_ids, self.doc_lengths = self.doc_ids[doc_order], self.doc_lengths[doc_order]
+
+        counts = np.bincount(self.terms, minlength=len(self.vocab))
+        self.offsets = np.concatenate(([0], np.cumsum(counts))).astype("int64")
+        if len(self.doc_ids):
+            self.posting_lengths = self.doc_lengths[np.searchsorted(self.doc_ids, self.chunk_ids)]
+        else:
+            self.posting_lengths = np.zeros(0, dtype="float32")
+
+    @classmethod
+    def build(cls, chunk_ids, texts):
+        index = cls()
+        index.add(chunk_ids, texts)
+        index.finalize()
+        return index
+
+    def search(self, query, k=10):
+        """Returns (chunk ids, scores) of the k best BM25 matches, best first."""
+        n_docs = len(self.doc_ids)
+        term_ids = {self.vocab[token] for token in tokenize(query) if token in self.vocab}
+        if not n_docs or not term_ids:
+            return np.zeros(0, dtype="int64"), np.zeros(0, dtype="float32")
+
+        avg_length = float(self.doc_lengths.mean()) or 1.0
+        matched, scores = [], []
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            df = end - start
+            if not df:
+                continue
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            tf = self.tfs[start:end]
+            norm = self.k1 * (1 - self.b + self.b * self.posting_lengths[start:end] / avg_length)
+            matched.append(self.chunk_ids[start:end])
+            scores.append(idf * tf * (self.k1 + 1) / (tf + norm))
+
+        if not matched:
+            return np.zeros(0, dtype="int64"), np.zeros(0, dtype="float32")
+        candidates, inverse = np.unique(np.concatenate(matched), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores))
+        top = np.argsort(-totals, kind="stable")[:k]
+        return candidates[top], totals[top].astype("float32")
+
+    def save(self, path):
+        """Saves the finalized arrays, so loading needs no re-sort and can memory-map them."""
+        save_arrays(path, LEXICAL_ARRAYS_PREFIX, **{name: getattr(self, name) for name in LEXICAL_ARRAYS})
+
+        tmp_vocab = tmp_path(os.path.join(path, LEXICAL_VOCAB_FILE))
+        with open(tmp_vocab, "w", encoding="utf-8") as f:
+            json.dump(sorted(self.vocab, key=self.vocab.get), f, ensure_ascii=False)
+        os.replace(tmp_vocab, os.path.join(path, LEXICAL_VOCAB_FILE))
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        index = cls()
+        with open(os.path.join(path, LEXICAL_VOCAB_FILE), "r", encoding="utf-8") as f:
+            index.vocab = {term: i for i, term in enumerate(json.load(f))}
+        for name, array in load_arrays(path, LEXICAL_ARRAYS_PREFIX, LEXICAL_ARRAYS, mmap=mmap).items():
+            setattr(index, name, array)
+        return index
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Merges ranked id lists: score(id) = sum over lists of 1 / (k + rank).
+    Returns ids ordered by fused score.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,241 @@
+import os
+import time
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+import httpx
+
+# mistralai, crewai and litellm are imported on first use, together they take seconds to import
+from src.http_client import RETRY_STATUS_CODES, retry_delay
+
+# Base URL of the chat-completions API, None uses Mistral's. Point it at a local fake server for tests.
+MISTRAL_SERVER_URL = os.getenv("MISTRAL_SERVER_URL")
+MISTRAL_API_BASE = "https://api.mistral.ai/v1"
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))          # seconds per attempt
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))     # retries on 429/5xx, timeouts and connection errors
+LLM_BACKOFF = float(os.getenv("LLM_BACKOFF", "0.5"))         # base of the jittered exponential backoff
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "32"))        # keep-alive connections per client
+
+# Concurrent requests per model, e.g. "mistral-large-latest=4,mistral-small-latest=16"
+LLM_MODEL_CONCURRENCY = os.getenv("LLM_MODEL_CONCURRENCY", "")
+LLM_DEFAULT_CONCURRENCY = int(os.getenv("LLM_DEFAULT_CONCURRENCY", "8"))
+
+
+def parse_model_limits(value):
+    limits = {}
+    for item in value.split(","):
+        if "=" in item:
+            model, limit = item.split("=", 1)
+            limits[model.strip()] = int(limit)
+    return limits
+
+
+def _retry_response(error):
+    """(retryable, response) for an exception raised by a completion call."""
+    from mistralai.models import SDKError
+
+    if isinstance(error, SDKError):
+        return error.status_code in RETRY_STATUS_CODES, error.raw_response
+    if isinstance(error, (httpx.TimeoutException, httpx.TransportError)):
+        return True, None
+    return False, None
+
+
+class LLMGateway:
+    """
+    Process-wide access to the chat-completions API.
+
+    One Mistral client per process over pooled keep-alive HTTP connections, instead of a
+    new client (and TLS handshake) per request. Calls are retried with jittered backoff on
+    429/5xx and transport errors, and each model has its own concurrency limit.
+    """
+
+    def __init__(self, api_key, server_url=MISTRAL_SERVER_URL, timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES,
+                 backoff=LLM_BACKOFF, pool_size=LLM_POOL_SIZE, model_limits=None,
+                 default_limit=LLM_DEFAULT_CONCURRENCY):
+        self.api_key = api_key
+        self.server_url = server_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.model_limits = model_limits if model_limits is not None else parse_model_limits(LLM_MODEL_CONCURRENCY)
+        self.default_limit = default_limit
+        self.metrics = {"requests": 0, "retries": 0, "errors": 0}
+
+        self.http_client = httpx.Client(limits=self._limits(), timeout=timeout)
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        # Async clients and semaphores belong to the event loop they were created on
+        self._loop = None
+        self._async_client = None
+        self._async_semaphores = {}
+        self._client = None
+
+    @property
+    def client(self):
+        """Sync Mistral client, created on the first completion."""
+        with self._lock:
+            if self._client is None:
+                from mistralai import Mistral
+
+                self._client = Mistral(api_key=self.api_key, server_url=self.server_url, client=self.http_client,
+                                       timeout_ms=int(self.timeout * 1000))
+            return self._client
+
+    def _limits(self):
+        return httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+
+    def _limit_for(self, model):
+        return self.model_limits.get(model, self.default_limit)
+
+    def _async_mistral(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            from mistralai import Mistral
+
+            self._loop = loop
+            self._async_client = httpx.AsyncClient(limits=self._limits(), timeout=self.timeout)
+            self._async_semaphores = {}
+            self.async_client = Mistral(api_key=self.api_key, server_url=self.server_url,
+                                        async_client=self._async_client, timeout_ms=int(self.timeout * 1000))
+        return self.async_client
+
+    @contextmanager
+    def limit(self, model):
+        """Holds one of the model's concurrency slots (blocking)."""
+        with self._lock:
+            semaphore = self._semaphores.get(model)
+            if semaphore is None:
+                semaphore = self._semaphores[model] = threading.BoundedSemaphore(self._limit_for(model))
+        with semaphore:
+            yield
+
+    @asynccontextmanager
+    async def limit_async(self, model):
+        """Holds one of the model's concurrency slots without blocking the event loop."""
+        semaphore = self._async_semaphores.get(model)
+        if semaphore is None:
+            semaphore = self._async_semaphores[model] = asyncio.Semaphore(self._limit_for(model))
+        async with semaphore:
+            yield
+
+    def _count(self, key):
+        with self._lock:
+            self.metrics[key] += 1
+
+    def _should_retry(self, error, attempt):
+        """Seconds to wait before retrying `error`, or None if it is not retried."""
+        retryable, response = _retry_response(error)
+        if not retryable or attempt == self.max_retries:
+            self._count("errors")
+            return None
+        self._count("retries")
+        return retry_delay(response, attempt, self.backoff)
+
+    def complete(self, messages, model="mistral-small-latest", **kwargs):
+        """Chat completion, returns the answer text."""
+        self._count("requests")
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.limit(model):
+                    response = self.client.chat.complete(model=model, messages=messages, **kwargs)
+                return response.choices[0].message.content
+            except Exception as e:
+                delay = self._should_retry(e, attempt)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+
+    async def complete_async(self, messages, model="mistral-small-latest", **kwargs):
+        """Async chat completion, returns the answer text."""
+        self._count("requests")
+        client = self._async_mistral()
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.limit_async(model):
+                    response = await client.chat.complete_async(model=model, messages=messages, **kwargs)
+                return response.choices[0].message.content
+            except Exception as e:
+                delay = self._should_retry(e, attempt)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+    async def stream_async(self, messages, model="mistral-small-latest", **kwargs):
+        """
+        Streams the completion token by token (yields text deltas).
+        Only opening the stream is retried, a stream that fails midway raises.
+        """
+        self._count("requests")
+        client = self._async_mistral()
+        async with self.limit_async(model):
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await client.chat.stream_async(model=model, messages=messages, **kwargs)
+                    break
+                except Exception as e:
+                    delay = self._should_retry(e, attempt)
+                    if delay is None:
+                        raise
+                await asyncio.sleep(delay)
+
+            async with response as events:
+                async for event in events:
+                    content = event.data.choices[0].delta.content
+                    if content:
+                        yield content
+
+    def crewai_llm(self, model="mistral-large-latest", **kwargs):
+        """CrewAI LLM for `model` that goes through this gateway's limits, timeouts and retries."""
+        from openai import OpenAI
+
+        api_base = f"{self.server_url.rstrip('/')}/v1" if self.server_url else MISTRAL_API_BASE
+        # litellm (used by CrewAI) sends Mistral calls through this OpenAI-compatible client over the
+        # pooled connections. It is passed per call, other litellm providers keep their own clients.
+        client = OpenAI(api_key=self.api_key, base_url=api_base, http_client=self.http_client,
+                        timeout=self.timeout, max_retries=0)
+        return gateway_llm_class()(self, model=f"mistral/{model}", api_key=self.api_key, api_base=api_base,
+                                   timeout=self.timeout, num_retries=self.max_retries, client=client, **kwargs)
+
+
+_gateway_llm_class = None
+
+
+def gateway_llm_class():
+    """GatewayLLM, defined on first use so crewai is only imported when an agent is built."""
+    global _gateway_llm_class
+    if _gateway_llm_class is None:
+        from crewai import LLM
+
+        class GatewayLLM(LLM):
+            """CrewAI LLM whose calls take a slot of the gateway's per-model concurrency limit."""
+
+            def __init__(self, gateway, **kwargs):
+                super().__init__(**kwargs)
+                self.gateway = gateway
+
+            def call(self, *args, **kwargs):
+                with self.gateway.limit(self.model.split("/", 1)[-1]):
+                    return super().call(*args, **kwargs)
+
+        _gateway_llm_class = GatewayLLM
+    return _gateway_llm_class
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Process-wide gateway built from MISTRAL_API_KEY and the LLM_* environment variables."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            api_key = os.getenv("MISTRAL_API_KEY")
+            if not api_key:
+                raise ValueError("Missing MISTRAL_API_KEY in environment")
+            _gateway = LLMGateway(api_key)
+        return _gateway
@@ -0,0 +1,153 @@
+import time
+import threading
+from contextlib import contextmanager
+
+from src import tracing
+
+# Latency buckets in seconds, from sub-millisecond searches to multi-second LLM calls and reindexes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+STAGE_METRIC = "truenotion_stage_seconds"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, one series per label set."""
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: ([*counts], total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = dict(zip(self.label_names, key))
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callable at scrape time, so it is never stale."""
+
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def render(self):
+        try:
+            value = self.read()
+        except Exception:
+            # Not available yet (e.g. before the index is loaded)
+            return []
+        if value is None:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_format_value(float(value))}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help_text, label_names, buckets)
+            return self._metrics[name]
+
+    def gauge(self, name, help_text, read):
+        with self._lock:
+            self._metrics[name] = Gauge(name, help_text, read)
+            return self._metrics[name]
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    STAGE_METRIC,
+    "Latency of request and ingestion stages (retrieve, embed_query, faiss_search, bm25_search, context_build, "
+    "llm, notion_fetch, upstash_load, chunk, embed, index, save).",
+    label_names=("stage", "kind"),
+)
+
+
+def observe(stage, seconds, kind="", start=None):
+    stage_seconds.observe(seconds, stage=stage, kind=kind)
+    # Also a span of the request trace, if the request asked for one
+    if start is not None:
+        tracing.record(f"{stage}:{kind}" if kind else stage, start, seconds)
+
+
+@contextmanager
+def timer(stage, kind=""):
+    """Records the wall time of the block under `stage` (also across awaits)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start, kind, start)
+
+
+def timed_iter(iterable, stage, kind=""):
+    """
+    Yields from `iterable`, recording the total time spent producing items as one
+    observation once it is exhausted (e.g. rows streamed from Upstash during ingestion).
+    """
+    iterator = iter(iterable)
+    first = time.perf_counter()
+    spent = 0.0
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            observe(stage, spent + time.perf_counter() - start, kind, first)
+            return
+        spent += time.perf_counter() - start
+        yield item
@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import uuid
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from src.array_files import tmp_path
+
+# Ingestion stages reported while a job runs, in order
+STAGES = ("fetch", "chunk", "embed", "index")
+
+# Finished jobs kept around for the status endpoint
+MAX_FINISHED_JOBS = 20
+
+
+class ReindexJobs:
+    """
+    Runs reindex jobs one at a time on a background thread.
+
+    A job calls `build(progress)` off the request path and hands its result to
+    `swap(result)`, which replaces the served state in one assignment. Requests that
+    started before the swap keep using the objects they already hold.
+
+    With `jobs_dir` every status change is also written to <jobs_dir>/<job id>.json, so
+    workers sharing the directory report jobs started by any of them.
+    """
+
+    def __init__(self, jobs_dir=None):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reindex")
+        self._lock = threading.Lock()
+        self.jobs = OrderedDict()  # job id -> status dict
+        self.active_id = None
+        self.jobs_dir = jobs_dir
+        if jobs_dir:
+            os.makedirs(jobs_dir, exist_ok=True)
+
+    def submit(self, build, swap):
+        """Starts a reindex, or returns the job already queued or running."""
+        with self._lock:
+            if self.active_id is not None:
+                return dict(self.jobs[self.active_id])
+
+            job_id = uuid.uuid4().hex
+            self.jobs[job_id] = {
+                "job_id": job_id,
+                "status": "queued",
+                "stage": None,
+                "progress": {},
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "error": None,
+            }
+            self.active_id = job_id
+            self._write(job_id)
+            self._prune()
+            job = dict(self.jobs[job_id])
+
+        self._executor.submit(self._run, job_id, build, swap)
+        return job
+
+    def get(self, job_id):
+        """Status of a job started by this process, else the one another worker wrote to jobs_dir."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        return self._read(job_id)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self.jobs[job_id].update(fields)
+            self._write(job_id)
+
+    def _job_path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _write(self, job_id):
+        """Replaces the job's status file, call it holding the lock."""
+        if not self.jobs_dir:
+            return
+        path = self._job_path(job_id)
+        try:
+            with open(tmp_path(path), "w") as f:
+                json.dump(self.jobs[job_id], f)
+            os.replace(tmp_path(path), path)
+        except OSError as e:
+            print(f"Warning: Could not write reindex job status due to {e}")
+
+    def _read(self, job_id):
+        # Job ids are hex uuids, anything else never names a status file
+        if not self.jobs_dir or not job_id.isalnum():
+            return None
+        try:
+            with open(self._job_path(job_id), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _run(self, job_id, build, swap):
+        self._update(job_id, status="running", started_at=time.time())
+
+        def progress(stage, **detail):
+            with self._lock:
+                job = self.jobs[job_id]
+                job["stage"] = stage
+                job["progress"][stage] = {"at": time.time(), **detail}
+                self._write(job_id)
+
+        try:
+            result = build(progress)
+            swap(result)
+            self._update(job_id, status="succeeded", stage="done", finished_at=time.time())
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+        finally:
+            with self._lock:
+                self.active_id = None
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["finished_at"] is not None]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+            if self.jobs_dir:
+                try:
+                    os.remove(self._job_path(job_id))
+                except OSError:
+                    pass
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import hashlib
+import fcntl
+import shutil
+import threading
+from contextlib import contextmanager
+
+from src.index_store import INDEX_DIR, MANIFEST_FILE, SNAPSHOT_LOCK_FILE
+
+# Several workers on one host share one index: a single worker fetches and builds it, every
+# worker serves the published snapshot memory-mapped (one copy in the page cache per host)
+SHARED_INDEX = os.getenv("SHARED_INDEX", "false").lower() in ("1", "true", "yes")
+
+# Seconds between checks for a newly published version
+SHARED_INDEX_POLL = float(os.getenv("SHARED_INDEX_POLL", "5"))
+
+# Published versions kept on disk, older ones are deleted (workers still mapping them keep their pages)
+SHARED_INDEX_KEEP = int(os.getenv("SHARED_INDEX_KEEP", "3"))
+
+VERSIONS_DIR = "versions"
+# Reindex job status files, so any worker can report a job another one runs
+JOBS_DIR = "jobs"
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = "builder.lock"
+# Time of the last finished refresh, also written when it left the content unchanged
+REFRESHED_FILE = "REFRESHED"
+# rag_config the version was built with, next to its manifest
+RAG_CONFIG_FILE = "rag_config.json"
+
+
+@contextmanager
+def builder_lock(path=INDEX_DIR, blocking=True):
+    """
+    Holds the host-wide builder lock (flock on a file next to the index). Yields False
+    without waiting when `blocking` is off and another worker is building.
+    """
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, LOCK_FILE), "w") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def version_path(version, path=INDEX_DIR):
+    return os.path.join(path, VERSIONS_DIR, version)
+
+
+def current_version(path=INDEX_DIR):
+    """Name of the published version, None before the first publish."""
+    try:
+        with open(os.path.join(path, CURRENT_FILE), "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def last_refresh(path=INDEX_DIR):
+    """Unix time the last refresh was published, 0 before the first one."""
+    try:
+        with open(os.path.join(path, REFRESHED_FILE), "r") as f:
+            return float(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0.0
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def version_rag_config(version, path=INDEX_DIR):
+    """rag_config a published version was built with, None if it was published without one."""
+    try:
+        with open(os.path.join(version_path(version, path), RAG_CONFIG_FILE), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def snapshot_fingerprint(path=INDEX_DIR, rag_config=None):
+    """Fingerprint of the saved snapshot: its rows, chunk size and index type, and the rag_config."""
+    with open(os.path.join(path, MANIFEST_FILE), "r") as f:
+        manifest = json.load(f)
+    content = {key: manifest.get(key) for key in ("dim", "chunk_size", "rows", "index_spec", "trained_size")}
+    content["rag_config"] = rag_config
+    return hashlib.sha1(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def publish(path=INDEX_DIR, keep=SHARED_INDEX_KEEP, rag_config=None):
+    """
+    Publishes the snapshot saved in `path` as an immutable version and points CURRENT at it.
+    Call it holding the builder lock. Files are hard-linked, IndexStore.save replaces files
+    instead of rewriting them, so a published version never changes. `rag_config` is stored
+    with the version so every worker serves it with the same settings. Returns the version
+    name, the current one if neither the snapshot nor the rag_config changed.
+    """
+    if not os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        raise RuntimeError(f"No saved index snapshot in {path} to publish")
+    fingerprint = snapshot_fingerprint(path, rag_config)
+    current = current_version(path)
+    if current and current.rsplit("-", 1)[-1] == fingerprint:
+        _write_atomic(os.path.join(path, REFRESHED_FILE), str(time.time()))
+        return current
+
+    version = f"{int(time.time() * 1000)}-{fingerprint}"
+    versions_dir = os.path.join(path, VERSIONS_DIR)
+    tmp_dir = os.path.join(versions_dir, version + ".tmp")
+    os.makedirs(tmp_dir)
+    for name in os.listdir(path):
+        source = os.path.join(path, name)
+        if not os.path.isfile(source) or name.endswith(".tmp") or name in (
+                CURRENT_FILE, LOCK_FILE, REFRESHED_FILE, SNAPSHOT_LOCK_FILE):
+            continue
+        try:
+            os.link(source, os.path.join(tmp_dir, name))
+        except OSError:
+            shutil.copy2(source, os.path.join(tmp_dir, name))
+    if rag_config is not None:
+        with open(os.path.join(tmp_dir, RAG_CONFIG_FILE), "w") as f:
+            json.dump(rag_config, f, indent=2)
+    os.rename(tmp_dir, version_path(version, path))
+
+    _write_atomic(os.path.join(path, CURRENT_FILE), version)
+    _write_atomic(os.path.join(path, REFRESHED_FILE), str(time.time()))
+    print(f"Published index version {version}.")
+
+    _prune(versions_dir, keep, version)
+    return version
+
+
+def _prune(versions_dir, keep, current):
+    versions = sorted(name for name in os.listdir(versions_dir) if not name.endswith(".tmp"))
+    for name in versions[:max(0, len(versions) - keep)]:
+        if name != current:
+            shutil.rmtree(os.path.join(versions_dir, name), ignore_errors=True)
+
+
+def watch(on_version, path=INDEX_DIR, interval=SHARED_INDEX_POLL):
+    """
+    Calls on_version(version) from a daemon thread whenever CURRENT names a version it has
+    not handled yet. A failed call is retried at the next poll.
+    """
+    def loop():
+        handled = None
+        while True:
+            version = current_version(path)
+            if version and version != handled:
+                try:
+                    on_version(version)
+                    handled = version
+                except Exception as e:
+                    print(f"Warning: Could not load index version {version} due to {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name="index-watch", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import random
+import cProfile
+import threading
+import tracemalloc
+import contextvars
+from contextlib import contextmanager
+
+# Requests opt into a trace with this header (any value) or the ?debug=true query flag
+DEBUG_HEADER = "X-Debug-Trace"
+
+# Share of requests run under cProfile + tracemalloc, 0 disables profiling
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/rag/profiles")
+PROFILE_TOP_ALLOCATIONS = 25
+
+_current = contextvars.ContextVar("trace", default=None)
+# File name prefix of the sampled request's profiles, None when the request is not profiled
+_profile_base = contextvars.ContextVar("profile_base", default=None)
+_profile_lock = threading.Lock()
+
+
+class Trace:
+    """Spans and attributes of one request, filled in by whichever code runs under it."""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans = []       # (name, start offset ms, duration ms)
+        self.attributes = {}
+        self._lock = threading.Lock()  # spans also arrive from executor threads
+
+    def add_span(self, name, start, duration):
+        with self._lock:
+            self.spans.append((name, (start - self.start) * 1000, duration * 1000))
+
+    def annotate(self, **attributes):
+        with self._lock:
+            self.attributes.update(attributes)
+
+    def total_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "total_ms": round(self.total_ms(), 3),
+                "spans": [{"name": name, "start_ms": round(offset, 3), "duration_ms": round(duration, 3)}
+                          for name, offset, duration in self.spans],
+                "attributes": dict(self.attributes),
+            }
+
+    def server_timing(self):
+        """Server-Timing header value, spans with the same name are summed."""
+        totals = {}
+        with self._lock:
+            for name, _, duration in self.spans:
+                totals[name] = totals.get(name, 0.0) + duration
+        entries = [f"{name.replace(':', '-')};dur={duration:.3f}" for name, duration in totals.items()]
+        entries.append(f"total;dur={self.total_ms():.3f}")
+        return ", ".join(entries)
+
+
+def current():
+    """Trace of the running request, None when tracing is off (the common case)."""
+    return _current.get()
+
+
+@contextmanager
+def start_trace(name):
+    trace = Trace(name)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def record(name, start, duration):
+    trace = _current.get()
+    if trace is not None:
+        trace.add_span(name, start, duration)
+
+
+def annotate(**attributes):
+    trace = _current.get()
+    if trace is not None:
+        trace.annotate(**attributes)
+
+
+def is_debug_request(request):
+    return DEBUG_HEADER.lower() in request.headers or request.query_params.get("debug") in ("1", "true")
+
+
+@contextmanager
+def sample_profile(name, sample_rate=None):
+    """
+    Samples a share of requests (PROFILE_SAMPLE_RATE, or `sample_rate`) for profiling. The
+    synchronous work of a sampled request runs under maybe_profile() in its own thread, and
+    the request's spans (retrieval, LLM awaits, ...) are written to
+    <name>-<time>-<pid>.trace.json in PROFILE_DIR when the block ends.
+    """
+    rate = PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if not rate or random.random() >= rate:
+        yield
+        return
+
+    base = f"{name}-{int(time.time() * 1000)}-{os.getpid()}"
+    base_token = _profile_base.set(base)
+    # An untraced request gets a trace of its own, so the awaited time is recorded too
+    trace = _current.get()
+    trace_token = None
+    if trace is None:
+        trace = Trace(name)
+        trace_token = _current.set(trace)
+    try:
+        yield
+    finally:
+        if trace_token is not None:
+            _current.reset(trace_token)
+        _profile_base.reset(base_token)
+        _write_file(f"{base}.trace.json", json.dumps(trace.to_dict(), indent=2))
+
+
+@contextmanager
+def maybe_profile(stage):
+    """
+    Runs the block under cProfile and tracemalloc if the request was sampled by
+    sample_profile(), writing <request>-<stage>.prof (load with pstats / snakeviz) and
+    .alloc.txt to PROFILE_DIR.
+
+    cProfile only sees the thread it was started on, so this wraps synchronous work (e.g. the
+    retrieval callable in its executor thread, which needs the request's copied context)
+    rather than an async handler, where it would profile the event loop. Only one block is
+    profiled at a time per process.
+    """
+    base = _profile_base.get()
+    if base is None or not _profile_lock.acquire(blocking=False):
+        yield
+        return
+
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+        _write_profile(f"{base}-{stage}", profiler, tracemalloc.take_snapshot())
+    finally:
+        if started_tracemalloc:
+            tracemalloc.stop()
+        _profile_lock.release()
+
+
+def _write_profile(name, profiler, snapshot):
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, name)
+        profiler.dump_stats(base + ".prof")
+        with open(base + ".alloc.txt", "w", encoding="utf-8") as f:
+            for stat in snapshot.statistics("lineno")[:PROFILE_TOP_ALLOCATIONS]:
+                f.write(f"{stat}\n")
+        print(f"Info: Wrote profile {base}.prof")
+    except OSError as e:
+        print(f"Warning: Could not write profile due to {e}")
+
+
+def _write_file(name, text):
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(PROFILE_DIR, name), "w", encoding="utf-8") as f:
+            f.write(text)
+    except OSError as e:
+        print(f"Warning: Could not write {name} due to {e}")
@@ -0,0 +1,141 @@
+import os
+import time
+import json
+import threading
+from dotenv import load_dotenv
+from src import http_client
+
+if "MISTRAL_API_KEY" not in os.environ:
+    # For running locally or docker run without env vars set,
+    load_dotenv()  # Loads variables from .env into os.environ
+
+# Keys fetched per MGET round trip
+MGET_BATCH_SIZE = int(os.getenv("UPSTASH_MGET_BATCH_SIZE", 100))
+
+# Hint for the number of keys returned per SCAN round trip
+SCAN_COUNT = 1000
+
+
+class UpstashClient:
+    """
+    Upstash Redis REST client on a persistent keep-alive session.
+
+    Keys are listed with SCAN, values are fetched in batches with MGET and several
+    commands can be sent in one round trip through the /pipeline endpoint.
+    Every HTTP round trip is counted in `metrics`.
+    """
+
+    def __init__(self, url, token, session=None, batch_size=MGET_BATCH_SIZE):
+        self.url = url.rstrip("/")
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        }
+        self.session = session or http_client.create_session()
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self.reset_metrics()
+
+    def reset_metrics(self):
+        self.metrics = {"round_trips": 0, "commands": 0, "errors": 0, "seconds": 0.0}
+
+    def _post(self, path, payload, commands):
+        start = time.perf_counter()
+        try:
+            response = http_client.request_with_backoff(
+                self.session, "POST", f"{self.url}{path}", json=payload, headers=self.headers
+            )
+        finally:
+            with self._lock:
+                self.metrics["round_trips"] += 1
+                self.metrics["commands"] += commands
+                self.metrics["seconds"] += time.perf_counter() - start
+        if response.status_code != 200:
+            with self._lock:
+                self.metrics["errors"] += 1
+            raise Exception(f"Upstash request failed ({response.status_code}): {response.text}")
+        return response.json()
+
+    def command(self, *args):
+        """Runs a single Redis command, e.g. command("SET", key, value)."""
+        body = self._post("", list(args), commands=1)
+        if "error" in body:
+            raise Exception(f"Upstash command {args[0]} failed: {body['error']}")
+        return body.get("result")
+
+    def pipeline(self, commands):
+        """Runs several commands in one round trip, returns their results in order."""
+        if not commands:
+            return []
+        body = self._post("/pipeline", [list(c) for c in commands], commands=len(commands))
+        results = []
+        for command, item in zip(commands, body):
+            if "error" in item:
+                raise Exception(f"Upstash command {command[0]} failed: {item['error']}")
+            results.append(item.get("result"))
+        return results
+
+    def get(self, key):
+        return self.command("GET", key)
+
+    def set(self, key, value):
+        return self.command("SET", key, value)
+
+    def scan_keys(self, match="*"):
+        """Lists keys with cursor-based SCAN instead of a blocking KEYS *."""
+        keys = []
+        cursor = "0"
+        while True:
+            cursor, batch = self.command("SCAN", cursor, "MATCH", match, "COUNT", SCAN_COUNT)
+            keys.extend(batch)
+            if str(cursor) == "0":
+                # SCAN may return a key more than once, keep the first occurrence
+                return list(dict.fromkeys(keys))
+
+    def iter_hash(self, key):
+        """Yields (field, value) pairs of a hash with cursor-based HSCAN, one batch at a time."""
+        seen = set()
+        cursor = "0"
+        while True:
+            cursor, batch = self.command("HSCAN", key, cursor, "COUNT", SCAN_COUNT)
+            for field, value in zip(batch[0::2], batch[1::2]):
+                # HSCAN may return a field more than once
+                if field not in seen:
+                    seen.add(field)
+                    yield field, value
+            if str(cursor) == "0":
+                return
+
+    def mget(self, keys):
+        """Fetches many values with one MGET per batch of keys, returns {key: value}."""
+        return dict(self.iter_mget(keys))
+
+    def iter_mget(self, keys):
+        """Yields (key, value) pairs, fetching one MGET batch at a time."""
+        for start in range(0, len(keys), self.batch_size):
+            batch = keys[start:start + self.batch_size]
+            yield from zip(batch, self.command("MGET", *batch))
+
+    def get_json(self, key, default=None):
+        raw_value = self.get(key)
+        return json.loads(raw_value) if raw_value else default
+
+    def set_json(self, key, data):
+        return self.set(key, json.dumps(data, ensure_ascii=False))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide client built from the UPSTASH_REDIS_REST_* environment variables."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            url = os.getenv("UPSTASH_REDIS_REST_URL")
+            token = os.getenv("UPSTASH_REDIS_REST_TOKEN")
+            if not url or not token:
+                raise ValueError("Missing Upstash credentials in environment")
+            _client = UpstashClient(url, token)
+        return _client
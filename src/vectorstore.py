@@ -1,13 +1,18 @@
 import os
 import json
-import requests
 from dotenv import load_dotenv
-from src import connect_notion
+from src import connect_notion, upstash_client
+from src.index_store import IndexStore
+from src import glove_cache
+from src import chunker
+from src import ann_index
+from src import metrics
+from src import tracing
+from src.embedder import tokenize
+from src.lexical_index import BM25Index, reciprocal_rank_fusion, RRF_K
 
 # Custom Vectorstore
 import faiss
-import numpy as np
-from gensim.models import KeyedVectors
 
 # Define Document class
 class Document:
@@ -29,52 +34,47 @@ UPSTASH_REDIS_REST_TOKEN = os.getenv("UPSTASH_REDIS_REST_TOKEN")
 if not UPSTASH_REDIS_REST_URL or not UPSTASH_REDIS_REST_TOKEN:
     raise ValueError("Missing Upstash credentials in environment")
 
-HEADERS = {
-    "Authorization": f"Bearer {UPSTASH_REDIS_REST_TOKEN}"
-}
-
-
 def list_upstash_keys():
-    """Fetch all keys from Upstash Redis, excluding 'agent_config' and 'rag_config'."""
-    url = f"{UPSTASH_REDIS_REST_URL}"
-    headers = {
-        "Authorization": f"Bearer {UPSTASH_REDIS_REST_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    payload = ["KEYS", "*"]
-
-    response = requests.post(url, headers=headers, json=payload)
-    if response.status_code != 200:
-        raise Exception(f"Failed to list keys: {response.text}")
-
-    keys = response.json().get("result", [])
-
-    # Exclude 'agent_config' and 'rag_config'
-    exclude_keys = {"agent_config", "rag_config"}
+    """Fetch all keys from Upstash Redis, excluding config and sync state keys."""
+    keys = upstash_client.get_client().scan_keys()
+
+    # Exclude 'agent_config', 'rag_config' and the Notion sync bookkeeping
+    exclude_keys = {"agent_config", "rag_config", connect_notion.SYNC_STATE_KEY}
     return [key for key in keys if key not in exclude_keys]
 
 
 def get_upstash_json_by_key(key):
     """Get and parse JSON value for a specific key."""
-    url = f"{UPSTASH_REDIS_REST_URL}/get/{key}"
-    response = requests.get(url, headers=HEADERS)
-    if response.status_code != 200:
-        raise Exception(f"Failed to fetch key {key}: {response.text}")
-    raw_value = response.json().get("result")
-    return json.loads(raw_value) if raw_value else []
+    return upstash_client.get_client().get_json(key, default=[])
 
 
-def load_dataset_from_upstash():
+def load_dataset_from_upstash(mode="properties"):
     """
     Loads and combines documents from all JSON values stored in Upstash Redis.
     """
-    all_documents = []
     keys = list_upstash_keys()  # Fetch all keys
+    return list(iter_dataset_from_upstash(keys, mode)), keys
 
-    for key in keys:
+
+def iter_dataset_from_upstash(keys, mode="properties"):
+    """
+    Yields one Document per row of the given Upstash keys, fetching one MGET batch at a time.
+    The Notion rows hash (connect_notion.NOTION_ROWS_KEY) is streamed with HSCAN.
+
+    mode "properties" renders rows as compact "key: value" lines with the title line in
+    metadata["title"], mode "characters" keeps the indented JSON of the properties.
+    """
+    client = upstash_client.get_client()
+    if connect_notion.NOTION_ROWS_KEY in keys:
+        for _, value in client.iter_hash(connect_notion.NOTION_ROWS_KEY):
+            yield row_document(json.loads(value), connect_notion.NOTION_ROWS_KEY, mode)
+        keys = [key for key in keys if key != connect_notion.NOTION_ROWS_KEY]
+
+    # Batched MGET instead of one GET per key
+    for key, value in client.iter_mget(keys):
         try:
-            json_data = get_upstash_json_by_key(key)['0']
-        except KeyError:
+            json_data = json.loads(value)['0']
+        except (KeyError, TypeError):
             # Skipping the key if '0' is not present (Please ensure the file is in the correct format)
             continue
 
@@ -83,18 +83,17 @@ def load_dataset_from_upstash():
             raise ValueError(f"Expected a list from key {key}, got {type(data)}")
 
         for entry in data:
-            text = json.dumps(entry['properties'], ensure_ascii=False, indent=2)
-            doc = Document(
-                page_content=text,
-                metadata={
-                    "id": entry.get("id", ""),
-                    "source_key": key
-                }
-            )
-            
-            all_documents.append(doc)
+            yield row_document(entry, key, mode)
 
-    return all_documents, keys
+
+def row_document(entry, key, mode="properties"):
+    """Document for one parsed Notion row (see connect_notion.extract_notion_rows)."""
+    metadata = {"id": entry.get("id", ""), "source_key": key}
+    if mode == "properties":
+        text, metadata["title"] = chunker.format_row(entry)
+    else:
+        text = json.dumps(entry['properties'], ensure_ascii=False, indent=2)
+    return Document(page_content=text, metadata=metadata)
 
 
 def chunk_documents(documents, chunk_size=1000, chunk_overlap_percent=20):
@@ -110,27 +109,44 @@ def chunk_documents(documents, chunk_size=1000, chunk_overlap_percent=20):
         List of chunked Document objects.
     """
     chunked_docs = []
-    # Calculate actual overlap size in characters
-    chunk_overlap = int(chunk_size * chunk_overlap_percent / 100)
-
     for doc in documents:
-        text = doc.page_content
-        start = 0
-        while start < len(text):
-            end = start + chunk_size
-            chunk = text[start:end]
-            chunked_docs.append(Document(page_content=chunk, metadata=doc.metadata))
-            # Move start pointer forward by chunk_size minus overlap (characters)
-            start += chunk_size - chunk_overlap
+        starts, ends = chunk_spans(doc.page_content, chunk_size, chunk_overlap_percent)
+        for start, end in zip(starts, ends):
+            chunked_docs.append(Document(page_content=doc.page_content[start:end], metadata=doc.metadata))
     return chunked_docs
 
+
+def chunk_spans(text, chunk_size=1000, chunk_overlap_percent=20):
+    """
+    Character spans of the chunks chunk_documents would cut from `text`.
+    Returns (starts, ends) lists, chunks are stored as these offsets instead of copies.
+    """
+    # Calculate actual overlap size in characters
+    chunk_overlap = int(chunk_size * chunk_overlap_percent / 100)
+    # Move start pointer forward by chunk_size minus overlap (characters)
+    starts = range(0, len(text), chunk_size - chunk_overlap)
+    ends = [min(start + chunk_size, len(text)) for start in starts]
+    return list(starts), ends
+
 # Define a VectorStore class using FAISS and Word2Vec based embeddings
 class VectorStore:
-    def __init__(self, index, documents, model, dim):
+    def __init__(self, index, documents, embedder, dim, version=None, lexical=None, retrieval_config=None,
+                 rerank=0, stored_vectors=None):
         self.index = index
         self.documents = documents
-        self.model = model
+        self.embedder = embedder
         self.dim = dim
+        self.version = version  # Fingerprint of the indexed content, used to invalidate caches
+        self.lexical = lexical  # BM25Index over the same chunk ids, enables hybrid retrieval
+        self.retrieval_config = retrieval_config or {}
+        # Quantized indexes: rerank * k candidates re-ranked exactly against the stored
+        # float32 vectors, given as (ascending ids, embeddings)
+        self.rerank = rerank
+        self.stored_vectors = stored_vectors or (None, None)
+        self.index_bytes = None         # FAISS index memory (heap part only when memory-mapped)
+        self.index_mapped_bytes = lambda: None  # resident pages of a memory-mapped index, read at scrape time
+        self.chunk_store_bytes = None   # chunk texts, spans and stored embeddings held in the heap
+        self.chunk_store_mapped_bytes = None  # the same, memory-mapped (quantized or shared index)
 
     def embed_text(self, doc):
         # If doc is a Document object, extract the text
@@ -139,18 +155,76 @@ class VectorStore:
         else:
             text = doc  # in case you later support raw string input
 
-        tokens = text.lower().split()
-        vectors = [self.model[word] for word in tokens if word in self.model]
-        if vectors:
-            return np.mean(vectors, axis=0)
-        else:
-            return np.zeros(self.dim)
+        if tracing.current() is not None:
+            tokens = tokenize(text)
+            found = len(self.embedder.token_ids(text))
+            tracing.annotate(query_tokens=len(tokens), query_tokens_found=found,
+                             query_tokens_missed=len(tokens) - found)
+        return self.embedder.embed_query(text)[0]
 
     def retrieve(self, query, k=10):
-        query_embedding = self.embed_text(query).astype("float32").reshape(1, self.dim)
-        distances, indices = self.index.search(query_embedding, k)
-        results = [self.documents[i] for i in indices[0] if i < len(self.documents)]
-        return results
+        if not self._hybrid():
+            return self._to_documents(self.vector_search(query, k))
+        candidates = self._candidates(k)
+        return self._hybrid_documents(query, self.vector_search(query, candidates), candidates, k)
+
+    def retrieve_batch(self, queries, k=10):
+        """
+        Documents for each of `queries` (a list per query, in order), ranked like retrieve.
+        The queries are embedded as one matrix and searched with a single FAISS call,
+        BM25 still runs per query.
+        """
+        if not queries:
+            return []
+        if not self._hybrid():
+            return [self._to_documents(ids) for ids in self.vector_search_batch(queries, k)]
+        candidates = self._candidates(k)
+        vector_ids = self.vector_search_batch(queries, candidates)
+        return [self._hybrid_documents(query, ids, candidates, k) for query, ids in zip(queries, vector_ids)]
+
+    def _hybrid(self):
+        return self.lexical is not None and len(self.lexical) and self.retrieval_config.get("mode", "hybrid") != "vector"
+
+    def _candidates(self, k):
+        return max(k, self.retrieval_config.get("candidates", 4 * k))
+
+    def _hybrid_documents(self, query, vector_ids, candidates, k):
+        # Hybrid: exact-token matches (IDs, emails, names, select values) from BM25 and
+        # semantic matches from FAISS, merged with reciprocal-rank fusion
+        with metrics.timer("bm25_search"):
+            lexical_ids, _ = self.lexical.search(query, candidates)
+        if self.retrieval_config.get("mode", "hybrid") == "lexical":
+            return self._to_documents(lexical_ids.tolist()[:k])
+        fused = reciprocal_rank_fusion(
+            [vector_ids, lexical_ids.tolist()], k=self.retrieval_config.get("rrf_k", RRF_K)
+        )
+        return self._to_documents(fused[:k])
+
+    def vector_search(self, query, k):
+        """Chunk ids of the k nearest chunks in embedding space."""
+        with metrics.timer("embed_query"):
+            query_embedding = self.embed_text(query).reshape(1, self.dim)
+        with metrics.timer("faiss_search"):
+            indices = self._search(query_embedding, k)
+        tracing.annotate(faiss_k=k, faiss_vectors=self.index.ntotal)
+        # FAISS pads missing results with -1
+        return [i for i in indices[0].tolist() if i >= 0]
+
+    def vector_search_batch(self, queries, k):
+        """vector_search for many queries: one (n, dim) embedding matrix and one FAISS search."""
+        with metrics.timer("embed_query", kind="batch"):
+            query_embeddings = self.embedder.embed_texts(list(queries))
+        with metrics.timer("faiss_search", kind="batch"):
+            indices = self._search(query_embeddings, k)
+        tracing.annotate(faiss_k=k, faiss_vectors=self.index.ntotal, faiss_queries=len(queries))
+        return [[i for i in row if i >= 0] for row in indices.tolist()]
+
+    def _search(self, query_embeddings, k):
+        return ann_index.search(self.index, query_embeddings, k, self.rerank, *self.stored_vectors)
+
+    def _to_documents(self, chunk_ids):
+        # documents maps chunk id -> Document (or ChunkView for an IndexStore)
+        return [self.documents[i] for i in chunk_ids if i in self.documents]
 
     def as_retriever(self, search_kwargs):
         k = search_kwargs.get("k", 10)
@@ -166,33 +240,40 @@ class Retriever:
     def get_relevant_documents(self, query):
         return self.vectorstore.retrieve(query, self.k)
 
+    def get_relevant_documents_batch(self, queries):
+        return self.vectorstore.retrieve_batch(queries, self.k)
+
+_embedder = None
+
+
+def load_embedder():
+    """Loads the local GloVe model (memory-mapped binary cache) once per process."""
+    global _embedder
+    if _embedder is None:
+        _embedder = glove_cache.load_glove()
+    return _embedder
+
+
 def create_vectorstore(documents):
     """
     Creates a vectorstore by embedding document chunks using a local lightweight GloVe model.
     Uses FAISS for vector similarity search.
     """
-    # Load the local GloVe model
-    model = KeyedVectors.load_word2vec_format('models/glove-wiki-gigaword-50/glove.6B.50d.word2vec.txt', binary=False)
-    dim = model.vector_size
+    embedder = load_embedder()
+    dim = embedder.dim
 
-    # Compute document embeddings
-    embeddings = []
-    for doc in documents:
-        tokens = doc.page_content.lower().split()
-        vectors = [model[word] for word in tokens if word in model]
-        if vectors:
-            emb = np.mean(vectors, axis=0)
-        else:
-            emb = np.zeros(dim)
-        embeddings.append(emb)
-
-    embeddings = np.array(embeddings).astype("float32")
+    # Compute document embeddings in batches
+    embeddings = embedder.embed_documents(documents)
 
     # Build FAISS index
     index = faiss.IndexFlatL2(dim)
     index.add(embeddings)
 
-    return VectorStore(index=index, documents=documents, model=model, dim=dim)
+    # BM25 index over the same chunk ids for hybrid retrieval
+    lexical = BM25Index.build(list(range(len(documents))), [doc.page_content for doc in documents])
+
+    return VectorStore(index=index, documents=dict(enumerate(documents)), embedder=embedder, dim=dim,
+                       lexical=lexical)
 
 
 def upload_agent_config_to_upstash(filepath="/tmp/agents/agent_config.json", key="agent_config"):
@@ -208,21 +289,87 @@ def upload_agent_config_to_upstash(filepath="/tmp/agents/agent_config.json", key
     # Convert to string format required by Upstash
     json_str = json.dumps(json_data, ensure_ascii=False)
 
-    # Prepare the request payload
-    url = f"{UPSTASH_REDIS_REST_URL}"
-    payload = ["SET", key, json_str]
-
-    response = requests.post(url, headers=HEADERS, json=payload)
-    if response.status_code != 200:
-        raise Exception(f"Failed to upload config to Upstash: {response.text}")
+    upstash_client.get_client().set(key, json_str)
     print(f"Successfully uploaded '{key}' to Upstash.")
 
 
-def initialize_system(adjusted_k=10, adjusted_chunk_size=1000):
+def vectorstore_from_store(store, embedder, retrieval_config=None):
+    """VectorStore serving the chunks, FAISS index and BM25 index of an IndexStore."""
+    vectorstore = VectorStore(index=store.index, documents=store.chunks, embedder=embedder, dim=store.dim,
+                              version=store.version(), lexical=store.lexical, retrieval_config=retrieval_config,
+                              rerank=(store.index_spec or {}).get("rerank", 0),
+                              stored_vectors=(store.ids, store.embeddings))
+    # Sizes for the /metrics gauges, measured once per (re)load rather than on every scrape
+    vectorstore.index_bytes = store.index_nbytes()
+    vectorstore.index_mapped_bytes = store.index_mapped_bytes
+    vectorstore.chunk_store_bytes = store.chunk_store_nbytes()
+    vectorstore.chunk_store_mapped_bytes = store.chunk_store_nbytes(mapped=True)
+    return vectorstore
+
+
+def row_chunk_fn(config):
+    """chunk_fn for IndexStore.sync: (Document, chunk_size) -> (starts, ends, title)."""
+    def chunk_row(doc, chunk_size):
+        if config["mode"] == "characters":
+            return (*chunk_spans(doc.page_content, chunk_size, config["overlap_percent"]), "")
+        # Titles too long to repeat cheaply are only kept in the first chunk
+        title = doc.metadata.get("title", "")
+        if len(title) > chunk_size // 4:
+            title = ""
+        starts, ends = chunker.property_spans(doc.page_content, chunk_size, title, config["overlap_percent"])
+        return starts, ends, title
+    return chunk_row
+
+
+def retriever_from_saved_store(store, adjusted_k=10, index_config=None, retrieval_config=None):
+    print(f"Loaded saved index with {len(store.chunks)} document chunks.")
+    store.apply_search_params(index_config)
+    vectorstore = vectorstore_from_store(store, load_embedder(), retrieval_config)
+    return vectorstore.as_retriever(search_kwargs={"k": adjusted_k}), list(store.sources)
+
+
+def load_saved_system(adjusted_k=10, adjusted_chunk_size=1000, index_config=None, retrieval_config=None,
+                      chunking_config=None, path=None, mmap=False):
+    """
+    Retriever over the index snapshot saved under `path` (default INDEX_DIR), without
+    contacting Notion or Upstash. Returns None when there is no snapshot or it was built with
+    another chunk size (not checked when adjusted_chunk_size is None). `mmap` serves the
+    snapshot memory-mapped and read-only.
+    """
+    store = IndexStore(path) if path else IndexStore()
+    if not store.load(mmap=mmap):
+        return None
+    if adjusted_chunk_size is not None and \
+            store.chunk_size != chunker.chunk_budget(chunker.chunking_config(chunking_config), adjusted_chunk_size):
+        return None
+    return retriever_from_saved_store(store, adjusted_k, index_config, retrieval_config)
+
+
+def initialize_system(adjusted_k=10, adjusted_chunk_size=1000, refresh=True, progress=None, index_config=None,
+                      retrieval_config=None, chunking_config=None):
     """
     Loads documents, chunks them, and creates a vector store retriever.
+
+    The index is persisted under INDEX_DIR. With refresh=False a saved snapshot is
+    served as-is, otherwise the data is re-fetched and only new, changed or deleted
+    rows are re-embedded. `progress(stage, **detail)` is told when each stage
+    (fetch, chunk, embed, index) starts. `index_config` is the "index" section of
+    rag_config selecting the FAISS index type and its tuning parameters, `retrieval_config`
+    the "retrieval" section (mode: hybrid, vector or lexical; candidates; rrf_k).
+    `chunking_config` is the "chunking" section (mode: properties or characters; max_tokens).
     """
-    connect_notion.extract_pages()
+    progress = progress or (lambda stage, **detail: None)
+    chunking = chunker.chunking_config(chunking_config)
+    chunk_size = chunker.chunk_budget(chunking, adjusted_chunk_size)
+    store = IndexStore()
+    loaded = store.load()
+
+    if loaded and not refresh and store.chunk_size == chunk_size:
+        return retriever_from_saved_store(store, adjusted_k, index_config, retrieval_config)
+
+    progress("fetch")
+    with metrics.timer("notion_fetch"):
+        connect_notion.extract_pages()
 
     data_folder = os.path.join(os.getcwd(), "data")
     json_files = [
@@ -235,19 +382,32 @@ def initialize_system(adjusted_k=10, adjusted_chunk_size=1000):
         print("No JSON files found in local 'data' directory... fetching from upstash")
 
     print("=== Loading Datasets ===")
-    documents, keys = load_dataset_from_upstash()
-    print(f"Loaded {len(documents)} documents.")
-
-    if not documents and not json_files:
+    print(f"\nUsing k={adjusted_k}, chunk_size={chunk_size}, chunking={chunking['mode']}.")
+    print("\n=== Syncing Vectorstore ===")
+    keys = list_upstash_keys()
+    embedder = load_embedder()
+    # Rows are streamed from Upstash straight into the chunk store, the corpus is never held as a list
+    stats = store.sync(
+        metrics.timed_iter(iter_dataset_from_upstash(keys, chunking["mode"]), "upstash_load"),
+        chunk_size=chunk_size,
+        dim=embedder.dim,
+        chunk_fn=row_chunk_fn(chunking),
+        embed_fn=embedder.embed_documents,
+        progress=progress,
+        index_config=index_config,
+    )
+    print(f"Loaded {stats['added'] + stats['unchanged']} documents.")
+
+    if not stats["added"] + stats["unchanged"] and not json_files:
         raise RuntimeError("No data found. Please ensure data is available in the database.")
 
-    print(f"\nUsing k={adjusted_k}, chunk_size={adjusted_chunk_size}.")
-    print("\n=== Chunking Documents ===")
-    chunked_docs = chunk_documents(documents, chunk_size=adjusted_chunk_size)
-    print(f"Created {len(chunked_docs)} document chunks.")
+    store.sources = list(keys)
+    with metrics.timer("save"):
+        store.save()
+    print(f"Rows added: {stats['added']}, removed: {stats['removed']}, unchanged: {stats['unchanged']}.")
+    print(f"Index holds {len(store.chunks)} document chunks.")
 
-    print("\n=== Creating Vectorstore ===")
-    vectorstore = create_vectorstore(chunked_docs)
+    vectorstore = vectorstore_from_store(store, embedder, retrieval_config)
     retriever = vectorstore.as_retriever(search_kwargs={"k": adjusted_k})
     print("Vectorstore created and documents indexed.")
 
@@ -0,0 +1,105 @@
+import faiss
+import numpy as np
+import pytest
+
+from src import ann_index
+
+DIM = 16
+
+
+def make_data(n=2000, dim=DIM):
+    """Clustered vectors with ascending, non-contiguous ids, as IndexStore leaves them after deletes."""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(20, dim))
+    embeddings = centers[rng.integers(0, 20, size=n)] + 0.3 * rng.normal(size=(n, dim))
+    return embeddings.astype("float32"), np.arange(n, dtype="int64") * 3 + 1
+
+
+def test_resolve_spec_falls_back_on_small_corpora():
+    assert ann_index.resolve_spec({"type": "ivf_flat"}, 50, DIM)["type"] == "flat"
+    spec = ann_index.resolve_spec({"type": "ivf_flat"}, 4000, DIM)
+    assert spec["type"] == "ivf_flat" and spec["nlist"] == 4000 // ann_index.TRAIN_POINTS_PER_LIST
+    # Too few vectors for 2^8 PQ centroids
+    spec = ann_index.resolve_spec({"type": "flat", "quantizer": "pq"}, 100, DIM)
+    assert spec["quantizer"] == "sq8" and "pq_m" not in spec
+    spec = ann_index.resolve_spec({"type": "ivf_pq"}, 200, DIM)
+    assert spec["type"] == "ivf_flat" and spec["quantizer"] == "sq8"
+
+    assert ann_index.resolve_spec({}, 10, DIM)["type"] == "flat"
+    assert ann_index.resolve_spec({}, ann_index.AUTO_IVF_FLAT_MIN, DIM)["type"] == "ivf_flat"
+    # PQ codes re-rank by default, the other storages do not
+    assert ann_index.resolve_spec({"type": "ivf_pq"}, 20000, DIM)["rerank"] == ann_index.PQ_RERANK_FACTOR
+    assert ann_index.resolve_spec({"quantizer": "sq8"}, 100, DIM)["rerank"] == 0
+    assert ann_index.resolve_spec({"rerank": 4}, 100, DIM)["rerank"] == 0
+    with pytest.raises(ValueError):
+        ann_index.resolve_spec({"type": "lsh"}, 100, DIM)
+    with pytest.raises(ValueError):
+        ann_index.resolve_spec({"type": "flat", "quantizer": "pq", "pq_m": 5}, 1000, DIM)
+
+
+def test_flat_search_is_exact():
+    embeddings, ids = make_data(500)
+    spec = ann_index.resolve_spec({"type": "flat"}, len(ids), DIM)
+    index = ann_index.build_index(spec, embeddings, ids)
+    found = ann_index.search(index, embeddings[:50], 1)
+    assert found[:, 0].tolist() == ids[:50].tolist()
+    assert ann_index.measure_recall(index, embeddings, ids)[0] == 1.0
+    # Fewer vectors than k pads with -1
+    small = ann_index.build_index(spec, embeddings[:3], ids[:3])
+    assert ann_index.search(small, embeddings[:1], 5)[0, 3:].tolist() == [-1, -1]
+
+
+@pytest.mark.parametrize("config", [
+    {"type": "flat", "quantizer": "pq", "pq_m": 8, "pq_nbits": 6},
+    {"type": "flat", "quantizer": "sq8", "rerank": 4},
+    {"type": "hnsw", "quantizer": "sq8", "rerank": 4},
+    {"type": "ivf_pq", "pq_m": 4, "pq_nbits": 6, "nprobe": 8},
+])
+def test_rerank_recovers_recall_of_quantized_indexes(config):
+    embeddings, ids = make_data()
+    spec = ann_index.resolve_spec(config, len(ids), DIM)
+    assert spec["rerank"] == 4 and spec["quantizer"] != "none"
+    index = ann_index.build_index(spec, embeddings, ids)
+    assert index.ntotal == len(ids)
+
+    plain, _ = ann_index.measure_recall(index, embeddings, ids)
+    reranked, _ = ann_index.measure_recall(index, embeddings, ids, rerank=spec["rerank"])
+    assert reranked >= plain
+    assert reranked > 0.9
+
+    found = ann_index.search(index, embeddings[:20], 5, spec["rerank"], ids, embeddings)
+    # Re-ranked results are ordered by exact distance and map back to the stored rows
+    rows = np.searchsorted(ids, found)
+    assert np.array_equal(ids[rows], found)
+    distances = ((embeddings[rows] - embeddings[:20, None, :]) ** 2).sum(axis=2)
+    assert np.all(np.diff(distances, axis=1) >= 0)
+
+
+def test_rerank_skips_padding():
+    embeddings, ids = make_data(300)
+    spec = ann_index.resolve_spec({"type": "flat", "quantizer": "sq8", "rerank": 4}, len(ids), DIM)
+    index = ann_index.build_index(spec, embeddings[:3], ids[:3])
+    found = ann_index.search(index, embeddings[:2], 5, 4, ids[:3], embeddings[:3])
+    assert found[:, 3:].tolist() == [[-1, -1], [-1, -1]]
+    assert sorted(found[0, :3].tolist()) == ids[:3].tolist()
+
+
+@pytest.mark.parametrize("config", [
+    {"type": "flat", "quantizer": "sq_fp16"},
+    {"type": "hnsw"},
+    {"type": "ivf_flat", "nprobe": 4},
+    {"type": "ivf_pq", "pq_m": 4, "pq_nbits": 6},
+])
+def test_read_index_memory_mapped(tmp_path, config):
+    embeddings, ids = make_data()
+    spec = ann_index.resolve_spec(config, len(ids), DIM)
+    index = ann_index.build_index(spec, embeddings, ids)
+    path = str(tmp_path / "index.faiss")
+    faiss.write_index(index, path)
+
+    expected = ann_index.search(index, embeddings[:30], 5)
+    for mmap in (False, True):
+        loaded = ann_index.read_index(path, spec, mmap=mmap)
+        ann_index.apply_search_params(loaded, spec)
+        assert loaded.ntotal == len(ids)
+        np.testing.assert_array_equal(ann_index.search(loaded, embeddings[:30], 5), expected)
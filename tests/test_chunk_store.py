@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from src.chunk_store import ChunkStore, PackedTexts
+
+ROWS = [
+    ("row-a", "notion_rows", "Name: Alpha\nNotes: first row of the table", "Name: Alpha"),
+    ("row-b", "notion_rows", "Name: Beta\nNotes: ünïcode text, 👍 and more", "Name: Beta"),
+    ("row-c", "local_file", "plain text without a title", ""),
+]
+
+
+def make_store():
+    """Three parents cut into chunks at fixed offsets, chunk ids 0..5."""
+    store = ChunkStore()
+    parents, starts, ends = [], [], []
+    for row_id, source, text, title in ROWS:
+        parent = store.add_parent(text, {"id": row_id, "source_key": source}, title=title)
+        middle = len(text) // 2
+        parents += [parent, parent]
+        starts += [0, middle]
+        ends += [middle, len(text)]
+    store.add_chunks(range(6), parents, starts, ends)
+    return store
+
+
+def contents(store):
+    return {chunk.chunk_id: (chunk.page_content, chunk.metadata) for chunk in store.values()}
+
+
+def test_views_slice_the_parent_text():
+    store = make_store()
+    assert len(store) == 6
+    text, title = ROWS[0][2], ROWS[0][3]
+    middle = len(text) // 2
+    first, second = store[0], store[1]
+    assert first.page_content == text[:middle]
+    # Later chunks repeat the row title
+    assert second.page_content == f"{title}\n{text[middle:]}"
+    assert store[5].page_content == ROWS[2][2][len(ROWS[2][2]) // 2:]
+    assert second.metadata == {"id": "row-a", "source_key": "notion_rows"}
+    assert store.sources == ["notion_rows", "local_file"]
+    assert 5 in store and 6 not in store
+    assert store.get(6) is None
+    with pytest.raises(KeyError):
+        store[6]
+    assert [view.chunk_id for view in store.views([4, 1])] == [4, 1]
+
+
+def test_remove_and_compact_keep_the_other_chunks():
+    store = make_store()
+    before = contents(store)
+    removed = store.remove_parents([1])
+    assert removed.tolist() == [2, 3]
+    assert 2 not in store
+    assert store.ids.tolist() == [0, 1, 4, 5]
+
+    remap = store.compact()
+    assert remap == {0: 0, 2: 1}
+    assert contents(store) == {key: value for key, value in before.items() if key not in (2, 3)}
+
+
+def test_save_and_load(tmp_path):
+    store = make_store()
+    store.remove_parents([0])
+    store.save(str(tmp_path))
+    expected = contents(store)
+
+    loaded = ChunkStore.load(str(tmp_path))
+    assert contents(loaded) == expected
+    assert loaded.parent_texts[0] is None
+    assert not isinstance(loaded.ids, np.memmap)
+
+    mapped = ChunkStore.load(str(tmp_path), mmap=True)
+    assert contents(mapped) == expected
+    assert isinstance(mapped.parent_texts, PackedTexts)
+    assert mapped.parent_texts[0] is None
+    assert isinstance(mapped.ids, np.memmap)
+
+
+def test_nbytes_splits_heap_and_mapped(tmp_path):
+    store = make_store()
+    heap = store.nbytes()
+    assert heap > 0 and store.nbytes(mapped=True) == 0
+
+    store.save(str(tmp_path))
+    mapped = ChunkStore.load(str(tmp_path), mmap=True)
+    assert mapped.nbytes() == 0
+    text_bytes = sum(len(row[2].encode("utf-8")) for row in ROWS)
+    arrays = sum(getattr(store, name).nbytes for name in ("ids", "parents", "starts", "ends"))
+    assert mapped.nbytes(mapped=True) == text_bytes + arrays
@@ -0,0 +1,105 @@
+import pytest
+
+from src import chunker
+from src.chunk_store import ChunkStore
+
+ROW = {
+    "id": "row-1",
+    "title_property": "Name",
+    "properties": {
+        "Status": "Done",
+        "Name": "Quarterly planning",
+        "Tags": ["roadmap", "q3"],
+        "Empty": "",
+        "Due": {"start": "2024-07-01", "end": None, "time_zone": None},
+        "Notes": " ".join(f"word{i}" for i in range(120)),
+        "Owner": "Ada",
+    },
+}
+
+
+def chunk_texts(text, title, chunk_size, overlap_percent=20):
+    """Chunk texts as the index reads them, with the title repeated on later chunks."""
+    starts, ends = chunker.property_spans(text, chunk_size, title, overlap_percent)
+    store = ChunkStore()
+    parent = store.add_parent(text, {"id": "row-1"}, title=title)
+    return starts, ends, [store.chunk_text(parent, start, end) for start, end in zip(starts, ends)]
+
+
+def test_format_row_puts_title_first_and_skips_empty_values():
+    text, title = chunker.format_row(ROW)
+    lines = text.split("\n")
+    assert title == "Name: Quarterly planning"
+    assert lines[:4] == [title, "Status: Done", "Tags: roadmap, q3", "Due: 2024-07-01"]
+    assert not any(line.startswith("Empty") for line in lines)
+
+
+@pytest.mark.parametrize("chunk_size", [60, 100, 250, 2000])
+def test_chunks_stay_within_budget(chunk_size):
+    text, title = chunker.format_row(ROW)
+    _, _, texts = chunk_texts(text, title, chunk_size)
+    assert all(len(chunk) <= chunk_size for chunk in texts)
+
+
+@pytest.mark.parametrize("chunk_size", [60, 100, 250, 2000])
+def test_spans_cover_the_row_text(chunk_size):
+    text, title = chunker.format_row(ROW)
+    starts, ends, _ = chunk_texts(text, title, chunk_size)
+    covered = set()
+    for start, end in zip(starts, ends):
+        assert 0 <= start < end <= len(text)
+        covered.update(range(start, end))
+    # Only the newlines between lines that went to different chunks are left out
+    assert all(text[i] == "\n" for i in set(range(len(text))) - covered)
+    assert starts == sorted(starts)
+
+
+def test_short_properties_are_never_split():
+    text, title = chunker.format_row(ROW)
+    starts, ends, _ = chunk_texts(text, title, 100)
+    for line in text.split("\n"):
+        if len(line) <= 100 - len(title) - 1:
+            begin = text.index(line)
+            assert any(start <= begin and begin + len(line) <= end for start, end in zip(starts, ends))
+
+
+def test_oversized_property_is_split_with_overlap_and_title():
+    title = "Name: Quarterly planning"
+    notes = "Notes: " + "".join(chr(ord("a") + i % 26) for i in range(400))
+    text = f"{title}\nStatus: Done\n{notes}\nOwner: Ada"
+    chunk_size, overlap_percent = 120, 25
+    starts, ends, texts = chunk_texts(text, title, chunk_size, overlap_percent)
+
+    notes_start = text.index(notes)
+    pieces = [(start, end) for start, end in zip(starts, ends) if start >= notes_start and end <= notes_start + len(notes)]
+    assert len(pieces) >= 3
+    budget = chunk_size - len(title) - 1
+    step = budget - int(budget * overlap_percent / 100)
+    for (start, end), (next_start, _) in zip(pieces, pieces[1:]):
+        assert next_start - start == step
+        assert end - next_start == budget - step  # overlapping characters
+
+    # Every chunk after the first reads as the title plus its span
+    assert texts[0].startswith(title)
+    for start, end, chunk in zip(starts[1:], ends[1:], texts[1:]):
+        assert chunk == f"{title}\n{text[start:end]}"
+    # The properties after the split one join its last piece
+    assert texts[-1].endswith("Owner: Ada")
+
+
+def test_oversized_first_property_starts_in_the_title_chunk():
+    title = "Name: Foo"
+    text = f"{title}\nBody: " + "x" * 250 + "\nTag: a"
+    starts, ends, texts = chunk_texts(text, title, 100)
+    assert starts[0] == 0
+    assert texts[0].startswith(f"{title}\nBody: x")
+    assert all(chunk.strip() != title for chunk in texts)
+    assert all(len(chunk) <= 100 for chunk in texts)
+
+
+def test_chunk_budget_from_max_tokens():
+    config = chunker.chunking_config({"max_tokens": 64})
+    assert chunker.chunk_budget(config, 1000) == 64 * chunker.CHARS_PER_TOKEN
+    assert chunker.chunk_budget(chunker.chunking_config({"mode": "characters", "max_tokens": 64}), 1000) == 1000
+    with pytest.raises(ValueError):
+        chunker.chunking_config({"mode": "sentences"})
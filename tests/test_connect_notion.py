@@ -0,0 +1,147 @@
+import os
+import json
+import time
+
+import pytest
+
+# connect_notion checks for credentials at import time, the tests only talk to the local fakes
+for _name in ("NOTION_TOKEN", "DATABASE_ID", "UPSTASH_REDIS_REST_URL", "UPSTASH_REDIS_REST_TOKEN"):
+    os.environ.setdefault(_name, "test")
+
+from benchmarks.fakes import FakeNotion, FakeUpstash  # noqa: E402
+from src import connect_notion, upstash_client  # noqa: E402
+
+
+def make_page(i, edited):
+    return {
+        "id": f"page-{i:04d}",
+        "last_edited_time": edited,
+        "properties": {
+            "Name": {"type": "title", "title": [{"plain_text": f"Row {i}"}]},
+            "Notes": {"type": "rich_text", "rich_text": [{"plain_text": f"notes of row {i}"}]},
+        },
+    }
+
+
+def make_pages(count, day=1):
+    # Notion returns the pages sorted by last_edited_time ascending
+    return [make_page(i, f"2024-01-{day:02d}T00:{i // 60:02d}:{i % 60:02d}.000Z") for i in range(count)]
+
+
+@pytest.fixture
+def services(monkeypatch, tmp_path):
+    notion = FakeNotion([]).start()
+    upstash = FakeUpstash().start()
+    monkeypatch.setattr(connect_notion, "NOTION_API_URL", notion.url)
+    monkeypatch.setattr(upstash_client, "_client", upstash_client.UpstashClient(upstash.url, "test"))
+    # extract_pages drops the Notion credentials from the environment when it is done
+    monkeypatch.setenv("NOTION_TOKEN", "test")
+    monkeypatch.setenv("DATABASE_ID", "test")
+    # and uploads the JSON files of ./data, none here
+    (tmp_path / "data").mkdir()
+    monkeypatch.chdir(tmp_path)
+    yield notion, upstash
+    notion.stop()
+    upstash.stop()
+
+
+def saved_rows(upstash):
+    return {row_id: json.loads(value) for row_id, value in upstash.data.get(connect_notion.NOTION_ROWS_KEY, {}).items()}
+
+
+def sync_state(upstash):
+    return json.loads(json.loads(upstash.data[connect_notion.SYNC_STATE_KEY])["0"])
+
+
+def test_full_sync_follows_pagination(services):
+    notion, upstash = services
+    notion.pages = make_pages(250)
+    connect_notion.extract_pages()
+
+    assert len(notion.queries) == 3
+    assert [query.get("start_cursor") for query in notion.queries] == [None, "100", "200"]
+    assert all("filter" not in query for query in notion.queries)
+    rows = saved_rows(upstash)
+    assert len(rows) == 250
+    assert rows["page-0007"]["properties"] == {"Name": "Row 7", "Notes": "notes of row 7"}
+    state = sync_state(upstash)
+    assert state["high_water_mark"] == notion.pages[-1]["last_edited_time"]
+    assert "last_full_sync" in state
+
+
+def test_incremental_sync_fetches_rows_edited_since_high_water_mark(services):
+    notion, upstash = services
+    notion.pages = make_pages(120)
+    connect_notion.extract_pages()
+    high_water_mark = sync_state(upstash)["high_water_mark"]
+
+    edited = make_page(5, "2024-01-02T00:00:00.000Z")
+    edited["properties"]["Notes"]["rich_text"][0]["plain_text"] = "edited"
+    added = make_page(500, "2024-01-02T00:00:01.000Z")
+    notion.pages = [page for page in notion.pages if page["id"] != edited["id"]] + [edited, added]
+    notion.queries.clear()
+    connect_notion.extract_pages()
+
+    assert len(notion.queries) == 1
+    assert notion.queries[0]["filter"]["last_edited_time"] == {"on_or_after": high_water_mark}
+    rows = saved_rows(upstash)
+    assert len(rows) == 121
+    assert rows["page-0005"]["properties"]["Notes"] == "edited"
+    assert sync_state(upstash)["high_water_mark"] == added["last_edited_time"]
+
+
+def test_missing_rows_force_a_full_sync(services):
+    notion, upstash = services
+    notion.pages = make_pages(30)
+    connect_notion.extract_pages()
+
+    del upstash.data[connect_notion.NOTION_ROWS_KEY]
+    notion.queries.clear()
+    connect_notion.extract_pages()
+
+    assert "filter" not in notion.queries[0]
+    assert len(saved_rows(upstash)) == 30
+
+
+def test_full_sync_removes_deleted_pages(services):
+    notion, upstash = services
+    notion.pages = make_pages(30)
+    upstash.data[connect_notion.LEGACY_ROWS_KEY] = json.dumps({"0": "[]"})
+    connect_notion.extract_pages()
+    assert connect_notion.LEGACY_ROWS_KEY not in upstash.data
+
+    notion.pages = [page for page in notion.pages if page["id"] not in ("page-0003", "page-0017")]
+    # An incremental sync cannot notice deletions
+    connect_notion.extract_pages()
+    assert len(saved_rows(upstash)) == 30
+
+    connect_notion.extract_pages(full_sync=True)
+    rows = saved_rows(upstash)
+    assert len(rows) == 28
+    assert "page-0003" not in rows and "page-0017" not in rows
+
+
+def test_full_sync_cut_short_by_num_pages_keeps_rows(services):
+    notion, upstash = services
+    notion.pages = make_pages(30)
+    connect_notion.extract_pages()
+    last_full_sync = sync_state(upstash)["last_full_sync"]
+
+    connect_notion.extract_pages(num_pages=10, full_sync=True)
+
+    assert len(saved_rows(upstash)) == 30
+    assert sync_state(upstash)["last_full_sync"] == last_full_sync
+
+
+def test_rate_limited_query_is_retried_after_retry_after(services):
+    notion, upstash = services
+    notion.pages = make_pages(10)
+    notion.throttle = 1
+    notion.retry_after = "0.3"
+
+    started = time.perf_counter()
+    connect_notion.extract_pages()
+
+    assert time.perf_counter() - started >= 0.3
+    assert notion.requests == 2
+    assert len(saved_rows(upstash)) == 10
@@ -0,0 +1,29 @@
+from src import context_builder
+
+
+class Doc:
+    def __init__(self, page_content, metadata):
+        self.page_content = page_content
+        self.metadata = metadata
+
+
+def test_row_sources_lists_each_row_once_in_rank_order():
+    docs = [
+        Doc("b1", {"id": "row-b", "source_key": "notion_rows"}),
+        Doc("a1", {"id": "row-a", "source_key": "notion_rows"}),
+        Doc("b2", {"id": "row-b", "source_key": "notion_rows"}),
+        Doc("file", {"source_key": "local_file"}),
+        Doc("file 2", {"source_key": "local_file"}),
+        # The same id from another source is another row
+        Doc("b3", {"id": "row-b", "source_key": "local_file"}),
+        Doc("a2", {"id": "row-a", "source_key": "notion_rows"}),
+    ]
+    sources = context_builder.row_sources(docs)
+    assert [(source.get("id"), source["source_key"]) for source in sources] == [
+        ("row-b", "notion_rows"),
+        ("row-a", "notion_rows"),
+        (None, "local_file"),
+        (None, "local_file"),
+        ("row-b", "local_file"),
+    ]
+    assert context_builder.row_sources([]) == []
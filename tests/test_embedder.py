@@ -0,0 +1,60 @@
+import numpy as np
+
+from src.embedder import Embedder, tokenize
+
+WORDS = ["notion", "roadmap", "q3", "co-op", "3.5", "owner", "planning"]
+
+
+def make_embedder(dim=8):
+    vectors = np.random.default_rng(0).normal(size=(len(WORDS), dim)).astype("float32")
+    return Embedder({word: i for i, word in enumerate(WORDS)}, vectors)
+
+
+def reference_embedding(embedder, text):
+    """Mean of the known token vectors, one text at a time."""
+    ids = embedder.token_ids(text)
+    if not ids:
+        return np.zeros(embedder.dim, dtype="float32")
+    return embedder.vectors[ids].mean(axis=0)
+
+
+def test_tokenize_drops_json_punctuation_and_keeps_inner_marks():
+    assert tokenize('{"Name": "Co-op Roadmap", "Score": 3.5}') == ["name", "co-op", "roadmap", "score", "3.5"]
+    assert tokenize("owner's q3_planning") == ["owner's", "q3", "planning"]
+
+
+def test_embed_texts_matches_the_per_text_mean():
+    embedder = make_embedder()
+    texts = [
+        "Notion roadmap for Q3",
+        "nothing known here",
+        "",
+        '{"owner": "planning", "rate": 3.5}',
+        "roadmap roadmap notion",  # repeated tokens weigh more
+        "co-op owner",
+    ]
+    embeddings = embedder.embed_texts(texts)
+    assert embeddings.shape == (len(texts), embedder.dim)
+    assert embeddings.dtype == np.float32
+    expected = np.stack([reference_embedding(embedder, text) for text in texts])
+    np.testing.assert_allclose(embeddings, expected, rtol=1e-5, atol=1e-6)
+    assert not embeddings[1].any() and not embeddings[2].any()
+
+
+def test_batches_give_the_same_embeddings():
+    embedder = make_embedder()
+    texts = [" ".join(WORDS[i % len(WORDS):]) or "unknown" for i in range(23)]
+    np.testing.assert_allclose(embedder.embed_texts(texts, batch_size=4), embedder.embed_texts(texts),
+                               rtol=1e-6)
+
+
+def test_embed_query_and_documents():
+    embedder = make_embedder()
+
+    class Doc:
+        def __init__(self, page_content):
+            self.page_content = page_content
+
+    query = embedder.embed_query("roadmap owner")
+    assert query.shape == (1, embedder.dim)
+    np.testing.assert_allclose(embedder.embed_documents([Doc("roadmap owner")]), query)
@@ -0,0 +1,132 @@
+import numpy as np
+import pytest
+
+from src import ann_index
+from src.embedder import Embedder
+from src.index_store import IndexStore
+
+DIM = 16
+CHUNK_SIZE = 40
+VOCABULARY = [f"w{i}" for i in range(300)]
+
+
+class Doc:
+    def __init__(self, page_content, metadata):
+        self.page_content = page_content
+        self.metadata = metadata
+
+
+def make_embedder():
+    vectors = np.random.default_rng(0).normal(size=(len(VOCABULARY), DIM)).astype("float32")
+    return Embedder({word: i for i, word in enumerate(VOCABULARY)}, vectors)
+
+
+EMBEDDER = make_embedder()
+
+
+def make_row(i, seed=0):
+    words = np.random.default_rng(1000 * seed + i).choice(VOCABULARY, size=25)
+    return Doc(" ".join(words), {"id": f"row-{i}", "source_key": "notion_rows"})
+
+
+def fixed_spans(doc, chunk_size):
+    starts = list(range(0, len(doc.page_content), chunk_size))
+    return starts, [min(start + chunk_size, len(doc.page_content)) for start in starts], ""
+
+
+def sync(store, docs, index_config=None):
+    return store.sync(iter(docs), CHUNK_SIZE, DIM, fixed_spans, EMBEDDER.embed_documents,
+                      index_config=index_config or {"type": "flat", "recall_check": False})
+
+
+def search_texts(store, queries, k=5):
+    """Chunk texts of the k nearest chunks per query, the ids differ between stores."""
+    found = ann_index.search(store.index, queries, k)
+    return [[store.chunks[int(chunk_id)].page_content for chunk_id in row if chunk_id >= 0] for row in found]
+
+
+def queries():
+    return EMBEDDER.embed_texts([make_row(i, seed=9).page_content for i in range(20)])
+
+
+def final_rows():
+    """Rows 0..39, of which 5..9 are gone, 10..14 were edited and 40..44 are new."""
+    kept = [i for i in range(45) if not 5 <= i < 10]
+    return [make_row(i, seed=1 if 10 <= i < 15 else 0) for i in kept]
+
+
+def test_incremental_sync_matches_a_full_rebuild(tmp_path):
+    store = IndexStore(str(tmp_path / "incremental"))
+    stats = sync(store, [make_row(i) for i in range(40)])
+    assert stats == {"added": 40, "removed": 0, "unchanged": 0, "rebuilt": True}
+
+    stats = sync(store, final_rows())
+    # An edited row is dropped and added again
+    assert stats["added"] == 10 and stats["removed"] == 10 and stats["unchanged"] == 30
+
+    fresh = IndexStore(str(tmp_path / "fresh"))
+    sync(fresh, final_rows())
+    assert search_texts(store, queries()) == search_texts(fresh, queries())
+    assert sorted(chunk.page_content for chunk in store.chunks.values()) == \
+        sorted(chunk.page_content for chunk in fresh.chunks.values())
+    assert store.version() == fresh.version()
+
+    # A second sync with the same rows changes nothing
+    assert sync(store, final_rows())["added"] == 0
+
+
+def test_ids_stay_ascending_and_aligned_after_deletes(tmp_path):
+    store = IndexStore(str(tmp_path))
+    sync(store, [make_row(i) for i in range(40)])
+    sync(store, final_rows())
+    assert np.all(np.diff(store.ids) > 0)
+    assert len(store.ids) == len(store.chunks) == store.index.ntotal == len(store.embeddings)
+    # Stored embeddings line up with the ids, which ann_index.search's re-ranking relies on
+    texts = [store.chunks[int(chunk_id)].page_content for chunk_id in store.ids]
+    np.testing.assert_allclose(store.embeddings, EMBEDDER.embed_texts(texts), rtol=1e-6)
+    exact = ann_index.search(store.index, queries(), 5)
+    reranked = ann_index.search(store.index, queries(), 5, rerank=4, ids=store.ids, embeddings=store.embeddings)
+    np.testing.assert_array_equal(reranked, exact)
+
+
+def test_save_and_load_memory_mapped(tmp_path):
+    store = IndexStore(str(tmp_path))
+    sync(store, [make_row(i) for i in range(40)])
+    sync(store, final_rows())
+    store.save()
+    expected = search_texts(store, queries())
+
+    mapped = IndexStore(str(tmp_path))
+    assert mapped.load(mmap=True)
+    assert mapped.read_only
+    assert isinstance(mapped.embeddings, np.memmap)
+    assert search_texts(mapped, queries()) == expected
+    assert mapped.version() == store.version()
+    with pytest.raises(RuntimeError):
+        sync(mapped, final_rows())
+    with pytest.raises(RuntimeError):
+        mapped.save()
+
+    loaded = IndexStore(str(tmp_path))
+    assert loaded.load()
+    assert search_texts(loaded, queries()) == expected
+    assert sync(loaded, final_rows())["added"] == 0
+
+
+def test_deletes_rebuild_an_hnsw_index(tmp_path):
+    store = IndexStore(str(tmp_path))
+    config = {"type": "hnsw", "recall_check": False}
+    sync(store, [make_row(i) for i in range(40)], config)
+    assert not sync(store, [make_row(i) for i in range(45)], config)["rebuilt"]
+    stats = sync(store, final_rows(), config)
+    assert stats["rebuilt"]
+    assert store.index.ntotal == len(store.ids)
+
+
+def test_chunk_size_change_rebuilds_from_scratch(tmp_path):
+    store = IndexStore(str(tmp_path))
+    sync(store, [make_row(i) for i in range(10)])
+    stats = store.sync(iter([make_row(i) for i in range(10)]), CHUNK_SIZE * 2, DIM, fixed_spans,
+                       EMBEDDER.embed_documents, index_config={"type": "flat", "recall_check": False})
+    assert stats["added"] == 10 and stats["unchanged"] == 0
+    assert store.chunk_size == CHUNK_SIZE * 2
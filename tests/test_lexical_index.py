@@ -0,0 +1,72 @@
+import numpy as np
+
+from src.lexical_index import BM25Index, reciprocal_rank_fusion
+
+TEXTS = {
+    10: "Name: Quarterly roadmap\nStatus: planning",
+    11: "Name: Hiring plan\nNotes: interview loop for the platform team",
+    12: "Name: Offsite\nNotes: venue, travel and agenda for the offsite",
+    13: "Name: Roadmap review\nNotes: roadmap roadmap review with the platform team",
+    14: "Name: Budget\nNotes: travel budget per team",
+}
+
+
+def build(texts=TEXTS):
+    return BM25Index.build(list(texts), list(texts.values()))
+
+
+def ranked(index, query, k=10):
+    ids, scores = index.search(query, k)
+    assert list(scores) == sorted(scores, reverse=True)
+    return ids.tolist()
+
+
+def test_search_ranks_by_bm25():
+    index = build()
+    assert len(index) == len(TEXTS)
+    # More occurrences of the term rank higher
+    assert ranked(index, "roadmap") == [13, 10]
+    # A rare term outweighs a common one
+    assert ranked(index, "offsite team")[0] == 12
+    assert ranked(index, "team", k=2) == ranked(index, "team")[:2]
+    assert ranked(index, "unknown words") == []
+    assert ranked(BM25Index.build([], []), "roadmap") == []
+
+
+def test_incremental_changes_match_a_fresh_build():
+    index = build({key: TEXTS[key] for key in (10, 11, 12)})
+    index.add([13, 14], [TEXTS[13], TEXTS[14]])
+    index.remove([11])
+    index.add([15], ["Name: Platform sync\nNotes: platform team weekly"])
+    index.finalize()
+
+    remaining = {key: text for key, text in TEXTS.items() if key != 11}
+    remaining[15] = "Name: Platform sync\nNotes: platform team weekly"
+    fresh = build(remaining)
+    for query in ("roadmap", "platform team", "travel", "interview"):
+        ids, scores = index.search(query)
+        fresh_ids, fresh_scores = fresh.search(query)
+        assert ids.tolist() == fresh_ids.tolist()
+        np.testing.assert_allclose(scores, fresh_scores, rtol=1e-6)
+    assert index.search("interview")[0].size == 0
+
+
+def test_save_and_load_memory_mapped(tmp_path):
+    index = build()
+    index.save(str(tmp_path))
+    for mmap in (False, True):
+        loaded = BM25Index.load(str(tmp_path), mmap=mmap)
+        assert isinstance(loaded.chunk_ids, np.memmap) == mmap
+        for query in ("roadmap", "platform team", "travel budget"):
+            assert ranked(loaded, query) == ranked(index, query)
+
+
+def test_reciprocal_rank_fusion():
+    # Found by both retrievers beats first place in only one of them
+    assert reciprocal_rank_fusion([[1, 2, 3], [4, 2, 5]]) == [2, 1, 4, 3, 5]
+    assert reciprocal_rank_fusion([[1, 2], []]) == [1, 2]
+    assert reciprocal_rank_fusion([]) == []
+    # Second in both lists: 1/3 + 1/3 beats 1/2 for first place in one
+    assert reciprocal_rank_fusion([[7, 8], [9, 8]], k=1)[0] == 8
+    # With k=0 first places (1) beat being found twice lower down (1/2 + 1/3)
+    assert reciprocal_rank_fusion([[7, 8, 9], [6, 10, 8]], k=0)[:2] == [7, 6]
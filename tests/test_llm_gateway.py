@@ -0,0 +1,167 @@
+import time
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from benchmarks.fakes import FakeMistral
+from src.llm_gateway import LLMGateway
+
+MESSAGES = [{"role": "user", "content": "What is in the workspace?"}]
+
+
+class ScriptedMistral(FakeMistral):
+    """FakeMistral answering the first requests with the scripted (status, headers) errors."""
+
+    def __init__(self, errors=(), **kwargs):
+        super().__init__(answer_words=5, **kwargs)
+        self.errors = list(errors)
+        self.inflight = 0
+        self.peak_inflight = 0
+
+    def delay(self):
+        with self._lock:
+            self.inflight += 1
+            self.peak_inflight = max(self.peak_inflight, self.inflight)
+        try:
+            super().delay()
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+    def handle(self, handler, path, body):
+        with self._lock:
+            error = self.errors.pop(0) if self.errors else None
+        if error is None:
+            return super().handle(handler, path, body)
+        status, headers = error
+        data = b'{"message": "scripted error"}'
+        handler.send_response(status)
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def start(**kwargs):
+        servers.append(ScriptedMistral(**kwargs).start())
+        return servers[-1]
+
+    yield start
+    for fake in servers:
+        fake.stop()
+
+
+def gateway(fake, **kwargs):
+    kwargs = {"backoff": 0.0, "max_retries": 2, "timeout": 5, **kwargs}
+    return LLMGateway("test-key", server_url=fake.url, **kwargs)
+
+
+async def collect(stream):
+    return "".join([delta async for delta in stream])
+
+
+def test_complete_honours_retry_after(server):
+    fake = server(errors=[(429, {"Retry-After": "0.3"})])
+    llm = gateway(fake)
+    started = time.perf_counter()
+    answer = llm.complete(MESSAGES)
+    assert answer.startswith("Synthetic answer to:")
+    assert time.perf_counter() - started >= 0.3
+    assert fake.requests == 2
+    assert llm.metrics == {"requests": 1, "retries": 1, "errors": 0}
+
+
+def test_complete_async_retries_429(server):
+    fake = server(errors=[(429, {"Retry-After": "0.1"})])
+    llm = gateway(fake)
+    assert asyncio.run(llm.complete_async(MESSAGES)).startswith("Synthetic answer to:")
+    assert fake.requests == 2
+    assert llm.metrics["retries"] == 1
+
+
+def test_stream_async_retries_opening_the_stream(server):
+    fake = server(errors=[(503, {})])
+    llm = gateway(fake)
+    assert asyncio.run(collect(llm.stream_async(MESSAGES))).startswith("Synthetic answer to:")
+    assert fake.requests == 2
+
+
+def test_5xx_until_retries_run_out(server):
+    from mistralai.models import SDKError
+
+    fake = server(errors=[(502, {})] * 10)
+    llm = gateway(fake, max_retries=2)
+    with pytest.raises(SDKError) as raised:
+        llm.complete(MESSAGES)
+    assert raised.value.status_code == 502
+    assert fake.requests == 3
+    assert llm.metrics == {"requests": 1, "retries": 2, "errors": 1}
+
+    with pytest.raises(SDKError):
+        asyncio.run(llm.complete_async(MESSAGES))
+    with pytest.raises(SDKError):
+        asyncio.run(collect(llm.stream_async(MESSAGES)))
+    assert fake.requests == 9
+
+
+def test_client_errors_are_not_retried(server):
+    from mistralai.models import SDKError
+
+    fake = server(errors=[(400, {})])
+    llm = gateway(fake)
+    with pytest.raises(SDKError):
+        llm.complete(MESSAGES)
+    assert fake.requests == 1
+    assert llm.metrics["retries"] == 0
+
+
+def test_timeouts_are_retried_then_raised(server):
+    fake = server(latency=0.5)
+    llm = gateway(fake, timeout=0.1, max_retries=1)
+    with pytest.raises(httpx.TimeoutException):
+        llm.complete(MESSAGES)
+    assert llm.metrics == {"requests": 1, "retries": 1, "errors": 1}
+
+
+def test_complete_async_respects_model_limit(server):
+    fake = server(latency=0.1)
+    llm = gateway(fake, model_limits={"mistral-small-latest": 2})
+
+    async def run():
+        return await asyncio.gather(*[llm.complete_async(MESSAGES) for _ in range(8)])
+
+    assert len(asyncio.run(run())) == 8
+    assert fake.requests == 8
+    assert fake.peak_inflight == 2
+
+
+def test_stream_async_respects_model_limit(server):
+    fake = server(latency=0.1)
+    llm = gateway(fake, model_limits={"mistral-small-latest": 1})
+
+    async def run():
+        return await asyncio.gather(*[collect(llm.stream_async(MESSAGES)) for _ in range(4)])
+
+    assert all(answer.startswith("Synthetic answer to:") for answer in asyncio.run(run()))
+    assert fake.peak_inflight == 1
+
+
+def test_complete_respects_model_limit_across_threads(server):
+    fake = server(latency=0.1)
+    llm = gateway(fake, model_limits={"mistral-large-latest": 3}, default_limit=1)
+    threads = [threading.Thread(target=llm.complete, args=(MESSAGES,), kwargs={"model": "mistral-large-latest"})
+               for _ in range(9)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert fake.requests == 9
+    assert fake.peak_inflight == 3
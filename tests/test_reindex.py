@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+
+from src.reindex import ReindexJobs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def status_from_other_worker(jobs_dir, job_id):
+    """Reads a job's status from a separate process with its own ReindexJobs, like a second worker."""
+    code = ("import sys, json; from src.reindex import ReindexJobs; "
+            "print(json.dumps(ReindexJobs(jobs_dir=sys.argv[1]).get(sys.argv[2])))")
+    output = subprocess.run([sys.executable, "-c", code, jobs_dir, job_id], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_other_worker_sees_job_stages(tmp_path):
+    jobs_dir = str(tmp_path / "jobs")
+    jobs = ReindexJobs(jobs_dir=jobs_dir)
+    release = threading.Event()
+    swapped = []
+
+    def build(progress):
+        progress("fetch")
+        progress("embed", rows=3, chunks=5)
+        release.wait(5)
+        return "state"
+
+    job = jobs.submit(build, swapped.append)
+    wait_for(lambda: jobs.get(job["job_id"])["stage"] == "embed")
+
+    running = status_from_other_worker(jobs_dir, job["job_id"])
+    assert running["status"] == "running"
+    assert running["stage"] == "embed"
+    assert running["progress"]["embed"]["chunks"] == 5
+    assert list(running["progress"]) == ["fetch", "embed"]
+
+    release.set()
+    wait_for(lambda: jobs.get(job["job_id"])["status"] == "succeeded")
+    finished = status_from_other_worker(jobs_dir, job["job_id"])
+    assert finished["status"] == "succeeded"
+    assert finished["stage"] == "done"
+    assert swapped == ["state"]
+
+
+def test_failed_job_and_unknown_ids(tmp_path):
+    jobs_dir = str(tmp_path / "jobs")
+    jobs = ReindexJobs(jobs_dir=jobs_dir)
+
+    def build(progress):
+        raise RuntimeError("notion is down")
+
+    job = jobs.submit(build, lambda state: None)
+    wait_for(lambda: jobs.get(job["job_id"])["status"] == "failed")
+    other = ReindexJobs(jobs_dir=jobs_dir)
+    assert other.get(job["job_id"])["error"] == "notion is down"
+    assert other.get("0" * 32) is None
+    assert other.get("../jobs") is None
+
+
+def test_without_jobs_dir_status_stays_in_process():
+    jobs = ReindexJobs()
+    job = jobs.submit(lambda progress: None, lambda state: None)
+    wait_for(lambda: jobs.get(job["job_id"])["status"] == "succeeded")
+    assert ReindexJobs().get(job["job_id"]) is None
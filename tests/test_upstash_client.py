@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from benchmarks.fakes import FakeUpstash
+from src import upstash_client
+from src.upstash_client import UpstashClient
+
+KEYS = 250
+
+
+@pytest.fixture
+def fake():
+    server = FakeUpstash().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def loaded(fake, monkeypatch):
+    """Client over a fake holding KEYS string keys, loaded with one pipelined round trip."""
+    monkeypatch.setattr(upstash_client, "SCAN_COUNT", 100)
+    client = UpstashClient(fake.url, "test", batch_size=100)
+    client.pipeline([("SET", f"key:{i:03d}", json.dumps({"0": str(i)})) for i in range(KEYS)])
+    assert fake.requests == 1
+    assert client.metrics["round_trips"] == 1
+    assert client.metrics["commands"] == KEYS
+    client.reset_metrics()
+    fake.requests = 0
+    return client
+
+
+def test_scan_lists_keys_in_count_sized_batches(fake, loaded):
+    keys = loaded.scan_keys()
+    assert sorted(keys) == [f"key:{i:03d}" for i in range(KEYS)]
+    # ceil(250 / 100) SCAN calls instead of one GET per key
+    assert fake.requests == 3
+    assert loaded.metrics["round_trips"] == 3
+
+
+def test_mget_fetches_one_batch_per_round_trip(fake, loaded):
+    keys = [f"key:{i:03d}" for i in range(KEYS)]
+    values = loaded.mget(keys)
+    assert values["key:042"] == json.dumps({"0": "42"})
+    assert len(values) == KEYS
+    assert fake.requests == 3
+    assert loaded.metrics == {"round_trips": 3, "commands": 3, "errors": 0,
+                              "seconds": loaded.metrics["seconds"]}
+
+
+def test_iter_mget_fetches_lazily(fake, loaded):
+    pairs = loaded.iter_mget([f"key:{i:03d}" for i in range(KEYS)])
+    next(pairs)
+    assert fake.requests == 1
+
+
+def test_iter_hash_streams_fields_with_hscan(fake, loaded):
+    fields = [item for i in range(KEYS) for item in (f"row-{i:03d}", str(i))]
+    loaded.command("HSET", "rows", *fields)
+    fake.requests = 0
+    assert dict(loaded.iter_hash("rows")) == {f"row-{i:03d}": str(i) for i in range(KEYS)}
+    assert fake.requests == 3
+
+
+def test_failed_commands_are_counted(fake, loaded):
+    with pytest.raises(Exception):
+        loaded.command("NOPE")
+    assert loaded.metrics["errors"] == 1
+    assert loaded.metrics["round_trips"] == 1
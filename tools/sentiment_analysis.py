@@ -1,4 +1,3 @@
-from textblob import TextBlob
 from crewai.tools import BaseTool
 
 class SentimentAnalysisTool(BaseTool):
@@ -7,6 +6,8 @@ class SentimentAnalysisTool(BaseTool):
                        "to ensure positive and engaging communication.")
 
     def _run(self, text: str) -> str:
+        from textblob import TextBlob
+
         blob = TextBlob(text)
         sentiment_polarity = blob.sentiment.polarity
 